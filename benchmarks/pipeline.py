@@ -0,0 +1,222 @@
+"""Throughput and peak memory of each stage of the sync pipeline.
+
+The input is generated by benchmarks/synthetic.py. Every stage is timed on
+the output of the previous one, and the whole pipeline once more end to
+end. Memory is measured with tracemalloc in a separate run, because
+tracing slows down the code considerably.
+
+Usage: python benchmarks/pipeline.py [--sizes 1000 100000 1000000]
+                                     [--output results.json]
+"""
+
+from typing import List, Dict, Any, Callable, Iterator, Iterable, Tuple
+from argparse import ArgumentParser, Namespace
+from dataclasses import asdict
+from datetime import timedelta
+from time import perf_counter
+import gc
+import json
+import platform
+import tracemalloc
+
+import synthetic
+
+from tempoggl.streaming import iter_json_array, CHUNK_SIZE
+from tempoggl.tempo import (
+    WorkLog,
+    JiraProject,
+    TempoTogglPair,
+    join_worklogs,
+    reformat_json,
+    WorklogError,
+)
+from tempoggl.toggl import TogglProject, TogglEntry, DateTimeEncoder
+from tempoggl.sync import tempo_to_toggl, format_prompt
+from tempoggl.validation import parse_many
+
+DEFAULT_SIZES = [1000, 100000]
+
+
+def chunks(body: bytes) -> Iterator[bytes]:
+    for start in range(0, len(body), CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        yield body[start:end]
+
+
+def decode(body: bytes) -> Iterator[Dict]:
+    return iter_json_array(chunks(body))
+
+
+def validate(dirty: Iterable[Dict]) -> Iterator[WorkLog]:
+    return parse_many(WorkLog, dirty)
+
+
+def validate_fast(dirty: Iterable[Dict]) -> Iterator[WorkLog]:
+    return parse_many(WorkLog, dirty, fast=True)
+
+
+def make_join() -> Callable[[List[WorkLog]], List[TempoTogglPair]]:
+    jira_projects = [
+        JiraProject.parse_obj(p)
+        for p in reformat_json(synthetic.jira_projects())
+    ]
+    toggl_projects = [
+        TogglProject.parse_obj(p) for p in synthetic.toggl_projects()
+    ]
+    mapping = synthetic.toggl_mapping()
+
+    def join(worklogs: List[WorkLog]) -> List[TempoTogglPair]:
+        pairs = join_worklogs(worklogs, jira_projects, mapping, toggl_projects)
+        assert not isinstance(pairs, WorklogError), pairs
+
+        return pairs
+
+    return join
+
+
+def convert(pairs: Iterable[TempoTogglPair]) -> Iterator[TogglEntry]:
+    return (tempo_to_toggl(p) for p in pairs)
+
+
+def preview(pairs: List[TempoTogglPair]) -> Iterator[str]:
+    return format_prompt(
+        (
+            p.tempo_log.date_started,
+            timedelta(seconds=p.tempo_log.time_spent_seconds),
+            p.tempo_log.issue.key,
+            p.tempo_log.comment,
+        )
+        for p in pairs
+    )
+
+
+def serialize(entries: Iterable[TogglEntry]) -> Iterator[str]:
+    # the same encoding as push_entry, without the request
+    return (json.dumps(asdict(e), cls=DateTimeEncoder) for e in entries)
+
+
+Stage = Tuple[str, Callable[[Any], Any]]
+
+
+def stages() -> List[Stage]:
+    """Stages in pipeline order, each consumes the previous output.
+
+    validate_fast is measured on the same input as validate, and preview on
+    the same input as convert, they are not part of the chain.
+    """
+    return [
+        ('decode', decode),
+        ('reformat', reformat_json),
+        ('validate', validate),
+        ('validate_fast', validate_fast),
+        ('join', make_join()),
+        ('preview', preview),
+        ('convert', convert),
+        ('serialize', serialize),
+    ]
+
+
+SIDE_STAGES = {'validate_fast', 'preview'}
+
+
+def materialize(output: Any) -> List[Any]:
+    return output if isinstance(output, list) else list(output)
+
+
+def timed(func: Callable[[Any], Any], arg: Any) -> Tuple[float, List[Any]]:
+    gc.collect()
+    started = perf_counter()
+    output = materialize(func(arg))
+
+    return perf_counter() - started, output
+
+
+def peak_memory(func: Callable[[Any], Any], arg: Any) -> int:
+    """Bytes allocated at most while the stage was running."""
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        materialize(func(arg))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def end_to_end(body: bytes) -> List[int]:
+    """Run the stages like sync does, only join needs all the worklogs."""
+    join = make_join()
+    worklogs = list(validate(reformat_json(decode(body))))
+    count = 0
+
+    for _ in serialize(convert(join(worklogs))):
+        count += 1
+
+    return [count]
+
+
+def measure(
+    size: int, name: str, func: Callable[[Any], Any], arg: Any
+) -> Tuple[Dict[str, Any], List[Any]]:
+    seconds, output = timed(func, arg)
+    peak = peak_memory(func, arg)
+
+    print(
+        '{:>9} {:<14} {:8.3f} s {:>12.0f} /s {:8.1f} MiB'.format(
+            size, name, seconds, size / seconds, peak / 2 ** 20
+        )
+    )
+
+    result = {
+        'seconds': seconds,
+        'items_per_second': size / seconds,
+        'peak_memory_bytes': peak,
+    }
+
+    return result, output
+
+
+def benchmark_size(size: int) -> Dict[str, Any]:
+    payload = list(synthetic.worklogs(size))
+    body = json.dumps(payload).encode()
+    del payload
+
+    results = {}
+    current: Any = body
+
+    for name, func in stages():
+        results[name], output = measure(size, name, func, current)
+
+        if name not in SIDE_STAGES:
+            current = output
+
+    results['end_to_end'], _ = measure(size, 'end_to_end', end_to_end, body)
+
+    return {'payload_bytes': len(body), 'stages': results}
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Benchmark the sync pipeline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--output', help='save the results as json')
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': {str(size): benchmark_size(size) for size in args.sizes},
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Compare reformat_json against the old decamelize + rename_self version.
+
+Usage: python benchmarks/reformat.py [number of worklogs]
+"""
+
+from typing import List, Dict
+from os import path
+from timeit import repeat
+import json
+import sys
+
+from humps import decamelize
+
+from tempoggl.tempo import reformat_json, rename_self
+
+FIXTURE = path.join(
+    path.dirname(__file__), '..', 'test', 'tempo_worklogs.json'
+)
+
+
+def load_worklogs(count: int) -> List[Dict]:
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+
+    return [fixture[i % len(fixture)] for i in range(count)]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    worklogs = load_worklogs(count)
+
+    old = min(
+        repeat(
+            lambda: [rename_self(decamelize(i)) for i in worklogs],
+            number=1,
+            repeat=3,
+        )
+    )
+    new = min(
+        repeat(lambda: list(reformat_json(worklogs)), number=1, repeat=3)
+    )
+
+    print('{} worklogs, best of 3 runs'.format(count))
+    print('decamelize + rename_self: {:.3f} s'.format(old))
+    print('reformat_json:            {:.3f} s'.format(new))
+    print('speed-up:                 {:.1f}x'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
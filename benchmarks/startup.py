@@ -0,0 +1,289 @@
+"""Measure how long `python -m tempoggl` takes to start.
+
+Every scenario is run in fresh subprocesses, both cold (no bytecode cache)
+and warm (bytecode compiled by an earlier run). The per-module import times
+are read from `python -X importtime`.
+
+Usage: python benchmarks/startup.py [--runs N] [--output results.json]
+                                    [--compare baseline.json]
+"""
+
+from typing import List, Dict, Any, Optional, Callable
+from argparse import ArgumentParser, Namespace
+from os import path
+from statistics import median
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from time import perf_counter
+import json
+import os
+import platform
+import select
+import subprocess
+import sys
+
+PROMPT = b'jira password'
+
+PROMPT_TIMEOUT = 30.0
+
+TOP_IMPORTS = 15
+
+CONFIG = dedent(
+    """
+    [general]
+    username: benchmark.user
+    jira_url: https://jira.example.com
+    toggl_token: benchmark
+
+    [toggl_mapping]
+"""
+).lstrip()
+
+Runner = Callable[[Dict[str, str], List[str]], bytes]
+
+
+def run_to_exit(env: Dict[str, str], extra_args: List[str]) -> bytes:
+    """Run until the process exits, return its stderr."""
+    return subprocess.run(
+        [sys.executable, *extra_args],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stderr
+
+
+def run_to_prompt(env: Dict[str, str], extra_args: List[str]) -> bytes:
+    """Run until the password is asked, return stderr up to that point.
+
+    Without a controlling terminal getpass writes the prompt to stderr.
+    """
+    process = subprocess.Popen(
+        [sys.executable, *extra_args],
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    assert process.stderr is not None
+    stderr = b''
+    started = perf_counter()
+
+    try:
+        while PROMPT not in stderr:
+            remaining = max(0.0, PROMPT_TIMEOUT - (perf_counter() - started))
+            # a child which stops writing without exiting would block read
+            readable, _, _ = select.select([process.stderr], [], [], remaining)
+
+            if not readable:
+                raise RuntimeError('no password prompt')
+
+            chunk = os.read(process.stderr.fileno(), 4096)
+
+            if not chunk:
+                raise RuntimeError(
+                    'exited before the prompt:\n{}'.format(stderr.decode())
+                )
+
+            stderr += chunk
+    finally:
+        process.kill()
+        process.wait()
+
+    return stderr
+
+
+SCENARIOS: Dict[str, Any] = {
+    'version': (['-m', 'tempoggl', '--version'], run_to_exit),
+    'help': (['-m', 'tempoggl', '--help'], run_to_exit),
+    'prompt': (['-m', 'tempoggl', '2020-01-01'], run_to_prompt),
+}
+
+
+def make_env(config_home: str, pycache: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env['XDG_CONFIG_HOME'] = config_home
+    env['PYTHONPYCACHEPREFIX'] = pycache
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    return env
+
+
+def timed(run: Runner, env: Dict[str, str], args: List[str]) -> float:
+    started = perf_counter()
+    run(env, args)
+
+    return perf_counter() - started
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        'min': min(samples),
+        'median': median(samples),
+        'max': max(samples),
+        'samples': samples,
+    }
+
+
+def parse_importtime(stderr: bytes) -> List[Dict[str, Any]]:
+    """Per-module times from `-X importtime` output, slowest first."""
+    imports = []
+
+    for line in stderr.decode(errors='replace').splitlines():
+        prefix, _, rest = line.partition(':')
+
+        if prefix != 'import time':
+            continue
+
+        # import time: self [us] | cumulative | imported package
+        parts = rest.split('|')
+
+        if not parts[0].strip().isdigit():
+            continue
+
+        imports.append(
+            {
+                'module': parts[2].strip(),
+                'self_us': int(parts[0]),
+                'cumulative_us': int(parts[1]),
+            }
+        )
+
+    return sorted(imports, key=lambda i: i['cumulative_us'], reverse=True)
+
+
+def measure(
+    name: str, runs: int, config_home: str, workdir: str
+) -> Dict[str, Any]:
+    args, run = SCENARIOS[name]
+    cold = []
+
+    for index in range(runs):
+        # an empty cache directory, so every module is compiled again
+        pycache = path.join(workdir, '{}-cold-{}'.format(name, index))
+        cold.append(timed(run, make_env(config_home, pycache), args))
+
+    warm_env = make_env(config_home, path.join(workdir, name + '-warm'))
+    run(warm_env, args)
+    warm = [timed(run, warm_env, args) for _ in range(runs)]
+
+    imports = parse_importtime(run(warm_env, ['-X', 'importtime', *args]))
+
+    return {
+        'cold': summarize(cold),
+        'warm': summarize(warm),
+        'imports': imports[:TOP_IMPORTS],
+    }
+
+
+def benchmark(runs: int) -> Dict[str, Any]:
+    with TemporaryDirectory() as workdir:
+        config_home = path.join(workdir, 'config')
+        os.makedirs(path.join(config_home, 'tempoggl'))
+
+        with open(
+            path.join(config_home, 'tempoggl', 'tempoggl.cfg'), 'w'
+        ) as f:
+            f.write(CONFIG)
+
+        scenarios = {
+            name: measure(name, runs, config_home, workdir)
+            for name in SCENARIOS
+        }
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'scenarios': scenarios,
+    }
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print('best / median of {} runs'.format(results['runs']))
+
+    for name, scenario in results['scenarios'].items():
+        print('\n{}'.format(name))
+
+        for mode in ('cold', 'warm'):
+            print(
+                '  {}: {:.3f} s / {:.3f} s'.format(
+                    mode, scenario[mode]['min'], scenario[mode]['median']
+                )
+            )
+
+        print('  slowest imports (cumulative ms):')
+
+        for item in scenario['imports']:
+            print(
+                '    {:8.1f}  {}'.format(
+                    item['cumulative_us'] / 1000, item['module']
+                )
+            )
+
+
+def compare(
+    baseline: Dict[str, Any],
+    results: Dict[str, Any],
+    max_regression: Optional[float],
+) -> bool:
+    """Print median changes, return False if any exceeds `max_regression`."""
+    ok = True
+    print('\nmedian compared to the baseline')
+
+    for name, scenario in results['scenarios'].items():
+        if name not in baseline['scenarios']:
+            continue
+
+        for mode in ('cold', 'warm'):
+            old = baseline['scenarios'][name][mode]['median']
+            new = scenario[mode]['median']
+            change = (new - old) / old * 100
+
+            print(
+                '  {} {}: {:.3f} s -> {:.3f} s ({:+.1f} %)'.format(
+                    name, mode, old, new, change
+                )
+            )
+
+            if max_regression is not None and change > max_regression:
+                ok = False
+
+    return ok
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Measure tempoggl startup time.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='save the results as json')
+    parser.add_argument('--compare', help='results json of an earlier run')
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        help='fail if a median is this many percent slower than baseline',
+    )
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = benchmark(args.runs)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if not compare(baseline, results, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
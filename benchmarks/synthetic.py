@@ -0,0 +1,236 @@
+"""Generate realistic Tempo, Jira and Toggl API payloads of any size.
+
+The objects have the same shape as the API responses in test/, with ids,
+dates, durations and comments spread like in a real timesheet.
+
+Usage: python benchmarks/synthetic.py [number of worklogs] [output dir]
+"""
+
+from typing import Dict, Iterable, Iterator, List, Any, TextIO
+from datetime import datetime, timedelta
+from os import path
+from random import Random
+import json
+import os
+import sys
+
+JIRA_URL = 'https://jira.example.com'
+
+PROJECT_COUNT = 20
+
+ISSUES_PER_PROJECT = 500
+
+FIRST_WORKLOG_ID = 100000
+
+FIRST_TOGGL_PROJECT_ID = 5000
+
+WORKSPACE_ID = 1123
+
+START = datetime(2019, 1, 1, 8)
+
+WORDS = (
+    'fix review deploy refactor meeting planning investigate support '
+    'release test document migrate the login page api database issue '
+    'customer report build pipeline cache performance'
+).split()
+
+ISSUE_TYPES = ['Bug', 'Task', 'Story', 'Improvement']
+
+
+def project_key(index: int) -> str:
+    """Jira style key of letters only, e.g. "PA", "PB" and later "PBA"."""
+    letters = ''
+
+    while True:
+        letters = chr(ord('A') + index % 26) + letters
+        index //= 26
+
+        if not index:
+            return 'P' + letters
+
+
+def jira_projects(count: int = PROJECT_COUNT) -> List[Dict[str, Any]]:
+    return [
+        {
+            'expand': 'description,lead,url,projectKeys',
+            'self': '{}/rest/api/2/project/{}'.format(JIRA_URL, 1000 + i),
+            'id': str(1000 + i),
+            'key': project_key(i),
+            'name': 'Project number {}'.format(i),
+            'avatarUrls': {
+                size: '{}/secure/projectavatar?size={}'.format(JIRA_URL, size)
+                for size in ('48x48', '24x24', '16x16', '32x32')
+            },
+            'projectTypeKey': 'software',
+        }
+        for i in range(count)
+    ]
+
+
+def toggl_projects(count: int = PROJECT_COUNT) -> List[Dict[str, Any]]:
+    return [
+        {
+            'id': FIRST_TOGGL_PROJECT_ID + i,
+            'wid': WORKSPACE_ID,
+            'cid': 1145,
+            'name': 'Toggl project {}'.format(i),
+            'billable': True,
+            'is_private': False,
+            'active': True,
+            'template': False,
+            'at': '2018-10-05T13:59:02+00:00',
+            'created_at': '2018-06-05T13:52:50+00:00',
+            'color': str(i % 14),
+            'auto_estimates': False,
+            'actual_hours': 100 + i,
+            'hex_color': '#06aaf5',
+        }
+        for i in range(count)
+    ]
+
+
+def toggl_mapping(count: int = PROJECT_COUNT) -> Dict[str, int]:
+    """Map every Jira project to a Toggl project like in the config."""
+    return {project_key(i): FIRST_TOGGL_PROJECT_ID + i for i in range(count)}
+
+
+def format_date(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000')
+
+
+def worklogs(
+    count: int, projects: int = PROJECT_COUNT, seed: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """Tempo worklogs in the camel case format of the Tempo API.
+
+    A few logs are written every working day, so that the dates cover a
+    range which grows with `count`.
+    """
+    random = Random(seed)
+    day = START
+
+    for index in range(count):
+        if random.random() < 0.25:
+            day += timedelta(days=3 if day.weekday() == 4 else 1)
+
+        worklog_id = FIRST_WORKLOG_ID + index
+        project = random.randrange(projects)
+        issue_number = random.randrange(1, ISSUES_PER_PROJECT)
+        issue_id = project * ISSUES_PER_PROJECT + issue_number
+        key = '{}-{}'.format(project_key(project), issue_number)
+        started = day + timedelta(minutes=15 * random.randrange(36))
+        created = started + timedelta(hours=random.randrange(1, 72))
+
+        # most worklogs are never edited
+        edited = random.random() < 0.1
+        updated = created + timedelta(days=1) if edited else created
+
+        words = random.sample(WORDS, random.randrange(2, 8))
+
+        if random.random() < 0.3:
+            words.append(key)
+
+        yield {
+            'timeSpentSeconds': 900 * random.randrange(1, 33),
+            'dateStarted': format_date(started),
+            'dateCreated': format_date(created),
+            'dateUpdated': format_date(updated),
+            'comment': ' '.join(words).capitalize(),
+            'self': '{}/rest/tempo-timesheets/3/worklogs/{}'.format(
+                JIRA_URL, worklog_id
+            ),
+            'id': worklog_id,
+            'jiraWorklogId': worklog_id,
+            'author': {
+                'self': '{}/rest/api/2/user?username=user'.format(JIRA_URL),
+                'name': 'user@example.com',
+                'key': 'user@example.com',
+                'displayName': 'User Example',
+                'avatar': '{}/secure/useravatar?size=small'.format(JIRA_URL),
+            },
+            'issue': {
+                'self': '{}/rest/api/2/issue/{}'.format(JIRA_URL, issue_id),
+                'id': issue_id,
+                'projectId': 1000 + project,
+                'key': key,
+                'remainingEstimateSeconds': 900 * random.randrange(100),
+                'issueType': {
+                    'name': random.choice(ISSUE_TYPES),
+                    'iconUrl': '{}/secure/viewavatar?size=xsmall'.format(
+                        JIRA_URL
+                    ),
+                },
+                'summary': ' '.join(random.sample(WORDS, 4)),
+            },
+            'worklogAttributes': [],
+            'workAttributeValues': [],
+        }
+
+
+def toggl_time_entries(
+    tempo_worklogs: Iterable[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Toggl time entries like the ones created from the worklogs."""
+    for index, worklog in enumerate(tempo_worklogs):
+        project = int(worklog['issue']['projectId']) - 1000
+        started = datetime.strptime(
+            worklog['dateStarted'], '%Y-%m-%dT%H:%M:%S.000'
+        )
+        stopped = started + timedelta(seconds=worklog['timeSpentSeconds'])
+
+        yield {
+            'id': 900000000 + index,
+            'wid': WORKSPACE_ID,
+            'pid': FIRST_TOGGL_PROJECT_ID + project,
+            'billable': True,
+            'start': started.isoformat() + '+00:00',
+            'stop': stopped.isoformat() + '+00:00',
+            'duration': worklog['timeSpentSeconds'],
+            'description': worklog['comment'],
+            'duronly': False,
+            'at': worklog['dateUpdated'] + '+00:00',
+            'uid': 1234,
+        }
+
+
+def dump_array(items: Iterable[Any], f: TextIO) -> None:
+    """Write a JSON array without building it in memory first."""
+    f.write('[')
+
+    for index, item in enumerate(items):
+        if index:
+            f.write(',\n')
+
+        json.dump(item, f)
+
+    f.write(']\n')
+
+
+def write_payloads(count: int, directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+
+    payloads = {
+        'jira_projects.json': jira_projects(),
+        'toggl_projects.json': toggl_projects(),
+        'tempo_worklogs.json': worklogs(count),
+        'toggl_time_entries.json': toggl_time_entries(worklogs(count)),
+    }
+
+    for filename, items in payloads.items():
+        with open(path.join(directory, filename), 'w') as f:
+            dump_array(items, f)
+
+    with open(path.join(directory, 'toggl_mapping.json'), 'w') as f:
+        json.dump(toggl_mapping(), f, indent=2)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    directory = sys.argv[2] if len(sys.argv) > 2 else 'synthetic'
+
+    write_payloads(count, directory)
+    print('wrote {} worklogs into {}'.format(count, directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Merge the worklogs of an issue and a day into a single Toggl entry.
+
+Some people log many short worklogs a day, and each of them would cost a
+request to push. A merged worklog has the smallest id of its worklogs, and
+the ledger records all of them with the id of their shared Toggl entry.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+
+from tempoggl.tempo import TempoTogglPair
+
+
+# issue key, day and toggl project id
+AggregateKey = Tuple[str, date, int]
+
+COMMENT_SEPARATOR = '; '
+
+
+@dataclass
+class Group:
+    first: TempoTogglPair
+    ids: List[int] = field(default_factory=list)
+    seconds: int = 0
+    started: datetime = field(init=False)
+    updated: datetime = field(init=False)
+    comments: Dict[str, None] = field(default_factory=dict)  # ordered set
+
+    def __post_init__(self) -> None:
+        """Start from the times of the first worklog, added like the rest."""
+        self.started = self.first.tempo_log.date_started
+        self.updated = self.first.tempo_log.date_updated
+
+    def add(self, pair: TempoTogglPair) -> None:
+        tempo_log = pair.tempo_log
+        self.ids.append(tempo_log.id)
+        self.seconds += tempo_log.time_spent_seconds
+        self.started = min(self.started, tempo_log.date_started)
+        self.updated = max(self.updated, tempo_log.date_updated)
+
+        if tempo_log.comment:
+            self.comments[tempo_log.comment] = None
+
+    def merged(self) -> TempoTogglPair:
+        if len(self.ids) == 1:
+            return self.first
+
+        tempo_log = self.first.tempo_log.copy(
+            update={
+                'id': min(self.ids),
+                'comment': COMMENT_SEPARATOR.join(self.comments),
+                'date_started': self.started,
+                'date_updated': self.updated,
+                'time_spent_seconds': self.seconds,
+            }
+        )
+
+        return replace(
+            self.first, tempo_log=tempo_log, merged_ids=tuple(sorted(self.ids))
+        )
+
+
+def aggregate_worklogs(
+    worklogs: Iterable[TempoTogglPair],
+) -> List[TempoTogglPair]:
+    """Merge the worklogs of the same issue, day and Toggl project.
+
+    The worklogs are grouped in a single pass. A merged worklog starts when
+    the first of its worklogs started, lasts their total time, and has
+    their distinct comments in the order they arrived. Worklogs alone in
+    their group are returned as they are.
+    """
+    groups: Dict[AggregateKey, Group] = {}
+
+    for pair in worklogs:
+        tempo_log = pair.tempo_log
+        key = (
+            tempo_log.issue.key,
+            tempo_log.date_started.date(),
+            pair.toggl_project.id,
+        )
+        group = groups.get(key)
+
+        if group is None:
+            group = groups[key] = Group(pair)
+
+        group.add(pair)
+
+    return [group.merged() for group in groups.values()]
@@ -0,0 +1,243 @@
+"""Sync several users of a team in a single process.
+
+The users are read from the [user:NAME] sections of the config. They share
+the connection pools, the Jira project metadata and the Jira rate limit,
+but every user has their own credentials, ledger rows and Toggl limiter.
+"""
+
+from typing import Iterable, List, NamedTuple, Optional
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import replace
+from getpass import getpass
+import logging
+import os
+import sys
+
+from tempoggl.cache import MetadataCache, cache_dir
+from tempoggl.config import (
+    AppConfig,
+    FileConfig,
+    UserProfile,
+    default_config_dir,
+)
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.sync import (
+    SyncSummary,
+    jira_password_prompt,
+    log_invalid_config,
+    record_summary,
+    sync_user,
+    validate_configs,
+)
+from tempoggl.transport import Transport
+
+
+logger = logging.getLogger(__name__)
+
+# users synced at a time when not prompting
+DEFAULT_BATCH_CONCURRENCY = 2
+
+
+class BatchUser(NamedTuple):
+    name: str
+    config: AppConfig
+    jira_password: str
+
+
+class UserResult(NamedTuple):
+    name: str
+    summary: SyncSummary
+    error: Optional[str] = None
+
+
+def user_file_config(
+    config: FileConfig, name: str, profile: UserProfile
+) -> FileConfig:
+    """Config of a single user, as if it was the only user of the file."""
+    toggl_token = profile.toggl_token
+
+    if not toggl_token and profile.toggl_token_env:
+        toggl_token = os.environ.get(profile.toggl_token_env)
+
+    general = replace(
+        config.general,
+        username=profile.username or name,
+        toggl_token=toggl_token or config.general.toggl_token,
+        push_concurrency=(
+            profile.push_concurrency or config.general.push_concurrency
+        ),
+        aggregate=(
+            config.general.aggregate
+            if profile.aggregate is None
+            else profile.aggregate
+        ),
+    )
+
+    return FileConfig(
+        general=general,
+        toggl_mapping={**config.toggl_mapping, **profile.toggl_mapping},
+    )
+
+
+def jira_password(config: AppConfig, profile: UserProfile) -> str:
+    env = profile.jira_password_env
+
+    if env and env in os.environ:
+        return os.environ[env]
+
+    return getpass(jira_password_prompt(config))
+
+
+def batch_users(args: Namespace, config: FileConfig) -> List[BatchUser]:
+    """Validate the config of every user before syncing anyone."""
+    users = []
+    valid = True
+
+    for name, profile in sorted(config.users.items()):
+        app_config = validate_configs(
+            args, user_file_config(config, name, profile)
+        )
+
+        if isinstance(app_config, AppConfig):
+            users.append((name, app_config, profile))
+        else:
+            logger.critical('invalid config of user {}'.format(name))
+            log_invalid_config(app_config)
+            valid = False
+
+    if not valid:
+        sys.exit(1)
+
+    return [
+        BatchUser(name, app_config, jira_password(app_config, profile))
+        for name, app_config, profile in users
+    ]
+
+
+def sync_batch_user(
+    user: BatchUser, transport: Transport, cache: MetadataCache
+) -> UserResult:
+    """Sync a single user, turning the exits of `sync` into results."""
+    try:
+        summary = sync_user(
+            user.config, user.jira_password, transport.shared(), cache
+        )
+    except SystemExit as exit:
+        message = exit.code if isinstance(exit.code, str) else 'failed'
+
+        return UserResult(user.name, SyncSummary(), message)
+    except Exception as err:
+        logger.exception('syncing {} failed'.format(user.name))
+
+        return UserResult(user.name, SyncSummary(), str(err))
+
+    return UserResult(user.name, summary)
+
+
+def total_summary(results: Iterable[UserResult]) -> SyncSummary:
+    total = SyncSummary()
+
+    for result in results:
+        total.fetched += result.summary.fetched
+        total.skipped += result.summary.skipped
+        total.created += result.summary.created
+        total.updated += result.summary.updated
+        total.deleted += result.summary.deleted
+
+    return total
+
+
+def format_report(results: List[UserResult]) -> List[str]:
+    row_format = '{0:<20.20} {1:>8} {2:>8} {3:>8} {4:>8} {5:>8}  {6}'
+    rows = [
+        row_format.format(
+            'user',
+            'fetched',
+            'skipped',
+            'created',
+            'updated',
+            'deleted',
+            'result',
+        )
+    ]
+
+    for name, summary, error in results:
+        rows.append(
+            row_format.format(
+                name,
+                summary.fetched,
+                summary.skipped,
+                summary.created,
+                summary.updated,
+                summary.deleted,
+                error or 'ok',
+            )
+        )
+
+    total = total_summary(results)
+    rows.append(
+        row_format.format(
+            'total',
+            total.fetched,
+            total.skipped,
+            total.created,
+            total.updated,
+            total.deleted,
+            '',
+        ).rstrip()
+    )
+
+    return rows
+
+
+def sync_batch(
+    users: List[BatchUser], concurrency: int, cache: MetadataCache
+) -> List[UserResult]:
+    pool_size = max(
+        max(u.config.http_pool_size for u in users),
+        concurrency * max(u.config.push_concurrency for u in users),
+    )
+
+    with closing(Transport(pool_size=pool_size)) as transport:
+        rate_limit = users[0].config.jira_rate_limit
+
+        if rate_limit:
+            # shared by all users of the same jira
+            for jira_url in {u.config.jira_url for u in users}:
+                transport.limit(jira_url, TokenBucket(rate_limit))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(
+                executor.map(
+                    lambda user: sync_batch_user(user, transport, cache),
+                    users,
+                )
+            )
+
+
+def run_batch(args: Namespace, config: FileConfig) -> None:
+    if not config.users:
+        logger.critical('no [user:NAME] sections in the config')
+        sys.exit(1)
+
+    users = batch_users(args, config)
+
+    # prompts of several users at once would be impossible to answer
+    concurrency = (
+        config.general.batch_concurrency or DEFAULT_BATCH_CONCURRENCY
+        if users[0].config.yes
+        else 1
+    )
+    cache = MetadataCache(cache_dir(default_config_dir()))
+    results = sync_batch(users, concurrency, cache)
+    record_summary(total_summary(results))
+
+    print('', file=sys.stderr)
+
+    for row in format_report(results):
+        print(row, file=sys.stderr)
+
+    if any(r.error for r in results):
+        sys.exit(1)
@@ -0,0 +1,154 @@
+"""On-disk cache for Jira and Toggl project metadata."""
+
+from typing import Any, Callable, List, Optional, Type, TypeVar, Dict, Tuple
+from datetime import timedelta
+from hashlib import sha1
+from os import path
+from threading import Lock
+from time import time
+import json
+import logging
+import os
+
+from pydantic import BaseModel, ValidationError
+
+from tempoggl.validation import parse_many
+
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar('M', bound=BaseModel)
+
+CACHE_DIRNAME = 'cache'
+
+DEFAULT_TTL = timedelta(hours=24)
+
+
+def cache_key(source: str, identity: str) -> str:
+    """Name cache file by source and e.g. host, without leaking secrets."""
+    return '{}-{}'.format(source, sha1(identity.encode()).hexdigest()[:16])
+
+
+class MetadataCache:
+    """JSON files of fetched objects and the time they were fetched.
+
+    Fetched objects are kept in memory too, so the users of a batch sync
+    and the cycles of the watch mode share them, and the same key is fetched
+    only once at a time. The same list is returned from memory every time,
+    so it must not be modified.
+    """
+
+    def __init__(
+        self, directory: str, clock: Callable[[], float] = time
+    ) -> None:
+        """Keep the files in `directory`, which is created when needed."""
+        self.directory = directory
+        self._clock = clock
+        self._memory: Dict[str, Tuple[float, List[Any]]] = {}
+        self._locks: Dict[str, Lock] = {}
+        self._lock = Lock()
+
+    def _key_lock(self, key: str) -> Lock:
+        with self._lock:
+            return self._locks.setdefault(key, Lock())
+
+    def _path(self, key: str) -> str:
+        return path.join(self.directory, '{}.json'.format(key))
+
+    def load(self, key: str, ttl: timedelta) -> Optional[List[Dict]]:
+        """Return cached objects, or None if they are missing or expired."""
+        cached = self._read(key, ttl)
+
+        return cached[1] if cached else None
+
+    def _read(
+        self, key: str, ttl: timedelta
+    ) -> Optional[Tuple[float, List[Dict]]]:
+        """Fetch time and objects of the file, if they are fresh."""
+        try:
+            with open(self._path(key)) as f:
+                cached = json.load(f)
+
+            fetched_at = float(cached['fetched_at'])
+            items: List[Dict] = cached['items']
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing, or written by something else
+            return None
+
+        age = self._clock() - fetched_at
+
+        if age > ttl.total_seconds() or not isinstance(items, list):
+            return None
+
+        return (fetched_at, items)
+
+    def store(self, key: str, items: List[Dict]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump({'fetched_at': self._clock(), 'items': items}, f)
+
+        # readers never see a partially written file
+        os.replace(tmp_path, self._path(key))
+
+    def get_or_fetch(
+        self,
+        key: str,
+        ttl: timedelta,
+        model: Type[M],
+        fetch: Callable[[], List[M]],
+        refresh: bool = False,
+        fast_validation: bool = False,
+    ) -> List[M]:
+        """Return cached models if they are fresh, otherwise fetch them.
+
+        Zero `ttl` disables the cache.
+        """
+        if not ttl:
+            return fetch()
+
+        with self._key_lock(key):
+            models = None if refresh else self._remembered(key, ttl)
+
+            if models is not None:
+                return models
+
+            cached = None if refresh else self._read(key, ttl)
+
+            if cached is not None:
+                logger.info('using cached {}'.format(key))
+                fetched_at, items = cached
+
+                try:
+                    models = list(
+                        parse_many(model, items, fast=fast_validation)
+                    )
+                except (ValidationError, TypeError):
+                    logger.warning('ignoring invalid cache {}'.format(key))
+                else:
+                    # expires when the file does
+                    self._memory[key] = (fetched_at, models)
+
+                    return models
+
+            fetched = fetch()
+            self.store(key, [i.dict() for i in fetched])
+            self._memory[key] = (self._clock(), fetched)
+
+            return fetched
+
+    def _remembered(self, key: str, ttl: timedelta) -> Optional[List[Any]]:
+        if key not in self._memory:
+            return None
+
+        stored_at, models = self._memory[key]
+
+        if self._clock() - stored_at > ttl.total_seconds():
+            return None
+
+        return models
+
+
+def cache_dir(config_dir: str) -> str:
+    return path.join(config_dir, CACHE_DIRNAME)
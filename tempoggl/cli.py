@@ -1,37 +1,20 @@
-from argparse import ArgumentParser, Namespace, ArgumentTypeError
-from datetime import date, timedelta, datetime
+from argparse import ArgumentParser, Namespace, ArgumentTypeError, Action
+from datetime import date
+import os
 import sys
 import re
-from typing import Union, Tuple, Iterable, Any, Iterator
-from getpass import getpass
-from distutils.util import strtobool
-from urllib.parse import urlparse
+from typing import Tuple, Any, Sequence, Union, Optional, List
 import logging
-import json
-
-from importlib_metadata import version
-import requests
-from dateutil.parser import parse as dateutil_parse
-from pydantic import ValidationError
-
-from tempoggl.toggl import (
-    TogglEntryRequest,
-    push_worklogs,
-    fetch_projects,
-    TogglEntry,
-    generate_description,
-)
-from tempoggl.tempo import (
-    WorkLog,
-    join_worklogs,
-    WorklogError,
-    TempoTogglPair,
-    reformat_json,
-    JiraProject,
-)
-from tempoggl.config import create_or_read_config, AppConfig, FileConfig
-from tempoggl.typing_tools import unreachable
 
+from tempoggl.defaults import (
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_PROFILE_TOP,
+    DEFAULT_PUSH_CONCURRENCY,
+    PROFILE_PHASES,
+)
+from tempoggl.preview import PREVIEW_ROWS, Preview
+from tempoggl.schedule import Schedule, parse_schedule
+from tempoggl.windows import FetchWindow
 
 logger = logging.getLogger(__name__)
 
@@ -41,20 +24,25 @@ DESCRIPTION = (
 )
 
 
-def tempo_to_toggl(tempo_log: TempoTogglPair) -> TogglEntry:
-    tempo = tempo_log.tempo_log
+class VersionAction(Action):
+    """Like action="version", but look up the version only when asked."""
 
-    return TogglEntry(
-        time_entry=TogglEntryRequest(
-            description=generate_description(tempo.issue.key, tempo.comment),
-            start=tempo.date_started,
-            duration=tempo.time_spent_seconds,
-            pid=tempo_log.toggl_project.id,
-        )
-    )
+    def __call__(
+        self,
+        parser: ArgumentParser,
+        namespace: Namespace,
+        values: Union[str, Sequence[Any], None],
+        option_string: Optional[str] = None,
+    ) -> None:
+        from importlib_metadata import version
+
+        print(version('tempoggl'))
+        parser.exit()
 
 
 def parse_date(arg: str) -> date:
+    from dateutil.parser import parse as dateutil_parse
+
     try:
         return dateutil_parse(arg).date()
     except Exception:
@@ -70,6 +58,41 @@ def jira_toggl_pair(arg: str) -> Tuple[str, int]:
     return (match.group(1), int(match.group(2)))
 
 
+def schedule(arg: str) -> Schedule:
+    try:
+        return parse_schedule(arg)
+    except ValueError as err:
+        raise ArgumentTypeError(str(err))
+
+
+def profile_phases(arg: str) -> List[str]:
+    phases = [phase.strip() for phase in arg.split(',')]
+    unknown = [phase for phase in phases if phase not in PROFILE_PHASES]
+
+    if unknown:
+        raise ArgumentTypeError(
+            'unknown phase "{}", expected some of {}'.format(
+                unknown[0], ','.join(PROFILE_PHASES)
+            )
+        )
+
+    return phases
+
+
+def positive_int(arg: str) -> int:
+    try:
+        value = int(arg)
+    except ValueError:
+        raise ArgumentTypeError('"{}" is not an integer'.format(arg))
+
+    if value < 1:
+        raise ArgumentTypeError(
+            'expected positive integer, got {}'.format(arg)
+        )
+
+    return value
+
+
 def parse_args() -> Namespace:
     parser = ArgumentParser(prog='tempoggl', description=DESCRIPTION)
     parser.add_argument('--username', help='jira username')
@@ -108,166 +131,153 @@ def parse_args() -> Namespace:
     )
 
     parser.add_argument(
-        '-V', '--version', action='version', version=version('tempoggl'),
+        '--push-concurrency',
+        type=positive_int,
+        metavar='N',
+        help='number of concurrent requests when pushing to toggl '
+        '(default {})'.format(DEFAULT_PUSH_CONCURRENCY),
     )
-
-    return parser.parse_args()
-
-
-class UnsafeJiraProtocol:
-    pass
-
-
-def validate_configs(
-    args: Namespace, config: FileConfig
-) -> Union[UnsafeJiraProtocol, ValidationError, AppConfig]:
-    try:
-        app_config = AppConfig(
-            username=args.username or config.general.username,
-            jira_url=args.jira_url or config.general.jira_url,
-            yes=bool(args.yes or config.general.yes),
-            from_date=args.from_date or config.general.from_date,
-            verbose=bool(args.verbose or config.general.verbose),
-            jira_to_toggl=(
-                {**config.toggl_mapping, **(dict(args.toggl_mapping))}
-            ),
-            toggl_token=args.toggl_api_token or config.general.toggl_token,
-        )
-    except ValidationError as e:
-        return e
-    else:
-        parsed_jira_url = urlparse(app_config.jira_url)
-
-        if parsed_jira_url.scheme == 'https':
-            return app_config
-        elif parsed_jira_url.scheme == 'http':
-            return UnsafeJiraProtocol()
-        else:
-            logger.critical(
-                'unexpected jira url scheme: {}'.format(parsed_jira_url.scheme)
-            )
-            sys.exit(1)
-
-
-def start_syncing(config: AppConfig, jira_password: str) -> None:
-    auth = (config.username, jira_password)
-
-    jira_projects_response = requests.get(
-        '{}/rest/api/2/project'.format(config.jira_url), auth=auth
+    parser.add_argument(
+        '--keep-going',
+        action='store_true',
+        help='keep pushing remaining entries after a failed entry',
     )
 
-    jira_projects_response.raise_for_status()
-
-    # api returns 200 for wrong password
-    if jira_projects_response.text == '[]':
-        logger.critical('no jira projects found, possibly wrong password')
-        sys.exit(1)
-
-    jira_projects = [
-        JiraProject.parse_obj(i)
-        for i in reformat_json(json.loads(jira_projects_response.content))
-    ]
-
-    tempo_response = requests.get(
-        '{}/rest/tempo-timesheets/3/worklogs'.format(config.jira_url),
-        params={'dateFrom': config.from_date.isoformat()},
-        auth=auth,
+    parser.add_argument(
+        '--fetch-window',
+        type=FetchWindow,
+        choices=list(FetchWindow),
+        metavar='{{{}}}'.format(','.join(w.value for w in FetchWindow)),
+        help='fetch tempo worklogs in date windows of this size '
+        '(default {})'.format(FetchWindow.NONE.value),
+    )
+    parser.add_argument(
+        '--fetch-concurrency',
+        type=positive_int,
+        metavar='N',
+        help='number of date windows fetched at a time '
+        '(default {})'.format(DEFAULT_FETCH_CONCURRENCY),
+    )
+    parser.add_argument(
+        '--fast-validation',
+        action='store_true',
+        help='validate only a sample of the fetched worklogs and projects',
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='fetch only worklogs created or updated since the last sync',
+    )
+    parser.add_argument(
+        '--targeted-metadata',
+        action='store_true',
+        help='fetch only the jira and toggl projects which are used, '
+        'instead of listing all projects',
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='fetch jira and toggl projects even if they are cached',
+    )
+    parser.add_argument(
+        '--ignore-ledger',
+        action='store_true',
+        help='push also the worklogs which are already synced',
+    )
+    parser.add_argument(
+        '--no-reconcile',
+        action='store_true',
+        help="don't look up existing toggl entries before pushing",
+    )
+    parser.add_argument(
+        '--aggregate',
+        action='store_true',
+        help='push a single entry per issue and day, with the total time '
+        'and the comments of its worklogs',
     )
 
-    tempo_response.raise_for_status()
-
-    toggl_projects = list(fetch_projects(config.toggl_token))
+    parser.add_argument(
+        '--preview',
+        type=Preview,
+        choices=list(Preview),
+        metavar='{{{}}}'.format(','.join(p.value for p in Preview)),
+        help='show the worklogs before pushing, or their totals per project '
+        'and day. auto shows the totals of more than {} worklogs '
+        '(default {})'.format(PREVIEW_ROWS, Preview.AUTO.value),
+    )
 
-    worklog_resposes = [
-        WorkLog.parse_obj(i)
-        for i in reformat_json(json.loads(tempo_response.content))
-    ]
+    parser.add_argument(
+        '--watch',
+        type=schedule,
+        metavar='SCHEDULE',
+        help='keep running and sync by the schedule, which is an interval '
+        'like "15m" or a cron expression like "*/15 8-18 * * 1-5". Needs '
+        '--yes',
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='sync every user of the [user:NAME] sections of the config',
+    )
 
-    worklogs = join_worklogs(
-        worklog_resposes, jira_projects, config.jira_to_toggl, toggl_projects
+    parser.add_argument(
+        '--metrics-json',
+        metavar='PATH',
+        help='write the phase timings and http request counters of the run '
+        'as json',
+    )
+    parser.add_argument(
+        '--metrics-textfile',
+        metavar='PATH',
+        help='write the metrics in the prometheus text format, e.g. for the '
+        'textfile collector of node exporter',
     )
 
-    if not worklogs:
-        print(
-            'no tempo worklogs found after {}'.format(config.from_date),
-            file=sys.stderr,
-        )
-        sys.exit(1)
-
-    if isinstance(worklogs, list):
-        do_continue = prompt_for_pushing(worklogs, verbose=config.verbose)
-
-        if not do_continue:
-            logger.info('negative prompt, exiting...')
-            sys.exit(1)
-        else:
-            error = push_worklogs(
-                [tempo_to_toggl(tempo) for tempo in worklogs],
-                config.toggl_token,
-            )
+    parser.add_argument(
+        '--profile',
+        metavar='PATH',
+        default=os.environ.get('TEMPOGGL_PROFILE'),
+        help='profile the run and write the stats to PATH and a report of '
+        'the slowest functions to PATH.txt (default $TEMPOGGL_PROFILE)',
+    )
+    parser.add_argument(
+        '--profile-phases',
+        type=profile_phases,
+        default=list(PROFILE_PHASES),
+        metavar='PHASES',
+        help='comma separated phases to profile (default {})'.format(
+            ','.join(PROFILE_PHASES)
+        ),
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=positive_int,
+        default=DEFAULT_PROFILE_TOP,
+        metavar='N',
+        help='number of functions in the report (default {})'.format(
+            DEFAULT_PROFILE_TOP
+        ),
+    )
 
-            if error:
-                logger.error(error)
-                sys.exit(
-                    'error writing changes to toggl, please inspect all'
-                    ' listed worklog entries manually'
-                )
-            else:
-                print('done', file=sys.stderr)
-    elif isinstance(worklogs, WorklogError):
-        logger.critical(worklogs.message)
-        sys.exit(1)
-    else:
-        unreachable(worklogs)
-
-
-def format_prompt(
-    rows: Iterable[Tuple[datetime, timedelta, str, str]]
-) -> Iterator[str]:
-    msg_format = '{0:<20.20} {1:<10.10} {2:<15.15} {3}'
-    yield msg_format.format('started', 'duration', 'jira issue', 'description')
-
-    for start, duration, jira_key, description in rows:
-        spent_time = str(duration)
-
-        yield msg_format.format(
-            start.strftime('%a %d %b %H:%M'), spent_time, jira_key, description
-        )
+    parser.add_argument(
+        '-V',
+        '--version',
+        action=VersionAction,
+        nargs=0,
+        help="show program's version number and exit",
+    )
 
+    args = parser.parse_args()
 
-def yes_prompt(question: str) -> bool:
-    """Prompt yes/no with yes as default."""
-    while True:
-        prompted = input(question + ' [Yn]: ')
-        if prompted == '':
-            return True
-
-        try:
-            return strtobool(prompted)
-        except ValueError:
-            pass
-
-
-def prompt_for_pushing(
-    worklogs: Iterable[TempoTogglPair], verbose: bool
-) -> bool:
-    """Ask user if we want to continue pushing changes to Toggl."""
-    for row in format_prompt(
-        (
-            w.tempo_log.date_started,
-            timedelta(seconds=w.tempo_log.time_spent_seconds),
-            w.tempo_log.issue.key,
-            w.tempo_log.comment,
+    if args.batch and (args.username or args.toggl_api_token):
+        parser.error(
+            '--username and --toggl-api-token are set per user in --batch'
         )
-        for w in worklogs
-    ):
-        print(row, file=sys.stderr)
-
-    return yes_prompt('write changes to Toggl?')
 
+    if args.batch and args.watch:
+        parser.error('--watch cannot be used with --batch')
 
-def format_error(error: Any) -> str:
-    return '{}: {}'.format(': '.join(error['loc']), error['msg'])
+    return args
 
 
 def run() -> None:
@@ -278,38 +288,8 @@ def run() -> None:
         level=logging.INFO if args.verbose else logging.WARNING,
     )
 
-    file_config = create_or_read_config()
-    if isinstance(file_config, ValidationError):
-        for error in file_config.errors():
-            formatted_err = format_error(error)
-            logger.critical(
-                'invalid value for config parameter: {}'.format(formatted_err)
-            )
-        sys.exit(1)
-
-    logger.info('using config file config {}'.format(file_config))
-
-    config = validate_configs(args, file_config)
+    # the heavy dependencies are imported only after parsing the arguments,
+    # so that --help and --version are fast
+    from tempoggl.sync import run_sync
 
-    if isinstance(config, AppConfig):
-        logger.info('using combined configuration: {}'.format(config))
-
-        pw_prompt = 'jira password for {}: '.format(config.username)
-
-        start_syncing(config, getpass(pw_prompt))
-    elif isinstance(config, ValidationError):
-        for error in config.errors():
-            formatted_err = format_error(error)
-            logger.critical(
-                'invalid config/parameter value: {}'.format(formatted_err)
-            )
-
-        logger.critical('missing or invalid parameters, exiting...')
-        sys.exit(1)
-    elif isinstance(config, UnsafeJiraProtocol):
-        logger.critical(
-            'jira with http protocol not supported, please use https'
-        )
-        sys.exit(1)
-    else:
-        unreachable(config)
+    run_sync(args)
@@ -1,14 +1,24 @@
 import os
 from os import path
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Union, Any
 from configparser import ConfigParser
 import logging
 from textwrap import dedent
 from datetime import date
 
-from pydantic import BaseModel, HttpUrl, ValidationError
+from pydantic import (
+    BaseModel,
+    HttpUrl,
+    ValidationError,
+    PositiveInt,
+    conint,
+    confloat,
+)
 from pydantic.dataclasses import dataclass
 
+from tempoggl.preview import Preview
+from tempoggl.windows import FetchWindow
+
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +27,39 @@ EXAMPLE_CONFIG = dedent(
     [general]
     ; username: user.name@jira.com
     ; jira_url: https://jira.example.com
+    ; push_concurrency: 4
+    ; http_pool_size: 10
+    ; fetch_window: month
+    ; jira_cache_hours: 24
+    ; toggl_cache_hours: 24
+    ; jira_rate_limit: 10
+    ; preview: summary
+    ; metrics_textfile: /var/lib/node_exporter/tempoggl.prom
 
     [toggl_mapping]
     ; jira project key to toggl project id
     ; PROJ: 123456
+
+    ; users synced with --batch, one section per user
+    ; [user:name]
+    ; username: user.name@jira.com
+    ; jira_password_env: NAME_JIRA_PASSWORD
+    ; toggl_token_env: NAME_TOGGL_TOKEN
+    ; push_concurrency: 2
+    ; aggregate: true
+    ;
+    ; [toggl_mapping:name]
+    ; mapped in addition to [toggl_mapping]
+    ; PROJ: 654321
 """
 ).lstrip()
 
 CONFIG_FILENAME = 'tempoggl.cfg'
 
+USER_SECTION = 'user:'
+
+USER_MAPPING_SECTION = 'toggl_mapping:'
+
 
 @dataclass
 class GeneralConfig:
@@ -35,6 +69,36 @@ class GeneralConfig:
     from_date: Optional[date] = None
     verbose: Optional[bool] = None
     toggl_token: Optional[str] = None
+    toggl_url: Optional[HttpUrl] = None
+    push_concurrency: Optional[PositiveInt] = None
+    keep_going: Optional[bool] = None
+    http_pool_size: Optional[PositiveInt] = None
+    incremental: Optional[bool] = None
+    fetch_window: Optional[FetchWindow] = None
+    fetch_concurrency: Optional[PositiveInt] = None
+    fast_validation: Optional[bool] = None
+    targeted_metadata: Optional[bool] = None
+    jira_cache_hours: Optional[conint(ge=0)] = None  # type: ignore
+    toggl_cache_hours: Optional[conint(ge=0)] = None  # type: ignore
+    reconcile: Optional[bool] = None
+    jira_rate_limit: Optional[confloat(gt=0)] = None  # type: ignore
+    batch_concurrency: Optional[PositiveInt] = None
+    metrics_json: Optional[str] = None
+    metrics_textfile: Optional[str] = None
+    aggregate: Optional[bool] = None
+    preview: Optional[Preview] = None
+
+
+class UserProfile(BaseModel):
+    """User synced in the batch mode, in a [user:NAME] section."""
+
+    username: Optional[str]  # jira username, NAME by default
+    jira_password_env: Optional[str]  # environment variable of the password
+    toggl_token: Optional[str]
+    toggl_token_env: Optional[str]
+    push_concurrency: Optional[PositiveInt]
+    aggregate: Optional[bool]
+    toggl_mapping: Dict[str, int] = {}  # from [toggl_mapping:NAME]
 
 
 class FileConfig(BaseModel):
@@ -42,6 +106,7 @@ class FileConfig(BaseModel):
 
     general: GeneralConfig
     toggl_mapping: Dict[str, int]  # tempo key "PROJ" to toggl project id
+    users: Dict[str, UserProfile] = {}
 
 
 class Environment(BaseModel):
@@ -64,6 +129,29 @@ def config_dir(env: Environment) -> str:
     return config_path
 
 
+def user_profiles(config: ConfigParser) -> Dict[str, Dict[str, Any]]:
+    """Sections of the batch mode users by user name."""
+    profiles = {}
+
+    for section in config.sections():
+        if not section.startswith(USER_SECTION):
+            continue
+
+        name = section.replace(USER_SECTION, '', 1)
+        mapping_section = USER_MAPPING_SECTION + name
+        mapping = (
+            dict(config.items(mapping_section))
+            if config.has_section(mapping_section)
+            else {}
+        )
+        profiles[name] = {
+            **dict(config.items(section)),
+            'toggl_mapping': mapping,
+        }
+
+    return profiles
+
+
 def read_config(path: str) -> Union[FileConfig, ValidationError]:
     config = ConfigParser()
 
@@ -72,7 +160,12 @@ def read_config(path: str) -> Union[FileConfig, ValidationError]:
     config.optionxform = str  # type: ignore
     config.read(path)
 
-    dict_conf = {s: dict(config.items(s)) for s in config.sections()}
+    dict_conf: Dict[str, Any] = {
+        s: dict(config.items(s))
+        for s in config.sections()
+        if not s.startswith((USER_SECTION, USER_MAPPING_SECTION))
+    }
+    dict_conf['users'] = user_profiles(config)
 
     try:
         return FileConfig.parse_obj(dict_conf)
@@ -80,9 +173,12 @@ def read_config(path: str) -> Union[FileConfig, ValidationError]:
         return errors
 
 
+def default_config_dir() -> str:
+    return config_dir(Environment.parse_obj(dict(os.environ)))
+
+
 def create_or_read_config() -> Union[FileConfig, ValidationError]:
-    env = Environment.parse_obj(dict(os.environ))
-    dir = config_dir(env)
+    dir = default_config_dir()
 
     if not path.exists(dir):
         logger.info('creating config dirs {}'.format(dir))
@@ -108,3 +204,20 @@ class AppConfig(BaseModel):
     verbose: bool
     jira_to_toggl: Dict[str, int]  # jira project key to toggl project id
     toggl_token: str
+    toggl_url: HttpUrl
+    push_concurrency: PositiveInt
+    keep_going: bool  # continue pushing after the first failed entry
+    http_pool_size: PositiveInt  # max open connections per host
+    ignore_ledger: bool  # push worklogs even if they are already synced
+    incremental: bool  # fetch only worklogs updated since the last sync
+    fetch_window: FetchWindow
+    fetch_concurrency: PositiveInt
+    fast_validation: bool  # validate only a sample of api responses
+    refresh_cache: bool
+    targeted_metadata: bool  # fetch only the projects which are used
+    jira_cache_hours: conint(ge=0)  # type: ignore
+    toggl_cache_hours: conint(ge=0)  # type: ignore
+    reconcile: bool  # skip worklogs which already exist in toggl
+    jira_rate_limit: Optional[confloat(gt=0)]  # type: ignore
+    aggregate: bool  # merge the worklogs of an issue and a day
+    preview: Preview
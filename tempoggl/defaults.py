@@ -0,0 +1,10 @@
+"""Defaults shared by the command line and the sync, without imports."""
+
+DEFAULT_PUSH_CONCURRENCY = 4
+
+DEFAULT_FETCH_CONCURRENCY = 4
+
+# fetch includes waiting for the responses, the others are cpu work
+PROFILE_PHASES = ('fetch', 'parse', 'join', 'push')
+
+DEFAULT_PROFILE_TOP = 30
@@ -0,0 +1,196 @@
+"""Follow edits and removals of synced Tempo worklogs in Toggl."""
+
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Event
+import logging
+import traceback
+
+from requests.exceptions import HTTPError, RequestException
+
+from tempoggl.ledger import SyncedWorklog
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.tempo import TempoTogglPair
+from tempoggl.toggl import (
+    TOGGL_API_URL,
+    TOGGL_REQUESTS_PER_SECOND,
+    TogglEntry,
+    delete_entry,
+    push_entry,
+    update_entry,
+)
+from tempoggl.transport import Transport
+
+
+logger = logging.getLogger(__name__)
+
+# worklog and the id of its toggl entry
+Update = Tuple[TempoTogglPair, int]
+
+
+@dataclass
+class Plan:
+    create: List[TempoTogglPair]
+    update: List[Update]  # edited after they were synced
+    delete: List[SyncedWorklog]  # removed from tempo
+
+    def is_empty(self) -> bool:
+        return not (self.create or self.update or self.delete)
+
+
+@dataclass
+class ChangeResult:
+    updated: List[Update]  # with the new id if the entry was created again
+    deleted: List[int]  # worklog ids
+    errors: List[str]
+
+
+def make_plan(
+    worklogs: Iterable[TempoTogglPair],
+    synced: Mapping[int, SyncedWorklog],
+    removable: Iterable[SyncedWorklog] = (),
+) -> Plan:
+    """Decide what to do with the Toggl entry of each worklog.
+
+    :param synced: the ledger rows of the fetched worklogs by worklog id.
+    :param removable: the ledger rows of the fetched date range. The ones
+    which were not fetched have been removed from Tempo.
+
+    The entry of a merged worklog is updated when its worklogs are added,
+    edited or removed, and the entries of its worklogs which were pushed
+    separately before are deleted.
+    """
+    plan = Plan(create=[], update=[], delete=[])
+    fetched: Set[int] = set()
+    # entries of the fetched worklogs by toggl id
+    entries: Dict[int, TempoTogglPair] = {}
+    updated: Set[int] = set()
+
+    for worklog in worklogs:
+        worklog_ids = worklog.worklog_ids
+        fetched.update(worklog_ids)
+        previous = [synced[i] for i in worklog_ids if i in synced]
+
+        if not previous:
+            plan.create.append(worklog)
+            continue
+
+        toggl_id = previous[0].toggl_id
+        entries[toggl_id] = worklog
+        # merged worklogs which were pushed separately before
+        separate = [i for i in previous if i.toggl_id != toggl_id]
+        plan.delete.extend(separate)
+        edited = any(
+            worklog.tempo_log.date_updated > i.date_updated for i in previous
+        )
+        added = len(previous) < len(worklog_ids)
+
+        if edited or added or separate:
+            plan.update.append((worklog, toggl_id))
+            updated.add(toggl_id)
+
+    for removed in removable:
+        if removed.worklog_id in fetched:
+            continue
+
+        merged = entries.get(removed.toggl_id)
+
+        if merged is None:
+            plan.delete.append(removed)
+        elif removed.toggl_id not in updated:
+            # the entry is left with the rest of its merged worklogs
+            plan.update.append((merged, removed.toggl_id))
+            updated.add(removed.toggl_id)
+
+    return plan
+
+
+def apply_changes(
+    plan: Plan,
+    convert: Callable[[TempoTogglPair], TogglEntry],
+    transport: Transport,
+    concurrency: int = 1,
+    stop_on_error: bool = True,
+    limiter: Optional[TokenBucket] = None,
+    api_url: str = TOGGL_API_URL,
+) -> ChangeResult:
+    """Update and delete the Toggl entries of the plan.
+
+    The creations are left for `push_worklogs`, but entries deleted by hand
+    in Toggl are created again instead of updated. The request rate is
+    limited like in `push_worklogs`, so the same `limiter` should be used
+    for both.
+    """
+    limiter = limiter or TokenBucket(TOGGL_REQUESTS_PER_SECOND)
+    stop = Event()
+    result = ChangeResult(updated=[], deleted=[], errors=[])
+
+    def run(description: str, request: Callable[[], None]) -> None:
+        if stop.is_set():
+            return
+
+        limiter.acquire()
+
+        if stop.is_set():
+            return
+
+        logger.info(description)
+
+        try:
+            request()
+        except HTTPError as err:
+            error = err.response.text
+        except (RequestException, ValueError, KeyError):
+            error = traceback.format_exc()
+        else:
+            return
+
+        result.errors.append('failed {}: {}'.format(description, error))
+
+        if stop_on_error:
+            stop.set()
+
+    def update(worklog: TempoTogglPair, toggl_id: int) -> None:
+        entry = convert(worklog)
+
+        def request() -> None:
+            if update_entry(toggl_id, entry, transport, api_url):
+                result.updated.append((worklog, toggl_id))
+                return
+
+            # deleted by hand in toggl, the ledger gets the new id
+            logger.info('entry {} not found, creating it'.format(toggl_id))
+            limiter.acquire()
+            new_id = push_entry(entry, transport, api_url)
+            result.updated.append((worklog, new_id))
+
+        run('updating entry {}'.format(toggl_id), request)
+
+    def delete(synced: SyncedWorklog) -> None:
+        def request() -> None:
+            delete_entry(synced.toggl_id, transport, api_url)
+            result.deleted.append(synced.worklog_id)
+
+        run('deleting entry {}'.format(synced.toggl_id), request)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(update, worklog, toggl_id)
+            for worklog, toggl_id in plan.update
+        ]
+        futures += [executor.submit(delete, i) for i in plan.delete]
+
+        for future in futures:
+            future.result()
+
+    return result
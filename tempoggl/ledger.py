@@ -0,0 +1,222 @@
+"""Local record of Tempo worklogs which have already been pushed to Toggl."""
+
+from typing import (
+    Iterable,
+    Set,
+    List,
+    Sequence,
+    Tuple,
+    Optional,
+    Dict,
+    NamedTuple,
+)
+from datetime import datetime, date
+from os import path
+import sqlite3
+import logging
+
+from pydantic.datetime_parse import parse_datetime
+
+from tempoggl.tempo import TempoTogglPair
+
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FILENAME = 'tempoggl.db'
+
+# sqlite supports at most 999 host parameters in a single query
+MAX_QUERY_PARAMETERS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS synced_worklogs (
+    jira_url TEXT NOT NULL,
+    worklog_id INTEGER NOT NULL,
+    toggl_id INTEGER NOT NULL,
+    date_updated TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    date_started TEXT,
+    username TEXT,
+    PRIMARY KEY (jira_url, worklog_id)
+);
+
+CREATE INDEX IF NOT EXISTS synced_worklogs_toggl_id
+ON synced_worklogs (jira_url, toggl_id);
+
+CREATE TABLE IF NOT EXISTS watermarks (
+    jira_url TEXT NOT NULL,
+    username TEXT NOT NULL,
+    date_updated TEXT NOT NULL,
+    PRIMARY KEY (jira_url, username)
+);
+"""
+
+# columns added after the first version, NULL in the old rows
+ADDED_COLUMNS = ['date_started', 'username']
+
+
+class SyncedWorklog(NamedTuple):
+    worklog_id: int
+    toggl_id: int
+    date_updated: datetime
+
+
+class Ledger:
+    """Tempo worklog ids and the Toggl entries created from them.
+
+    Worklog ids are only unique within a single Jira instance, so every
+    worklog is identified by the Jira url and the worklog id. The worklogs
+    are recorded as the worklogs of `username`.
+    """
+
+    def __init__(
+        self, db_path: str, jira_url: str, username: Optional[str] = None
+    ) -> None:
+        """Open or create the ledger database at `db_path`."""
+        self.jira_url = jira_url
+        self.username = username
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self._add_columns()
+        # read once, a long-running sync keeps them up to date
+        self._watermarks: Dict[str, Optional[datetime]] = {}
+
+    def _add_columns(self) -> None:
+        columns = {
+            row[1]
+            for row in self.connection.execute(
+                'PRAGMA table_info(synced_worklogs)'
+            )
+        }
+
+        with self.connection:
+            for column in ADDED_COLUMNS:
+                if column not in columns:
+                    self.connection.execute(
+                        'ALTER TABLE synced_worklogs '
+                        'ADD COLUMN {} TEXT'.format(column)
+                    )
+
+    def synced(self, worklog_ids: Iterable[int]) -> Dict[int, SyncedWorklog]:
+        """Return the already synced worklogs of `worklog_ids` by id."""
+        ids = list(worklog_ids)
+        synced: Dict[int, SyncedWorklog] = {}
+
+        for start in range(0, len(ids), MAX_QUERY_PARAMETERS):
+            end = start + MAX_QUERY_PARAMETERS
+            chunk = ids[start:end]
+
+            rows = self.connection.execute(
+                'SELECT worklog_id, toggl_id, date_updated '
+                'FROM synced_worklogs '
+                'WHERE jira_url = ? AND worklog_id IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                [self.jira_url, *chunk],
+            )
+
+            synced.update((row[0], synced_worklog(row)) for row in rows)
+
+        return synced
+
+    def synced_ids(self, worklog_ids: Iterable[int]) -> Set[int]:
+        """Return the subset of `worklog_ids` which are already synced."""
+        return set(self.synced(worklog_ids))
+
+    def synced_between(self, start: date, end: date) -> List[SyncedWorklog]:
+        """Worklogs of the user started on the days from `start` to `end`.
+
+        The worklogs recorded before the start dates were saved are never
+        returned.
+        """
+        rows = self.connection.execute(
+            'SELECT worklog_id, toggl_id, date_updated FROM synced_worklogs '
+            'WHERE jira_url = ? AND username = ? '
+            'AND substr(date_started, 1, 10) BETWEEN ? AND ?',
+            (self.jira_url, self.username, start.isoformat(), end.isoformat()),
+        )
+
+        return [synced_worklog(row) for row in rows]
+
+    def unsynced(
+        self, worklogs: Sequence[TempoTogglPair]
+    ) -> List[TempoTogglPair]:
+        synced = self.synced_ids(w.tempo_log.id for w in worklogs)
+
+        return [w for w in worklogs if w.tempo_log.id not in synced]
+
+    def record(self, pushed: Iterable[Tuple[TempoTogglPair, int]]) -> None:
+        """Save worklogs and the ids of the Toggl entries created from them.
+
+        A Toggl entry belongs only to the worklogs it was last saved with,
+        e.g. a merged worklog which has lost some of its worklogs.
+        """
+        pushed = list(pushed)
+        synced_at = datetime.now().isoformat()
+
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM synced_worklogs '
+                'WHERE jira_url = ? AND toggl_id = ?',
+                ((self.jira_url, toggl_id) for _, toggl_id in pushed),
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO synced_worklogs (jira_url, '
+                'worklog_id, toggl_id, date_updated, synced_at, date_started, '
+                'username) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        self.jira_url,
+                        worklog_id,
+                        toggl_id,
+                        worklog.tempo_log.date_updated.isoformat(),
+                        synced_at,
+                        worklog.tempo_log.date_started.isoformat(),
+                        self.username,
+                    )
+                    for worklog, toggl_id in pushed
+                    for worklog_id in worklog.worklog_ids
+                ),
+            )
+
+    def forget(self, worklog_ids: Iterable[int]) -> None:
+        """Remove worklogs whose Toggl entries were deleted."""
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM synced_worklogs '
+                'WHERE jira_url = ? AND worklog_id = ?',
+                ((self.jira_url, i) for i in worklog_ids),
+            )
+
+    def watermark(self, username: str) -> Optional[datetime]:
+        """Newest worklog update time of the last successful sync."""
+        if username not in self._watermarks:
+            row = self.connection.execute(
+                'SELECT date_updated FROM watermarks '
+                'WHERE jira_url = ? AND username = ?',
+                (self.jira_url, username),
+            ).fetchone()
+            self._watermarks[username] = (
+                parse_datetime(row[0]) if row else None
+            )
+
+        return self._watermarks[username]
+
+    def save_watermark(self, username: str, date_updated: datetime) -> None:
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)',
+                (self.jira_url, username, date_updated.isoformat()),
+            )
+
+        self._watermarks[username] = date_updated
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def synced_worklog(row: Tuple[int, int, str]) -> SyncedWorklog:
+    return SyncedWorklog(row[0], row[1], parse_datetime(row[2]))
+
+
+def ledger_path(config_dir: str) -> str:
+    return path.join(config_dir, LEDGER_FILENAME)
@@ -0,0 +1,335 @@
+"""Timings of the sync phases and counters of the HTTP requests.
+
+Everything is recorded into the active `Metrics`, so that the measured code
+doesn't need to pass it around. Without an active one, recording does
+nothing. The metrics are written as a JSON summary and as a Prometheus
+textfile for the textfile collector of node exporter.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter, time
+import json
+import os
+
+
+# upper bounds of the request duration histogram, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+BUCKET_LABELS = [str(b) for b in LATENCY_BUCKETS] + ['+Inf']
+
+PROMETHEUS_PREFIX = 'tempoggl_'
+
+# name suffix, labels and value of a single line
+Sample = Tuple[str, str, Any]
+
+
+@dataclass
+class PhaseTime:
+    seconds: float = 0.0
+    count: int = 0
+
+
+@dataclass
+class HostMetrics:
+    requests: Dict[str, int] = field(default_factory=dict)  # by status
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latency_sum: float = 0.0
+    # not cumulative, the last one is for the slower requests
+    latency_buckets: List[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+
+
+class Metrics:
+    """Thread safe collection of the metrics of a single run.
+
+    Phases may overlap: e.g. "validate" is the time spent validating in
+    all threads, which is also part of the phase which waited for them.
+    """
+
+    def __init__(
+        self,
+        json_path: Optional[str] = None,
+        textfile_path: Optional[str] = None,
+    ) -> None:
+        """Write the metrics to the given paths on `write`."""
+        self.json_path = json_path
+        self.textfile_path = textfile_path
+        self.phases: Dict[str, PhaseTime] = {}
+        self.hosts: Dict[str, HostMetrics] = {}
+        self.gauges: Dict[str, float] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            phase = self.phases.setdefault(name, PhaseTime())
+            phase.seconds += seconds
+            phase.count += 1
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def mark_run(self, success: bool) -> None:
+        self.set_gauge('last_run_success', float(success))
+        self.set_gauge('last_run_timestamp_seconds', time())
+
+    def record_request(
+        self,
+        host: str,
+        status: str,
+        seconds: float,
+        sent: int = 0,
+        received: int = 0,
+    ) -> None:
+        with self._lock:
+            host_metrics = self.hosts.setdefault(host, HostMetrics())
+            requests = host_metrics.requests
+            requests[status] = requests.get(status, 0) + 1
+            host_metrics.bytes_sent += sent
+            host_metrics.bytes_received += received
+            host_metrics.latency_sum += seconds
+            bucket = bisect_left(LATENCY_BUCKETS, seconds)
+            host_metrics.latency_buckets[bucket] += 1
+
+    def record_received(self, host: str, received: int) -> None:
+        """Add the bytes of a streamed body, known only once it's read."""
+        with self._lock:
+            host_metrics = self.hosts.setdefault(host, HostMetrics())
+            host_metrics.bytes_received += received
+
+    def record_retry(self, host: str) -> None:
+        with self._lock:
+            self.hosts.setdefault(host, HostMetrics()).retries += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'phases': {
+                    name: {'seconds': round(p.seconds, 6), 'count': p.count}
+                    for name, p in sorted(self.phases.items())
+                },
+                'hosts': {
+                    host: {
+                        'requests': dict(sorted(h.requests.items())),
+                        'retries': h.retries,
+                        'bytes_sent': h.bytes_sent,
+                        'bytes_received': h.bytes_received,
+                        'latency_seconds': round(h.latency_sum, 6),
+                        'latency_buckets': dict(
+                            zip(BUCKET_LABELS, h.latency_buckets)
+                        ),
+                    }
+                    for host, h in sorted(self.hosts.items())
+                },
+                'gauges': dict(sorted(self.gauges.items())),
+            }
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text format."""
+        lines: List[str] = []
+
+        def add(name: str, kind: str, samples: Iterable[Sample]) -> None:
+            full_name = PROMETHEUS_PREFIX + name
+            lines.append('# TYPE {} {}'.format(full_name, kind))
+            lines.extend(
+                '{}{}{} {}'.format(full_name, suffix, labels, value)
+                for suffix, labels, value in samples
+            )
+
+        with self._lock:
+            phases = sorted(self.phases.items())
+            hosts = sorted(self.hosts.items())
+
+            # summed over the cycles of the watch mode
+            add(
+                'phase_seconds_total',
+                'counter',
+                (('', label(phase=name), p.seconds) for name, p in phases),
+            )
+            add(
+                'http_requests_total',
+                'counter',
+                (
+                    ('', label(host=host, status=status), count)
+                    for host, h in hosts
+                    for status, count in sorted(h.requests.items())
+                ),
+            )
+
+            for name, attribute in [
+                ('http_retries_total', 'retries'),
+                ('http_sent_bytes_total', 'bytes_sent'),
+                ('http_received_bytes_total', 'bytes_received'),
+            ]:
+                add(
+                    name,
+                    'counter',
+                    (
+                        ('', label(host=host), getattr(h, attribute))
+                        for host, h in hosts
+                    ),
+                )
+
+            add(
+                'http_request_duration_seconds',
+                'histogram',
+                (
+                    sample
+                    for host, h in hosts
+                    for sample in histogram_samples(host, h)
+                ),
+            )
+
+            for name, value in sorted(self.gauges.items()):
+                add(name, 'gauge', [('', '', value)])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self) -> None:
+        """Write the files, replacing the old ones atomically."""
+        if self.json_path:
+            write_atomic(
+                self.json_path, json.dumps(self.summary(), indent=2) + '\n'
+            )
+
+        if self.textfile_path:
+            write_atomic(self.textfile_path, self.prometheus())
+
+
+def histogram_samples(host: str, metrics: HostMetrics) -> Iterator[Sample]:
+    cumulative = 0
+
+    for bound, count in zip(BUCKET_LABELS, metrics.latency_buckets):
+        cumulative += count
+        yield ('_bucket', label(host=host, le=bound), cumulative)
+
+    yield ('_sum', label(host=host), metrics.latency_sum)
+    yield ('_count', label(host=host), cumulative)
+
+
+def label(**labels: str) -> str:
+    return '{{{}}}'.format(
+        ','.join(
+            '{}="{}"'.format(key, value.replace('"', '\\"'))
+            for key, value in labels.items()
+        )
+    )
+
+
+def write_atomic(file_path: str, content: str) -> None:
+    # node exporter must never read a partially written file
+    tmp_path = file_path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+
+    os.replace(tmp_path, file_path)
+
+
+_active: Optional[Metrics] = None
+
+
+def activate(metrics: Optional[Metrics]) -> None:
+    """Record into `metrics` from now on, or stop recording with None."""
+    global _active
+    _active = metrics
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    metrics = _active
+
+    if metrics is None:
+        yield
+    else:
+        with metrics.phase(name):
+            yield
+
+
+def add_time(name: str, seconds: float) -> None:
+    if _active is not None:
+        _active.add_time(name, seconds)
+
+
+def set_gauge(name: str, value: float) -> None:
+    if _active is not None:
+        _active.set_gauge(name, value)
+
+
+def mark_run(success: bool) -> None:
+    if _active is not None:
+        _active.mark_run(success)
+
+
+def record_request(
+    host: str, status: str, seconds: float, sent: int = 0, received: int = 0
+) -> None:
+    if _active is not None:
+        _active.record_request(host, status, seconds, sent, received)
+
+
+def record_received(host: str, received: int) -> None:
+    if _active is not None:
+        _active.record_received(host, received)
+
+
+def record_retry(host: str) -> None:
+    if _active is not None:
+        _active.record_retry(host)
+
+
+def flush() -> None:
+    """Write the files of the active metrics, e.g. after each watch cycle."""
+    if _active is not None:
+        _active.write()
+
+
+@contextmanager
+def collect(
+    json_path: Optional[str], textfile_path: Optional[str]
+) -> Iterator[None]:
+    """Collect metrics of the run if either file is wanted.
+
+    The files are written even if the run fails, with the success gauge
+    telling whether it did.
+    """
+    if not (json_path or textfile_path):
+        yield
+        return
+
+    metrics = Metrics(json_path, textfile_path)
+    activate(metrics)
+    success = False
+
+    try:
+        with metrics.phase('total'):
+            yield
+
+        success = True
+    except SystemExit as exit:
+        success = not exit.code
+        raise
+    finally:
+        activate(None)
+        metrics.mark_run(success)
+        metrics.write()
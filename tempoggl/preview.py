@@ -0,0 +1,109 @@
+"""What is shown before pushing: the worklogs, or their totals."""
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from enum import Enum
+
+
+class Preview(str, Enum):
+    """How the worklogs are shown in the prompt."""
+
+    AUTO = 'auto'  # totals if there are more than PREVIEW_ROWS worklogs
+    ROWS = 'rows'
+    SUMMARY = 'summary'
+
+
+PREVIEW_ROWS = 50
+
+# started, duration, jira issue key and description
+Row = Tuple[datetime, timedelta, str, str]
+
+# jira project key, toggl project name, day and duration
+SummaryRow = Tuple[str, str, date, timedelta]
+
+
+def format_prompt(rows: Iterable[Row]) -> Iterator[str]:
+    msg_format = '{0:<20.20} {1:<10.10} {2:<15.15} {3}'
+    yield msg_format.format('started', 'duration', 'jira issue', 'description')
+
+    for start, duration, jira_key, description in rows:
+        spent_time = str(duration)
+
+        yield msg_format.format(
+            start.strftime('%a %d %b %H:%M'), spent_time, jira_key, description
+        )
+
+
+@dataclass
+class Total:
+    entries: int = 0
+    duration: timedelta = timedelta()
+
+    def add(self, duration: timedelta) -> None:
+        self.entries += 1
+        self.duration += duration
+
+
+@dataclass
+class Summary:
+    jira_projects: Dict[str, Total] = field(default_factory=dict)
+    toggl_projects: Dict[str, Total] = field(default_factory=dict)
+    days: Dict[date, Total] = field(default_factory=dict)
+    total: Total = field(default_factory=Total)
+
+
+def summarize(rows: Iterable[SummaryRow]) -> Summary:
+    """Total time per Jira project, Toggl project and day in a single pass."""
+    summary = Summary()
+
+    for jira_key, toggl_name, day, duration in rows:
+        summary.jira_projects.setdefault(jira_key, Total()).add(duration)
+        summary.toggl_projects.setdefault(toggl_name, Total()).add(duration)
+        summary.days.setdefault(day, Total()).add(duration)
+        summary.total.add(duration)
+
+    return summary
+
+
+def format_duration(duration: timedelta) -> str:
+    """Hours and minutes, e.g. "26:05", which is shorter than "1 day"."""
+    minutes = int(duration.total_seconds()) // 60
+
+    return '{}:{:02}'.format(*divmod(minutes, 60))
+
+
+def format_summary(summary: Summary) -> List[str]:
+    row_format = '{0:<30.30} {1:>8} {2:>10}'
+    sections: List[Tuple[str, Iterable[Tuple[str, Total]]]] = [
+        ('jira project', sorted(summary.jira_projects.items())),
+        ('toggl project', sorted(summary.toggl_projects.items())),
+        (
+            'day',
+            (
+                (day.strftime('%a %d %b %Y'), total)
+                for day, total in sorted(summary.days.items())
+            ),
+        ),
+    ]
+    lines = []
+
+    for title, totals in sections:
+        lines.append(row_format.format(title, 'entries', 'duration'))
+        lines.extend(
+            row_format.format(
+                name, total.entries, format_duration(total.duration)
+            )
+            for name, total in totals
+        )
+        lines.append('')
+
+    lines.append(
+        row_format.format(
+            'total',
+            summary.total.entries,
+            format_duration(summary.total.duration),
+        )
+    )
+
+    return lines
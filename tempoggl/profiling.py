@@ -0,0 +1,149 @@
+"""Profile the CPU time of selected phases of a sync.
+
+The code marks its sections with the phase they belong to. Sections nest,
+and the innermost one decides whether the thread is profiled, so e.g. the
+time a join waits for the worklogs being fetched is not part of the join.
+Each thread is profiled separately, and the profiles are combined at the
+end.
+"""
+
+from typing import Collection, Iterator, List, Optional, TextIO
+from cProfile import Profile
+from contextlib import contextmanager
+from io import StringIO
+from threading import Lock, local
+import pstats
+import sys
+
+from tempoggl.defaults import DEFAULT_PROFILE_TOP, PROFILE_PHASES
+
+
+class NullProfiler:
+    """Sections of a run without profiling, which cost next to nothing."""
+
+    def start(self, phase: str) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class Profiler(NullProfiler):
+    def __init__(self, phases: Collection[str] = PROFILE_PHASES) -> None:
+        """Profile the sections of `phases`."""
+        self.phases = frozenset(phases)
+        self._profiles: List[Profile] = []
+        self._lock = Lock()
+        self._local = local()
+
+    def _thread_state(self) -> 'local':
+        state = self._local
+
+        if not hasattr(state, 'profile'):
+            state.profile = Profile()
+            state.sections = []
+            state.enabled = False
+
+            with self._lock:
+                self._profiles.append(state.profile)
+
+        return state
+
+    def _set_enabled(self, state: 'local', enabled: bool) -> None:
+        if enabled == state.enabled:
+            return
+
+        if enabled:
+            try:
+                state.profile.enable()
+            except ValueError:
+                # another profiler is active, e.g. a debugger
+                return
+        else:
+            state.profile.disable()
+
+        state.enabled = enabled
+
+    def start(self, phase: str) -> None:
+        state = self._thread_state()
+        state.sections.append(phase in self.phases)
+        self._set_enabled(state, state.sections[-1])
+
+    def stop(self) -> None:
+        state = self._thread_state()
+        state.sections.pop()
+        self._set_enabled(state, bool(state.sections and state.sections[-1]))
+
+    def stats(self, stream: Optional[TextIO] = None) -> pstats.Stats:
+        """Combine the stats of all threads, which must have stopped."""
+        stats = pstats.Stats(stream=stream)
+
+        with self._lock:
+            stats.add(*self._profiles)
+
+        return stats
+
+    def write(self, stats_path: str, top: int = DEFAULT_PROFILE_TOP) -> str:
+        """Write the stats for pstats and a report of the slowest functions.
+
+        :returns: path of the report.
+        """
+        report = StringIO()
+        stats = self.stats(report)
+        stats.dump_stats(stats_path)
+        stats.sort_stats('tottime').print_stats(top)
+
+        report_path = stats_path + '.txt'
+
+        with open(report_path, 'w') as f:
+            f.write(report.getvalue())
+
+        return report_path
+
+
+NULL_PROFILER = NullProfiler()
+
+_active: Optional[Profiler] = None
+
+
+def current() -> NullProfiler:
+    """Profiler of the run, for marking sections in hot loops."""
+    return _active or NULL_PROFILER
+
+
+@contextmanager
+def section(phase: str) -> Iterator[None]:
+    profiler = current()
+    profiler.start(phase)
+
+    try:
+        yield
+    finally:
+        profiler.stop()
+
+
+@contextmanager
+def profile(
+    stats_path: Optional[str],
+    phases: Collection[str] = PROFILE_PHASES,
+    top: int = DEFAULT_PROFILE_TOP,
+) -> Iterator[None]:
+    """Profile the run if `stats_path` is given, and write the results."""
+    global _active
+
+    if not stats_path:
+        yield
+        return
+
+    profiler = Profiler(phases)
+    _active = profiler
+
+    try:
+        yield
+    finally:
+        _active = None
+        report_path = profiler.write(stats_path, top)
+        print(
+            'profile written to {} and {}'.format(stats_path, report_path),
+            file=sys.stderr,
+        )
@@ -0,0 +1,85 @@
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Callable, Optional
+
+
+class TokenBucket:
+    """Thread safe token bucket for limiting the request rate."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = monotonic,
+        sleeper: Callable[[float], None] = sleep,
+    ) -> None:
+        """Refill `rate` tokens per second, up to `capacity` tokens."""
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleeper
+        self._updated = clock()
+        self._lock = Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                self._refill()
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            self._sleep(wait)
+
+
+class AdaptiveLimiter(TokenBucket):
+    """Token bucket which slows down when the server starts throttling.
+
+    The rate is halved on every 429 response and raised again by a tenth of
+    the initial rate after `increase_after` successful responses in a row.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: Optional[float] = None,
+        increase_after: int = 10,
+        **kwargs: Any,
+    ) -> None:
+        """Start at `rate`, which is also the highest rate."""
+        super().__init__(rate, **kwargs)
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.increase_after = increase_after
+        self._successes = 0
+
+    def record(self, status: int) -> None:
+        """Adjust the rate by the status of a response."""
+        with self._lock:
+            self._refill()
+
+            if status == 429:
+                self._successes = 0
+                self.rate = max(self.min_rate, self.rate / 2)
+            elif status < 500:
+                self._successes += 1
+
+                if self._successes >= self.increase_after:
+                    self._successes = 0
+                    self.rate = min(
+                        self.max_rate, self.rate + self.max_rate / 10
+                    )
@@ -0,0 +1,135 @@
+"""When and how long to wait before repeating a failed request."""
+
+from typing import Callable, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import random
+from time import sleep
+
+from requests import Response
+from requests.exceptions import (
+    ConnectionError,
+    ConnectTimeout,
+    RequestException,
+    Timeout,
+)
+from urllib3.exceptions import NewConnectionError
+
+
+# throttled, or the server or a proxy in front of it failed
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# repeating these has the same effect as sending them once
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+DEFAULT_RETRIES = 4
+
+# never wait longer than this, even if the server asks to
+MAX_RETRY_AFTER = 120.0
+
+
+def retry_after(response: Response) -> Optional[float]:
+    """Seconds to wait by the Retry-After header, in seconds or a date."""
+    value = response.headers.get('Retry-After')
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        until = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (until - datetime.now(timezone.utc)).total_seconds())
+
+
+def never_sent(error: RequestException) -> bool:
+    """Whether the request failed before it was sent, e.g. DNS or refused."""
+    if isinstance(error, ConnectTimeout):
+        return True
+
+    # requests wraps the MaxRetryError of urllib3, which has the cause
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+
+    return isinstance(reason, NewConnectionError)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter.
+
+    A POST which failed with 5xx or timed out may still have created an
+    entry, and repeating it would create a duplicate. Non-idempotent
+    requests are thus retried only when throttled or when they were never
+    sent.
+    """
+
+    def __init__(
+        self,
+        retries: int = DEFAULT_RETRIES,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        jitter: Callable[[], float] = random,
+        sleeper: Callable[[float], None] = sleep,
+    ) -> None:
+        """Retry up to `retries` times, doubling `base_delay` every time."""
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._jitter = jitter
+        self._sleep = sleeper
+
+    def should_retry(
+        self,
+        attempt: int,
+        response: Optional[Response] = None,
+        error: Optional[RequestException] = None,
+        method: str = 'GET',
+    ) -> bool:
+        """Decide after the `attempt`:th try, counting from zero."""
+        if attempt >= self.retries:
+            return False
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        if response is not None:
+            if not idempotent:
+                return response.status_code == 429
+
+            return response.status_code in RETRY_STATUSES
+
+        if not idempotent:
+            return error is not None and never_sent(error)
+
+        return isinstance(error, (ConnectionError, Timeout))
+
+    def delay(
+        self, attempt: int, response: Optional[Response] = None
+    ) -> float:
+        """Seconds to wait before the next try.
+
+        Retry-After of the response wins over the backoff, but some jitter
+        is added so that the workers don't all retry at the same moment.
+        """
+        backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+        asked = retry_after(response) if response is not None else None
+
+        if asked is not None:
+            spread = self._jitter() * self.base_delay
+
+            return min(MAX_RETRY_AFTER, asked) + spread
+
+        return self._jitter() * backoff
+
+    def wait(self, attempt: int, response: Optional[Response] = None) -> None:
+        self._sleep(self.delay(attempt, response))
+
+
+NO_RETRIES = RetryPolicy(retries=0)
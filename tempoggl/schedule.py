@@ -0,0 +1,133 @@
+"""When the watch mode syncs: at a fixed interval or by a cron expression."""
+
+from typing import Set, Union
+from datetime import date, datetime, timedelta
+import re
+
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+# minute, hour, day of month, month, day of week
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# e.g. "0 0 30 2 *" never matches
+MAX_CRON_SEARCH = timedelta(days=5 * 366)
+
+
+class Interval:
+    def __init__(self, seconds: int) -> None:
+        """Run every `seconds` seconds."""
+        self.seconds = seconds
+
+    def next_run(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+
+def parse_field(text: str, low: int, high: int) -> Set[int]:
+    """Values of a cron field, e.g. "*/15", "1-5" or "0,30"."""
+    values: Set[int] = set()
+
+    for part in text.split(','):
+        range_text, _, step_text = part.partition('/')
+
+        try:
+            step = int(step_text) if step_text else 1
+
+            if range_text == '*':
+                start, end = low, high
+            elif '-' in range_text:
+                start_text, end_text = range_text.split('-')
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(range_text)
+                end = high if step_text else start
+        except ValueError:
+            raise ValueError('invalid cron field "{}"'.format(text))
+
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError('invalid cron field "{}"'.format(text))
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class Cron:
+    """Cron expression of five fields, in local time.
+
+    The fields support "*", numbers, ranges "1-5", steps "*/15" and "1-5/2",
+    and lists "0,30". Sunday is 0 or 7. Like in cron, if both the day of
+    month and the day of week are restricted, a day matching either runs.
+    """
+
+    def __init__(self, expression: str) -> None:
+        """Parse `expression`, raise ValueError if it is invalid."""
+        fields = expression.split()
+
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(
+                'cron expression needs 5 fields, got "{}"'.format(expression)
+            )
+
+        minutes, hours, days, months, weekdays = (
+            parse_field(text, low, high)
+            for text, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.expression = expression
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+        # fail early if no day matches
+        self.next_run(datetime.now())
+
+    def _day_matches(self, day: date) -> bool:
+        day_matches = day.day in self.days
+        weekday_matches = day.isoweekday() % 7 in self.weekdays
+
+        if self.any_day or self.any_weekday:
+            return day_matches and weekday_matches
+
+        return day_matches or weekday_matches
+
+    def next_run(self, after: datetime) -> datetime:
+        """First matching minute after `after`."""
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        time = start
+
+        while time - start < MAX_CRON_SEARCH:
+            if time.month not in self.months:
+                year, month = divmod(time.month, 12)
+                time = datetime(time.year + year, month + 1, 1)
+            elif not self._day_matches(time.date()):
+                time = time.replace(hour=0, minute=0) + timedelta(days=1)
+            elif time.hour not in self.hours:
+                time = time.replace(minute=0) + timedelta(hours=1)
+            elif time.minute not in self.minutes:
+                time += timedelta(minutes=1)
+            else:
+                return time
+
+        raise ValueError('"{}" never runs'.format(self.expression))
+
+
+Schedule = Union[Interval, Cron]
+
+
+def parse_schedule(text: str) -> Schedule:
+    """Interval like "900", "15m" or "1h", or a cron expression."""
+    match = re.fullmatch(r'(\d+)([smh]?)', text.strip())
+
+    if not match:
+        return Cron(text)
+
+    seconds = int(match.group(1)) * INTERVAL_UNITS[match.group(2) or 's']
+
+    if seconds < 1:
+        raise ValueError('interval must be at least a second')
+
+    return Interval(seconds)
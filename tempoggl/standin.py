@@ -0,0 +1,429 @@
+"""Local stand-in for the Jira, Tempo and Toggl APIs.
+
+Serves the endpoints which tempoggl uses from JSON payloads, e.g. the ones
+written by benchmarks/synthetic.py, with configurable latency and faults.
+Jira and Tempo are served at the root and Toggl under /api/v8 of the same
+server.
+
+Usage: python -m tempoggl.standin DATA_DIR [--port 8080] [--latency 0.05]
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from argparse import ArgumentParser, Namespace
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from os import path
+from random import Random
+from threading import Lock, Thread
+from time import monotonic, sleep
+from urllib.parse import urlparse, parse_qs
+import json
+import re
+
+from pydantic.datetime_parse import parse_datetime
+
+
+TOGGL_PREFIX = '/api/v8'
+
+# how soon close() returns
+SHUTDOWN_POLL_INTERVAL = 0.05
+
+
+@dataclass
+class StandinData:
+    """API objects in the format of the real responses."""
+
+    jira_projects: List[Dict[str, Any]]
+    worklogs: List[Dict[str, Any]]
+    toggl_projects: List[Dict[str, Any]]
+    time_entries: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class Faults:
+    """Delays and failures added to the responses.
+
+    :param latency: seconds to wait before every response.
+    :param error_rate: share of requests failed with 503.
+    :param rate_limit: requests per second, more are answered with 429.
+    :param padding: bytes of whitespace added to the JSON responses.
+    """
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: Optional[float] = None
+    padding: int = 0
+    seed: int = 0
+
+
+def load_data(directory: str) -> StandinData:
+    """Read the files written by benchmarks/synthetic.py."""
+
+    def load(filename: str) -> List[Dict[str, Any]]:
+        file_path = path.join(directory, filename)
+
+        if not path.exists(file_path):
+            return []
+
+        with open(file_path) as f:
+            items: List[Dict[str, Any]] = json.load(f)
+
+        return items
+
+    return StandinData(
+        jira_projects=load('jira_projects.json'),
+        worklogs=load('tempo_worklogs.json'),
+        toggl_projects=load('toggl_projects.json'),
+        time_entries=load('toggl_time_entries.json'),
+    )
+
+
+Response = Tuple[int, Any]
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Standin:
+    """HTTP server in a background thread.
+
+    All requests are recorded as "METHOD path" in `requests`, and the time
+    entries pushed into Toggl are kept in `data.time_entries`.
+    """
+
+    def __init__(
+        self,
+        data: StandinData,
+        faults: Optional[Faults] = None,
+        host: str = '127.0.0.1',
+        port: int = 0,
+    ) -> None:
+        """Start serving at `port`, by default at any free port."""
+        self.data = data
+        self.faults = faults or Faults()
+        self.host = host
+        self.requests: List[str] = []
+        self._random = Random(self.faults.seed)
+        self._lock = Lock()
+        self._window_start = monotonic()
+        self._window_count = 0
+        self._next_entry_id = 1 + max(
+            (e['id'] for e in data.time_entries), default=0
+        )
+
+        self._server = _Server((host, port), self._handler())
+        self._thread = Thread(
+            target=self._server.serve_forever,
+            kwargs={'poll_interval': SHUTDOWN_POLL_INTERVAL},
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return 'http://{}:{}'.format(self.host, self._server.server_port)
+
+    @property
+    def jira_url(self) -> str:
+        return self.url
+
+    @property
+    def toggl_url(self) -> str:
+        return self.url + TOGGL_PREFIX
+
+    def wait(self) -> None:
+        """Block until the server is closed."""
+        self._thread.join()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type:
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                self._respond(standin.handle('GET', self.path, None, self))
+
+            def do_POST(self) -> None:
+                self._respond(
+                    standin.handle('POST', self.path, self._body(), self)
+                )
+
+            def do_PUT(self) -> None:
+                self._respond(
+                    standin.handle('PUT', self.path, self._body(), self)
+                )
+
+            def do_DELETE(self) -> None:
+                self._respond(standin.handle('DELETE', self.path, None, self))
+
+            def _body(self) -> Any:
+                length = int(self.headers.get('Content-Length', 0))
+
+                return json.loads(self.rfile.read(length) or b'null')
+
+            def _respond(self, response: Response) -> None:
+                status, body = response
+                encoded = json.dumps(body).encode()
+                encoded += b' ' * standin.faults.padding
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def _fault(self) -> Optional[Response]:
+        with self._lock:
+            rate_limit = self.faults.rate_limit
+
+            if rate_limit is not None:
+                now = monotonic()
+
+                if now - self._window_start >= 1:
+                    self._window_start = now
+                    self._window_count = 0
+
+                self._window_count += 1
+
+                if self._window_count > rate_limit:
+                    return (429, {'error': 'too many requests'})
+
+            if self._random.random() < self.faults.error_rate:
+                return (503, {'error': 'service unavailable'})
+
+        return None
+
+    def handle(
+        self,
+        method: str,
+        url: str,
+        body: Any,
+        request: BaseHTTPRequestHandler,
+    ) -> Response:
+        parsed = urlparse(url)
+
+        with self._lock:
+            self.requests.append('{} {}'.format(method, parsed.path))
+
+        if self.faults.latency:
+            sleep(self.faults.latency)
+
+        if 'Authorization' not in request.headers:
+            return (401, {'error': 'unauthorized'})
+
+        fault = self._fault()
+
+        if fault:
+            return fault
+
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if parsed.path.startswith(TOGGL_PREFIX):
+            toggl_path = parsed.path.replace(TOGGL_PREFIX, '', 1)
+
+            return self._toggl(method, toggl_path, params, body)
+
+        return self._jira(method, parsed.path, params)
+
+    def _jira(
+        self, method: str, url_path: str, params: Dict[str, str]
+    ) -> Response:
+        if method != 'GET':
+            return (405, {'error': 'method not allowed'})
+
+        if url_path == '/rest/api/2/project':
+            return (200, self.data.jira_projects)
+
+        match = re.fullmatch(r'/rest/api/2/project/(\d+)', url_path)
+
+        if match:
+            return find(self.data.jira_projects, int(match.group(1)))
+
+        if url_path == '/rest/tempo-timesheets/3/worklogs':
+            return (200, self._worklogs(params))
+
+        return (404, {'error': 'not found'})
+
+    def _worklogs(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Filter like Tempo, by the day started and the update time."""
+        date_from = params.get('dateFrom', '')
+        date_to = params.get('dateTo', '9999-12-31')
+        updated_from = params.get('updatedFrom', '')[:19]
+
+        def matches(worklog: Dict[str, Any]) -> bool:
+            started = worklog['dateStarted'][:10]
+            updated = worklog['dateUpdated'][:19]
+
+            return date_from <= started <= date_to and updated >= updated_from
+
+        return [w for w in self.data.worklogs if matches(w)]
+
+    def _toggl(
+        self, method: str, url_path: str, params: Dict[str, str], body: Any
+    ) -> Response:
+        if method == 'POST' and url_path == '/time_entries':
+            return self._create_entry(body['time_entry'])
+
+        match = re.fullmatch(r'/time_entries/([\d,]+)', url_path)
+
+        if match and method == 'PUT':
+            ids = [int(i) for i in match.group(1).split(',')]
+
+            return self._update_entries(ids, body['time_entry'])
+
+        if match and method == 'DELETE':
+            return self._delete_entry(int(match.group(1)))
+
+        if method != 'GET':
+            return (405, {'error': 'method not allowed'})
+
+        if url_path == '/workspaces':
+            workspaces = {p['wid'] for p in self.data.toggl_projects}
+
+            return (200, [{'id': i} for i in sorted(workspaces)])
+
+        match = re.fullmatch(r'/workspaces/(\d+)/projects', url_path)
+
+        if match:
+            workspace_id = int(match.group(1))
+            projects = [
+                p for p in self.data.toggl_projects if p['wid'] == workspace_id
+            ]
+
+            return (200, projects)
+
+        match = re.fullmatch(r'/projects/(\d+)', url_path)
+
+        if match:
+            status, project = find(
+                self.data.toggl_projects, int(match.group(1))
+            )
+
+            return (status, {'data': project} if status == 200 else project)
+
+        if url_path == '/time_entries':
+            return (200, self._time_entries(params))
+
+        return (404, {'error': 'not found'})
+
+    def _time_entries(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Entries started between start_date and end_date, if given."""
+        entries = self.data.time_entries
+
+        if 'start_date' in params:
+            start = parse_datetime(params['start_date'])
+            entries = [
+                e for e in entries if parse_datetime(e['start']) >= start
+            ]
+
+        if 'end_date' in params:
+            end = parse_datetime(params['end_date'])
+            entries = [e for e in entries if parse_datetime(e['start']) <= end]
+
+        return entries
+
+    def _create_entry(self, entry: Dict[str, Any]) -> Response:
+        status, project = find(self.data.toggl_projects, entry['pid'])
+
+        if status != 200:
+            return (400, {'error': 'invalid project'})
+
+        with self._lock:
+            created = {
+                **entry,
+                'id': self._next_entry_id,
+                'wid': project['wid'],
+            }
+            self._next_entry_id += 1
+            self.data.time_entries.append(created)
+
+        return (200, {'data': created})
+
+    def _update_entries(
+        self, entry_ids: List[int], fields: Dict[str, Any]
+    ) -> Response:
+        """Update like the bulk update of Toggl, which answers with a list."""
+        with self._lock:
+            entries = [
+                e for e in self.data.time_entries if e['id'] in entry_ids
+            ]
+
+            for entry in entries:
+                entry.update(fields)
+
+        if not entries:
+            return (404, {'error': 'not found'})
+
+        return (200, {'data': entries if len(entry_ids) > 1 else entries[0]})
+
+    def _delete_entry(self, entry_id: int) -> Response:
+        with self._lock:
+            entries = self.data.time_entries
+            remaining = [e for e in entries if e['id'] != entry_id]
+            self.data.time_entries = remaining
+
+        if len(remaining) == len(entries):
+            return (404, {'error': 'not found'})
+
+        return (200, [entry_id])
+
+
+def find(objects: List[Dict[str, Any]], object_id: int) -> Response:
+    for obj in objects:
+        if int(obj['id']) == object_id:
+            return (200, obj)
+
+    return (404, {'error': 'not found'})
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(
+        prog='python -m tempoggl.standin',
+        description='Serve Jira, Tempo and Toggl APIs from JSON files.',
+    )
+    parser.add_argument('data_dir', help='directory of the JSON payloads')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float)
+    parser.add_argument('--padding', type=int, default=0)
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    faults = Faults(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        padding=args.padding,
+    )
+    standin = Standin(load_data(args.data_dir), faults, args.host, args.port)
+
+    print('jira url:  {}'.format(standin.jira_url))
+    print('toggl url: {}'.format(standin.toggl_url))
+
+    try:
+        standin.wait()
+    except KeyboardInterrupt:
+        standin.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Incremental parsing and background fetching of large API responses."""
+
+from typing import (
+    Iterable,
+    Iterator,
+    Callable,
+    Any,
+    Deque,
+    Generic,
+    TypeVar,
+    NamedTuple,
+)
+from collections import deque
+import re
+from codecs import getincrementaldecoder
+from json import JSONDecoder, JSONDecodeError
+from queue import Queue, Full
+from threading import Thread, Event
+from time import perf_counter
+
+from tempoggl import metrics, profiling
+
+
+T = TypeVar('T')
+
+CHUNK_SIZE = 64 * 1024
+
+# how many items a background fetch can read ahead of the consumer
+BUFFER_SIZE = 1000
+
+WHITESPACE = ' \t\n\r'
+
+SCALAR_END = re.compile(r'[,\]\s]')
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield elements of a JSON array as soon as they are fully received.
+
+    Only the element being parsed is kept in memory, not the whole body.
+    The time spent decoding is added to the "parse_json" phase.
+    """
+    decoder = JSONDecoder()
+    text_decoder = getincrementaldecoder('utf-8')()
+    chunk_iter = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+    started = False
+    # the next token must be a comma or the end, or it must be a value
+    after_value = False
+    after_comma = False
+    decoding = 0.0
+    profiler = profiling.current()
+
+    def read_more() -> bool:
+        nonlocal buffer, pos, exhausted
+
+        if exhausted:
+            return False
+
+        chunk = next(chunk_iter, None)
+
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+
+        if pos == len(buffer):
+            if read_more():
+                continue
+
+            raise JSONDecodeError('unexpected end of array', buffer, pos)
+
+        char = buffer[pos]
+
+        if not started:
+            if char != '[':
+                raise JSONDecodeError('expected array', buffer, pos)
+
+            started = True
+            pos += 1
+        elif char == ']':
+            if after_comma:
+                raise JSONDecodeError('Expecting value', buffer, pos)
+
+            metrics.add_time('parse_json', decoding)
+            return
+        elif char == ',':
+            if not after_value:
+                raise JSONDecodeError('Expecting value', buffer, pos)
+
+            after_value = False
+            after_comma = True
+            pos += 1
+        elif after_value:
+            raise JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+        else:
+            # numbers and literals may continue in the next chunk
+            scalar = char not in '{["'
+
+            if scalar and not SCALAR_END.search(buffer, pos) and read_more():
+                continue
+
+            decode_started = perf_counter()
+            profiler.start('parse')
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except JSONDecodeError:
+                if read_more():
+                    continue
+
+                raise
+            finally:
+                profiler.stop()
+                decoding += perf_counter() - decode_started
+
+            pos = end
+            after_value = True
+            after_comma = False
+            yield element
+
+
+class _Failure(NamedTuple):
+    error: Exception
+
+
+_END = object()
+
+
+class ParallelStream(Generic[T]):
+    """Iterate items of several sources in order.
+
+    Up to `concurrency` sources are read in background threads at a time.
+    Each of them can read `buffer_size` items ahead of the consumer, so the
+    memory use doesn't depend on the total number of items.
+    """
+
+    def __init__(
+        self,
+        sources: Iterable[Callable[[], Iterable[T]]],
+        concurrency: int,
+        buffer_size: int = BUFFER_SIZE,
+    ) -> None:
+        """Start reading the first `concurrency` sources immediately."""
+        self._sources = iter(sources)
+        self._buffer_size = buffer_size
+        self._stop = Event()
+        self._pending: Deque['Queue[Any]'] = deque()
+
+        for _ in range(concurrency):
+            self._start_next()
+
+    def _start_next(self) -> None:
+        source = next(self._sources, None)
+
+        if source is None:
+            return
+
+        queue: 'Queue[Any]' = Queue(maxsize=self._buffer_size)
+
+        # daemon threads don't block the exit if the stream is abandoned
+        Thread(target=self._produce, args=(source, queue), daemon=True).start()
+        self._pending.append(queue)
+
+    def _produce(
+        self, source: Callable[[], Iterable[T]], queue: 'Queue[Any]'
+    ) -> None:
+        try:
+            for item in source():
+                if not self._put(queue, item):
+                    return
+        except Exception as err:
+            self._put(queue, _Failure(err))
+        else:
+            self._put(queue, _END)
+
+    def _put(self, queue: 'Queue[Any]', item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def __iter__(self) -> Iterator[T]:
+        """Yield the items, raise the first error of a source."""
+        profiler = profiling.current()
+
+        try:
+            while self._pending:
+                # the consumer waits for the background fetch
+                profiler.start('fetch')
+                item = self._pending[0].get()
+                profiler.stop()
+
+                if item is _END:
+                    self._pending.popleft()
+                    self._start_next()
+                elif isinstance(item, _Failure):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the background fetches."""
+        self._stop.set()
+
+
+class ClosingIterator(Iterator[T]):
+    """Iterate items read from a source that can be stopped early.
+
+    Closing stops the source even if the iteration was never started, unlike
+    closing a generator.
+    """
+
+    def __init__(self, items: Iterator[T], source: Iterable[Any]) -> None:
+        """Iterate `items`, and close `source` if it has a `close` method."""
+        self._items = items
+        self._source = source
+
+    def __next__(self) -> T:
+        """Return the next item."""
+        return next(self._items)
+
+    def close(self) -> None:
+        """Stop reading the source."""
+        close = getattr(self._source, 'close', None)
+
+        if close is not None:
+            close()
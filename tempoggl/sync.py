@@ -0,0 +1,893 @@
+from argparse import Namespace
+from datetime import timedelta, datetime, date
+import sys
+from typing import (
+    Union,
+    Tuple,
+    Iterable,
+    Any,
+    Iterator,
+    Sequence,
+    List,
+    Optional,
+    Callable,
+)
+from getpass import getpass
+from distutils.util import strtobool
+from urllib.parse import urlparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from functools import partial
+
+from pydantic import ValidationError
+
+from tempoggl.defaults import (
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_PUSH_CONCURRENCY,
+)
+from tempoggl.toggl import (
+    TogglEntryRequest,
+    push_worklogs,
+    PushResult,
+    fetch_projects,
+    fetch_project,
+    TogglEntry,
+    TogglProject,
+    generate_description,
+    toggl_auth,
+    fetch_time_entries,
+    reconcile,
+    sync_window,
+    TOGGL_API_URL,
+    TOGGL_REQUESTS_PER_SECOND,
+)
+from tempoggl.tempo import (
+    WorkLog,
+    join_worklogs,
+    WorklogError,
+    TempoTogglPair,
+    JiraProject,
+    fetch_jira_projects,
+    fetch_worklogs,
+    fetch_jira_project,
+    ProjectsRefresh,
+    ProjectTables,
+    JiraAuthError,
+)
+from tempoggl.windows import FetchWindow
+from tempoggl.config import (
+    create_or_read_config,
+    default_config_dir,
+    AppConfig,
+    FileConfig,
+)
+from tempoggl.ledger import Ledger, ledger_path
+from tempoggl.delta import Plan, ChangeResult, make_plan, apply_changes
+from tempoggl.ratelimit import AdaptiveLimiter, TokenBucket
+from tempoggl.cache import MetadataCache, cache_dir, cache_key
+from tempoggl.streaming import ClosingIterator
+from tempoggl.transport import Transport, DEFAULT_POOL_SIZE
+from tempoggl.typing_tools import unreachable
+from tempoggl.aggregate import aggregate_worklogs
+from tempoggl.preview import (
+    PREVIEW_ROWS,
+    Preview,
+    format_prompt,
+    format_summary,
+    summarize,
+)
+from tempoggl import metrics, profiling
+
+
+logger = logging.getLogger(__name__)
+
+# fetch again worklogs updated shortly before the last sync, the ledger
+# filters out the ones which were already pushed
+INCREMENTAL_OVERLAP = timedelta(minutes=10)
+
+DEFAULT_CACHE_HOURS = 24
+
+
+@dataclass
+class SyncSummary:
+    """What a sync did, for the report of the batch mode."""
+
+    fetched: int = 0
+    skipped: int = 0  # already synced or already in toggl
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+def record_summary(summary: SyncSummary) -> None:
+    for name, value in asdict(summary).items():
+        metrics.set_gauge('worklogs_{}'.format(name), value)
+
+
+def tempo_to_toggl(tempo_log: TempoTogglPair) -> TogglEntry:
+    tempo = tempo_log.tempo_log
+
+    return TogglEntry(
+        time_entry=TogglEntryRequest(
+            description=generate_description(tempo.issue.key, tempo.comment),
+            start=tempo.date_started,
+            duration=tempo.time_spent_seconds,
+            pid=tempo_log.toggl_project.id,
+        )
+    )
+
+
+class UnsafeJiraProtocol:
+    pass
+
+
+def validate_configs(
+    args: Namespace, config: FileConfig
+) -> Union[UnsafeJiraProtocol, ValidationError, AppConfig]:
+    push_concurrency = args.push_concurrency or config.general.push_concurrency
+    fetch_concurrency = (
+        args.fetch_concurrency or config.general.fetch_concurrency
+    )
+    fetch_window = args.fetch_window or config.general.fetch_window
+
+    try:
+        app_config = AppConfig(
+            username=args.username or config.general.username,
+            jira_url=args.jira_url or config.general.jira_url,
+            yes=bool(args.yes or config.general.yes),
+            from_date=args.from_date or config.general.from_date,
+            verbose=bool(args.verbose or config.general.verbose),
+            jira_to_toggl=(
+                {**config.toggl_mapping, **(dict(args.toggl_mapping))}
+            ),
+            toggl_token=args.toggl_api_token or config.general.toggl_token,
+            toggl_url=config.general.toggl_url or TOGGL_API_URL,
+            push_concurrency=push_concurrency or DEFAULT_PUSH_CONCURRENCY,
+            keep_going=bool(args.keep_going or config.general.keep_going),
+            ignore_ledger=args.ignore_ledger,
+            incremental=bool(args.incremental or config.general.incremental),
+            refresh_cache=args.refresh_cache,
+            targeted_metadata=bool(
+                args.targeted_metadata or config.general.targeted_metadata
+            ),
+            jira_cache_hours=(
+                DEFAULT_CACHE_HOURS
+                if config.general.jira_cache_hours is None
+                else config.general.jira_cache_hours
+            ),
+            toggl_cache_hours=(
+                DEFAULT_CACHE_HOURS
+                if config.general.toggl_cache_hours is None
+                else config.general.toggl_cache_hours
+            ),
+            fast_validation=bool(
+                args.fast_validation or config.general.fast_validation
+            ),
+            fetch_window=fetch_window or FetchWindow.NONE,
+            fetch_concurrency=fetch_concurrency or DEFAULT_FETCH_CONCURRENCY,
+            http_pool_size=config.general.http_pool_size or DEFAULT_POOL_SIZE,
+            jira_rate_limit=config.general.jira_rate_limit,
+            reconcile=(
+                not args.no_reconcile and config.general.reconcile is not False
+            ),
+            aggregate=bool(args.aggregate or config.general.aggregate),
+            preview=args.preview or config.general.preview or Preview.AUTO,
+        )
+    except ValidationError as e:
+        return e
+    else:
+        parsed_jira_url = urlparse(app_config.jira_url)
+
+        if parsed_jira_url.scheme == 'https':
+            return app_config
+        elif parsed_jira_url.scheme == 'http':
+            return UnsafeJiraProtocol()
+        else:
+            logger.critical(
+                'unexpected jira url scheme: {}'.format(parsed_jira_url.scheme)
+            )
+            sys.exit(1)
+
+
+def start_worklog_fetch(
+    config: AppConfig,
+    transport: Transport,
+    updated_since: Optional[datetime] = None,
+) -> ClosingIterator[WorkLog]:
+    return fetch_worklogs(
+        config.jira_url,
+        config.from_date,
+        transport,
+        updated_since,
+        config.fetch_window,
+        config.fetch_concurrency,
+        config.fast_validation,
+    )
+
+
+def fetch_referenced_metadata(
+    config: AppConfig,
+    transport: Transport,
+    cache: MetadataCache,
+    worklogs: Iterable[WorkLog],
+    refresh: bool = False,
+) -> Tuple[List[JiraProject], List[TogglProject]]:
+    """Fetch only the projects referred by the worklogs and the mapping.
+
+    Unlike listing all projects, the cost of this depends only on the number
+    of projects used. Each project is cached on its own, so the projects of
+    earlier syncs are reused even if the set of projects changes.
+    """
+    jira_ids = {w.issue.project_id for w in worklogs}
+    toggl_ids = set(config.jira_to_toggl.values())
+
+    logger.info(
+        'fetching {} jira projects and {} toggl projects'.format(
+            len(jira_ids), len(toggl_ids)
+        )
+    )
+
+    def jira_project(project_id: int) -> List[JiraProject]:
+        return cache.get_or_fetch(
+            cache_key(
+                'jira_project', '{} {}'.format(config.jira_url, project_id)
+            ),
+            timedelta(hours=config.jira_cache_hours),
+            JiraProject,
+            lambda: fetch_jira_project(
+                config.jira_url, project_id, transport, config.fast_validation
+            ),
+            refresh=refresh,
+            fast_validation=config.fast_validation,
+        )
+
+    def toggl_project(project_id: int) -> List[TogglProject]:
+        return cache.get_or_fetch(
+            cache_key(
+                'toggl_project',
+                '{} {} {}'.format(
+                    config.toggl_url, config.toggl_token, project_id
+                ),
+            ),
+            timedelta(hours=config.toggl_cache_hours),
+            TogglProject,
+            lambda: fetch_project(
+                project_id, transport, config.fast_validation, config.toggl_url
+            ),
+            refresh=refresh,
+            fast_validation=config.fast_validation,
+        )
+
+    with ThreadPoolExecutor(max_workers=config.fetch_concurrency) as executor:
+        jira = executor.map(jira_project, jira_ids)
+        toggl = executor.map(toggl_project, toggl_ids)
+
+        return (
+            [project for found in jira for project in found],
+            [project for found in toggl for project in found],
+        )
+
+
+def fetch_metadata(
+    config: AppConfig,
+    transport: Transport,
+    cache: MetadataCache,
+    refresh: bool = False,
+) -> Tuple[List[JiraProject], List[TogglProject]]:
+    """Get Jira and Toggl projects concurrently, from cache when possible."""
+
+    def jira_projects() -> List[JiraProject]:
+        return cache.get_or_fetch(
+            cache_key('jira_projects', config.jira_url),
+            timedelta(hours=config.jira_cache_hours),
+            JiraProject,
+            lambda: fetch_jira_projects(
+                config.jira_url, transport, config.fast_validation
+            ),
+            refresh=refresh,
+            fast_validation=config.fast_validation,
+        )
+
+    def toggl_projects() -> List[TogglProject]:
+        return cache.get_or_fetch(
+            cache_key('toggl_projects', config.toggl_url + config.toggl_token),
+            timedelta(hours=config.toggl_cache_hours),
+            TogglProject,
+            lambda: list(
+                fetch_projects(
+                    transport, config.fast_validation, config.toggl_url
+                )
+            ),
+            refresh=refresh,
+            fast_validation=config.fast_validation,
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        jira = executor.submit(jira_projects)
+        toggl = executor.submit(toggl_projects)
+
+        return (jira.result(), toggl.result())
+
+
+def fetch_sources(
+    config: AppConfig,
+    transport: Transport,
+    cache: MetadataCache,
+    updated_since: Optional[datetime] = None,
+) -> Tuple[List[JiraProject], Iterator[WorkLog], List[TogglProject]]:
+    """Fetch Jira projects, Tempo worklogs and Toggl projects concurrently.
+
+    None of the requests depend on each other, so the total time is the time
+    of the slowest source. Worklogs keep streaming in the background after
+    the projects are fetched.
+    """
+    worklogs = start_worklog_fetch(config, transport, updated_since)
+
+    try:
+        jira_projects, toggl_projects = fetch_metadata(
+            config, transport, cache, refresh=config.refresh_cache
+        )
+    except BaseException:
+        # also on sys.exit, nobody will consume the worklogs
+        worklogs.close()
+        raise
+
+    return (jira_projects, worklogs, toggl_projects)
+
+
+def open_transport(config: AppConfig) -> Transport:
+    pool_size = max(config.http_pool_size, config.push_concurrency)
+    transport = Transport(pool_size=pool_size)
+
+    if config.jira_rate_limit:
+        transport.limit(config.jira_url, TokenBucket(config.jira_rate_limit))
+
+    return transport
+
+
+def open_ledger(config: AppConfig) -> Ledger:
+    return Ledger(
+        ledger_path(default_config_dir()), config.jira_url, config.username
+    )
+
+
+def authenticate(
+    config: AppConfig, jira_password: str, transport: Transport
+) -> None:
+    transport.authenticate(config.jira_url, (config.username, jira_password))
+    transport.authenticate(config.toggl_url, toggl_auth(config.toggl_token))
+
+
+def start_syncing(config: AppConfig, jira_password: str) -> SyncSummary:
+    with closing(open_transport(config)) as transport:
+        cache = MetadataCache(cache_dir(default_config_dir()))
+        summary = sync_user(config, jira_password, transport, cache)
+        record_summary(summary)
+
+        return summary
+
+
+def sync_user(
+    config: AppConfig,
+    jira_password: str,
+    transport: Transport,
+    cache: MetadataCache,
+) -> SyncSummary:
+    """Sync as the user of `config`, using their own ledger rows."""
+    with closing(open_ledger(config)) as ledger:
+        authenticate(config, jira_password, transport)
+
+        try:
+            return sync(config, transport, ledger, cache)
+        except JiraAuthError as err:
+            logger.critical(str(err))
+            sys.exit(1)
+
+
+def sync(
+    config: AppConfig,
+    transport: Transport,
+    ledger: Ledger,
+    cache: MetadataCache,
+    tables: Optional[ProjectTables] = None,
+) -> SyncSummary:
+    watermark = ledger.watermark(config.username)
+    # merging needs all worklogs of a day, not only the updated ones, and
+    # without the ledger the overlap would be pushed again
+    incremental = config.incremental and not (
+        config.aggregate or config.ignore_ledger
+    )
+    updated_since = (
+        watermark - INCREMENTAL_OVERLAP if incremental and watermark else None
+    )
+
+    if updated_since:
+        logger.info('fetching worklogs updated since {}'.format(updated_since))
+
+    refresh_projects: Optional[ProjectsRefresh] = None
+
+    if config.targeted_metadata:
+        # the worklogs tell which projects are needed
+        with metrics.phase('worklogs'), profiling.section('fetch'):
+            worklog_resposes: Iterable[WorkLog] = list(
+                start_worklog_fetch(config, transport, updated_since)
+            )
+
+        with metrics.phase('metadata'), profiling.section('fetch'):
+            jira_projects, toggl_projects = fetch_referenced_metadata(
+                config,
+                transport,
+                cache,
+                worklog_resposes,
+                refresh=config.refresh_cache,
+            )
+
+        if not config.refresh_cache:
+            refresh_projects = partial(
+                fetch_referenced_metadata,
+                config,
+                transport,
+                cache,
+                worklog_resposes,
+                refresh=True,
+            )
+    else:
+        # the worklogs are streamed, and fetched while joining
+        with metrics.phase('metadata'), profiling.section('fetch'):
+            jira_projects, worklog_resposes, toggl_projects = fetch_sources(
+                config, transport, cache, updated_since
+            )
+
+        if not config.refresh_cache:
+            refresh_projects = partial(
+                fetch_metadata, config, transport, cache, refresh=True
+            )
+
+    with metrics.phase('join'), profiling.section('join'):
+        worklogs = join_worklogs(
+            worklog_resposes,
+            jira_projects,
+            config.jira_to_toggl,
+            toggl_projects,
+            refresh_projects=refresh_projects,
+            tables=tables,
+        )
+
+    if not worklogs and updated_since:
+        print(
+            'no tempo worklogs updated since {}'.format(updated_since),
+            file=sys.stderr,
+        )
+        return SyncSummary()
+
+    if not worklogs:
+        print(
+            'no tempo worklogs found after {}'.format(config.from_date),
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    if isinstance(worklogs, list):
+        newest_update = max(
+            (w.tempo_log.date_updated for w in worklogs), default=watermark
+        )
+
+        def save_watermark() -> None:
+            if newest_update:
+                ledger.save_watermark(config.username, newest_update)
+
+        if config.aggregate:
+            with metrics.phase('aggregate'), profiling.section('join'):
+                merged = aggregate_worklogs(worklogs)
+
+            logger.info(
+                'merged {} worklogs into {} entries'.format(
+                    len(worklogs), len(merged)
+                )
+            )
+            worklogs = merged
+
+        summary = SyncSummary(fetched=len(worklogs))
+        plan = Plan(create=worklogs, update=[], delete=[])
+
+        if not config.ignore_ledger:
+            with metrics.phase('plan'):
+                plan = plan_changes(config, ledger, worklogs, updated_since)
+
+            summary.skipped = (
+                len(worklogs) - len(plan.create) - len(plan.update)
+            )
+            logger.info(
+                'skipping {} already synced worklogs'.format(summary.skipped)
+            )
+
+            if plan.is_empty():
+                print(
+                    'all {} worklogs are already synced'.format(len(worklogs)),
+                    file=sys.stderr,
+                )
+                save_watermark()
+                return summary
+
+        worklogs = plan.create
+
+        with profiling.section('push'):
+            entries = [tempo_to_toggl(tempo) for tempo in worklogs]
+
+        existing = 0
+
+        if config.reconcile and entries:
+            with metrics.phase('reconcile'), profiling.section('fetch'):
+                worklogs, entries, existing = skip_existing(
+                    config, transport, ledger, worklogs, entries
+                )
+
+            plan.create = worklogs
+            summary.skipped += existing
+
+            if plan.is_empty():
+                print(
+                    'all {} worklogs already exist in toggl'.format(existing),
+                    file=sys.stderr,
+                )
+                save_watermark()
+                return summary
+
+        with metrics.phase('prompt'):
+            do_continue = config.yes or prompt_for_pushing(
+                worklogs,
+                verbose=config.verbose,
+                skipped=existing,
+                plan=plan,
+                preview=config.preview,
+            )
+
+        if not do_continue:
+            logger.info('negative prompt, exiting...')
+            sys.exit(1)
+        else:
+            # creates, updates and deletes share the rate limit of the token
+            limiter = AdaptiveLimiter(TOGGL_REQUESTS_PER_SECOND)
+            stop_observing = transport.observe(
+                config.toggl_url, limiter.record
+            )
+
+            try:
+                with metrics.phase('push'):
+                    result = push_worklogs(
+                        entries,
+                        transport,
+                        concurrency=config.push_concurrency,
+                        stop_on_error=not config.keep_going,
+                        limiter=limiter,
+                        api_url=config.toggl_url,
+                    )
+
+                    ledger.record(
+                        (worklogs[index], toggl_id)
+                        for index, toggl_id in result.created.items()
+                    )
+
+                changes = ChangeResult(updated=[], deleted=[], errors=[])
+
+                if config.keep_going or not result.errors:
+                    with metrics.phase('changes'):
+                        changes = apply_changes(
+                            plan,
+                            tempo_to_toggl,
+                            transport,
+                            concurrency=config.push_concurrency,
+                            stop_on_error=not config.keep_going,
+                            limiter=limiter,
+                            api_url=config.toggl_url,
+                        )
+            finally:
+                # the transport outlives the sync in watch mode
+                stop_observing()
+
+            # merged worklogs replace the deleted entries of their worklogs
+            ledger.forget(changes.deleted)
+            ledger.record(changes.updated)
+
+            summary.created = len(result.created)
+            summary.updated = len(changes.updated)
+            summary.deleted = len(changes.deleted)
+
+            if result.errors or changes.errors:
+                report_push_failures(entries, result)
+                report_change_failures(plan, changes)
+                sys.exit(
+                    'error writing changes to toggl, please inspect all'
+                    ' listed worklog entries manually'
+                )
+            else:
+                save_watermark()
+                print('done', file=sys.stderr)
+
+                return summary
+    elif isinstance(worklogs, WorklogError):
+        logger.critical(worklogs.message)
+        sys.exit(1)
+    else:
+        unreachable(worklogs)
+
+
+def plan_changes(
+    config: AppConfig,
+    ledger: Ledger,
+    worklogs: List[TempoTogglPair],
+    updated_since: Optional[datetime],
+) -> Plan:
+    """Compare the fetched worklogs to the ledger.
+
+    Removed worklogs can only be found if all worklogs of the date range
+    were fetched, so not in the incremental mode.
+    """
+    synced = ledger.synced(i for w in worklogs for i in w.worklog_ids)
+    removable = (
+        []
+        if updated_since
+        else ledger.synced_between(config.from_date, date.today())
+    )
+
+    return make_plan(worklogs, synced, removable)
+
+
+def skip_existing(
+    config: AppConfig,
+    transport: Transport,
+    ledger: Ledger,
+    worklogs: List[TempoTogglPair],
+    entries: List[TogglEntry],
+) -> Tuple[List[TempoTogglPair], List[TogglEntry], int]:
+    """Leave out the entries which already exist in Toggl.
+
+    The existing entries of the sync window are fetched first. The matches
+    are recorded in the ledger, so they aren't looked up again.
+
+    :returns: remaining worklogs and entries, and the number of skipped.
+    """
+    start, end = sync_window(entries)
+    existing = fetch_time_entries(start, end, transport, config.toggl_url)
+    matched = reconcile(entries, existing)
+
+    ledger.record((worklogs[i], toggl_id) for i, toggl_id in matched.items())
+
+    remaining = [i for i in range(len(entries)) if i not in matched]
+
+    return (
+        [worklogs[i] for i in remaining],
+        [entries[i] for i in remaining],
+        len(matched),
+    )
+
+
+def report_push_failures(
+    entries: Sequence[TogglEntry], result: PushResult
+) -> None:
+    for index, error in sorted(result.errors.items()):
+        logger.error(
+            'failed to push "{}": {}'.format(
+                entries[index].time_entry.description, error
+            )
+        )
+
+    for index in result.not_pushed(len(entries)):
+        logger.error(
+            'not pushed: "{}"'.format(entries[index].time_entry.description)
+        )
+
+    print(
+        'pushed {}/{} entries'.format(len(result.created), len(entries)),
+        file=sys.stderr,
+    )
+
+
+def report_change_failures(plan: Plan, changes: ChangeResult) -> None:
+    for error in changes.errors:
+        logger.error(error)
+
+    if plan.update or plan.delete:
+        print(
+            'updated {}/{} and deleted {}/{} entries'.format(
+                len(changes.updated),
+                len(plan.update),
+                len(changes.deleted),
+                len(plan.delete),
+            ),
+            file=sys.stderr,
+        )
+
+
+def yes_prompt(
+    question: str, details: Optional[Callable[[], None]] = None
+) -> bool:
+    """Prompt yes/no with yes as default.
+
+    :param details: shown when answered "d", before asking again.
+    """
+    choices = ' [Ynd]: ' if details else ' [Yn]: '
+
+    while True:
+        prompted = input(question + choices)
+        if prompted == '':
+            return True
+
+        if details and prompted.lower() == 'd':
+            details()
+            continue
+
+        try:
+            return strtobool(prompted)
+        except ValueError:
+            pass
+
+
+def format_rows(worklogs: Iterable[TempoTogglPair]) -> Iterator[str]:
+    return format_prompt(
+        (
+            w.tempo_log.date_started,
+            timedelta(seconds=w.tempo_log.time_spent_seconds),
+            w.tempo_log.issue.key,
+            w.tempo_log.comment,
+        )
+        for w in worklogs
+    )
+
+
+def format_totals(worklogs: Iterable[TempoTogglPair]) -> List[str]:
+    return format_summary(
+        summarize(
+            (
+                w.tempo_project.key,
+                w.toggl_project.name,
+                w.tempo_log.date_started.date(),
+                timedelta(seconds=w.tempo_log.time_spent_seconds),
+            )
+            for w in worklogs
+        )
+    )
+
+
+def show_details(
+    worklogs: Sequence[TempoTogglPair], plan: Optional[Plan]
+) -> None:
+    import pydoc
+
+    lines = list(format_rows(worklogs))
+
+    if plan and plan.update:
+        lines.append('\nupdated:')
+        lines.extend(format_rows(pair for pair, _ in plan.update))
+
+    if plan and plan.delete:
+        lines.append('\ndeleted entries:')
+        lines.append(', '.join(str(i.toggl_id) for i in plan.delete))
+
+    pydoc.pager('\n'.join(lines))
+
+
+def prompt_for_pushing(
+    worklogs: Sequence[TempoTogglPair],
+    verbose: bool,
+    skipped: int = 0,
+    plan: Optional[Plan] = None,
+    preview: Preview = Preview.AUTO,
+) -> bool:
+    """Ask user if we want to continue pushing changes to Toggl.
+
+    The preview is written at once, because thousands of separately printed
+    lines are slow to render.
+    """
+    updated = [pair for pair, _ in plan.update] if plan else []
+    deleted = plan.delete if plan else []
+    many = len(worklogs) + len(updated) + len(deleted) > PREVIEW_ROWS
+    summary = preview is Preview.SUMMARY or (preview is Preview.AUTO and many)
+    format_worklogs = format_totals if summary else format_rows
+    lines: List[str] = []
+
+    if worklogs:
+        lines.extend(format_worklogs(worklogs))
+
+    if updated:
+        lines.append(
+            '\nupdating {} entries of edited worklogs:'.format(len(updated))
+        )
+        lines.extend(format_worklogs(updated))
+
+    if deleted:
+        lines.append(
+            '\ndeleting {} entries of removed worklogs'.format(len(deleted))
+        )
+
+        if not summary:
+            lines.append(', '.join(str(i.toggl_id) for i in deleted))
+
+    if skipped:
+        lines.append(
+            'skipping {} worklogs which already exist in toggl'.format(skipped)
+        )
+
+    if lines:
+        sys.stderr.write('\n'.join(lines) + '\n')
+        sys.stderr.flush()
+
+    if summary:
+        return yes_prompt(
+            'write changes to Toggl? d shows every worklog',
+            details=partial(show_details, worklogs, plan),
+        )
+
+    return yes_prompt('write changes to Toggl?')
+
+
+def format_error(error: Any) -> str:
+    return '{}: {}'.format(': '.join(error['loc']), error['msg'])
+
+
+def jira_password_prompt(config: AppConfig) -> str:
+    return 'jira password for {}: '.format(config.username)
+
+
+def log_invalid_config(
+    config: Union[ValidationError, UnsafeJiraProtocol],
+) -> None:
+    if isinstance(config, ValidationError):
+        for error in config.errors():
+            formatted_err = format_error(error)
+            logger.critical(
+                'invalid config/parameter value: {}'.format(formatted_err)
+            )
+
+        logger.critical('missing or invalid parameters, exiting...')
+    elif isinstance(config, UnsafeJiraProtocol):
+        logger.critical(
+            'jira with http protocol not supported, please use https'
+        )
+    else:
+        unreachable(config)
+
+
+def run_sync(args: Namespace) -> None:
+    file_config = create_or_read_config()
+    if isinstance(file_config, ValidationError):
+        for error in file_config.errors():
+            formatted_err = format_error(error)
+            logger.critical(
+                'invalid value for config parameter: {}'.format(formatted_err)
+            )
+        sys.exit(1)
+
+    logger.info('using config file config {}'.format(file_config))
+
+    with metrics.collect(
+        args.metrics_json or file_config.general.metrics_json,
+        args.metrics_textfile or file_config.general.metrics_textfile,
+    ), profiling.profile(args.profile, args.profile_phases, args.profile_top):
+        run_mode(args, file_config)
+
+
+def run_mode(args: Namespace, file_config: FileConfig) -> None:
+    if args.batch:
+        from tempoggl.batch import run_batch
+
+        run_batch(args, file_config)
+        return
+
+    config = validate_configs(args, file_config)
+
+    if isinstance(config, AppConfig):
+        logger.info('using combined configuration: {}'.format(config))
+
+        if args.watch:
+            from tempoggl.watch import run_watch
+
+            run_watch(config, args.watch)
+            return
+
+        start_syncing(config, getpass(jira_password_prompt(config)))
+    else:
+        log_invalid_config(config)
+        sys.exit(1)
@@ -1,18 +1,72 @@
 """http://developer.tempo.io/doc/timesheets/api/rest/latest"""  # noqa
 
-from datetime import datetime
-from typing import List, Dict, Optional, Union, Mapping, Iterable, Iterator
+from datetime import datetime, date
+from typing import (
+    List,
+    Dict,
+    Optional,
+    Union,
+    Mapping,
+    Iterable,
+    Iterator,
+    Tuple,
+    Set,
+    Any,
+    Callable,
+    Counter,
+)
+from contextlib import closing
+from functools import partial, lru_cache
+import sys
 import json
 import logging
 
 from humps import decamelize
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator
+from pydantic.datetime_parse import parse_datetime
 from pydantic.dataclasses import dataclass
+from dataclasses import dataclass as std_dataclass
+from requests import Response
 
+from tempoggl import metrics, profiling
 from tempoggl.toggl import TogglProject
+from tempoggl.transport import Transport
+from tempoggl.streaming import (
+    ClosingIterator,
+    ParallelStream,
+    iter_json_array,
+    CHUNK_SIZE,
+)
+from tempoggl.validation import parse_many
+from tempoggl.windows import FetchWindow, date_windows
 
 logger = logging.getLogger(__name__)
 
+# API responses use a small set of keys, so this is plenty
+KEY_CACHE_SIZE = 1024
+
+# jira answers some requests with wrong credentials as if anonymous, and
+# tells about it only in this header
+LOGIN_REASON_HEADER = 'X-Seraph-LoginReason'
+
+FAILED_LOGIN_REASONS = frozenset(
+    ['AUTHENTICATED_FAILED', 'AUTHENTICATION_DENIED']
+)
+
+
+class JiraAuthError(Exception):
+    """Jira refused the username or the password."""
+
+
+def check_jira_auth(response: Response) -> None:
+    login_reason = response.headers.get(LOGIN_REASON_HEADER, '')
+
+    if response.status_code == 401 or login_reason in FAILED_LOGIN_REASONS:
+        response.close()
+        raise JiraAuthError(
+            'jira refused the credentials, possibly wrong password'
+        )
+
 
 # https://docs.atlassian.com/DAC/rest/jira/6.1.html#d2e2990
 class JiraProject(BaseModel):
@@ -33,6 +87,7 @@ class WorkLogIssue(IssueResponse):
 
 # http://developer.tempo.io/doc/timesheets/api/rest/latest
 class WorkLog(BaseModel):
+    id: int
     comment: str
     date_started: datetime
     date_created: datetime
@@ -40,12 +95,26 @@ class WorkLog(BaseModel):
     time_spent_seconds: int
     issue: IssueResponse
 
+    @root_validator(pre=True)
+    def updated_when_created(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        # not all tempo versions return dateUpdated
+        values.setdefault('date_updated', values.get('date_created'))
 
-@dataclass
+        return values
+
+
+# not validated by pydantic, all fields are already validated models
+@std_dataclass
 class TempoTogglPair:
     tempo_log: WorkLog
     toggl_project: TogglProject
     tempo_project: JiraProject
+    # worklogs merged into tempo_log, see tempoggl.aggregate
+    merged_ids: Tuple[int, ...] = ()
+
+    @property
+    def worklog_ids(self) -> Tuple[int, ...]:
+        return self.merged_ids or (self.tempo_log.id,)
 
 
 def rename_self(dirty: Dict) -> Dict:
@@ -102,12 +171,22 @@ class WorklogError:
     message: str
 
 
-def join_worklogs(
-    worklogs: Iterable[WorkLog],
+ProjectsRefresh = Callable[
+    [], Tuple[Iterable[JiraProject], Iterable[TogglProject]]
+]
+
+
+# jira projects by id and toggl projects by jira key
+ProjectLookup = Tuple[
+    Dict[int, JiraProject], Dict[str, Optional[TogglProject]]
+]
+
+
+def build_tables(
     tempo_projects: Iterable[JiraProject],
-    config_toggl_table: Mapping[str, int],
     toggl_projects: Iterable[TogglProject],
-) -> Union[WorklogError, List[TempoTogglPair]]:
+    config_toggl_table: Mapping[str, int],
+) -> ProjectLookup:
     tempo_table = {project.id: project for project in tempo_projects}
     toggl_table = {project.id: project for project in toggl_projects}
 
@@ -118,41 +197,399 @@ def join_worklogs(
 
     logger.info('using toggl mapping of {}'.format(toggl_mapping))
 
-    worklogs_response = []
+    return tempo_table, toggl_mapping
 
-    for worklog in worklogs:
-        project = tempo_table.get(worklog.issue.project_id)
 
-        if not project:
-            return WorklogError(
-                'unexpected project id "{}"'.format(worklog.issue.project_id)
+class ProjectTables:
+    """Lookup tables of `join_worklogs`, kept between syncs.
+
+    The tables are rebuilt only when the project lists are not the same
+    objects as last time, e.g. when they were fetched again instead of
+    taken from the in-memory cache.
+    """
+
+    def __init__(self) -> None:
+        """Build the tables on the first `get`."""
+        self._sources: Tuple[Any, Any, Dict[str, int]] = (None, None, {})
+        self._tables: Optional[ProjectLookup] = None
+
+    def _changed(
+        self,
+        tempo_projects: Iterable[JiraProject],
+        toggl_projects: Iterable[TogglProject],
+        config_toggl_table: Mapping[str, int],
+    ) -> bool:
+        old_tempo, old_toggl, old_mapping = self._sources
+        same = tempo_projects is old_tempo and toggl_projects is old_toggl
+
+        return not same or dict(config_toggl_table) != old_mapping
+
+    def get(
+        self,
+        tempo_projects: Iterable[JiraProject],
+        toggl_projects: Iterable[TogglProject],
+        config_toggl_table: Mapping[str, int],
+    ) -> ProjectLookup:
+        if self._tables is None or self._changed(
+            tempo_projects, toggl_projects, config_toggl_table
+        ):
+            self._tables = build_tables(
+                tempo_projects, toggl_projects, config_toggl_table
+            )
+            # keep the lists alive, so that their ids are not reused
+            self._sources = (
+                tempo_projects,
+                toggl_projects,
+                dict(config_toggl_table),
             )
 
-        if project.key not in toggl_mapping:
-            return WorklogError(
-                'unknown jira key "{}", please add the key to '
-                'configuration '.format(project.key)
+        return self._tables
+
+
+class WorklogJoin:
+    """Pair worklogs with their Jira and Toggl projects as they arrive.
+
+    Iterating yields the pairs lazily and skips the worklogs whose project
+    is unknown or not mapped. Every distinct problem is collected, so that
+    after a single pass `error` tells all of them at once.
+    """
+
+    def __init__(
+        self,
+        worklogs: Iterable[WorkLog],
+        tempo_projects: Iterable[JiraProject],
+        config_toggl_table: Mapping[str, int],
+        toggl_projects: Iterable[TogglProject],
+        refresh_projects: Optional[ProjectsRefresh] = None,
+        tables: Optional[ProjectTables] = None,
+    ) -> None:
+        """Look up the projects of `worklogs` when iterated.
+
+        :param refresh_projects: called once to get up to date projects if a
+        worklog refers to an unknown project, for example when the projects
+        come from a cache.
+        :param tables: reuse the lookup tables of earlier joins.
+        """
+        self._worklogs = worklogs
+        self._config_toggl_table = config_toggl_table
+        self._refresh_projects = refresh_projects
+        self._tempo_table, self._toggl_mapping = (
+            tables or ProjectTables()
+        ).get(tempo_projects, toggl_projects, config_toggl_table)
+
+        # number of worklogs by the problem
+        self.unknown_project_ids: Counter[int] = Counter()
+        self.unmapped_keys: Counter[str] = Counter()
+        self.invalid_keys: Counter[str] = Counter()
+
+    def _refresh(self) -> None:
+        if self._refresh_projects:
+            logger.info('unknown project, refreshing the project lists')
+            self._tempo_table, self._toggl_mapping = build_tables(
+                *self._refresh_projects(), self._config_toggl_table
             )
-        else:
-            toggl_project = toggl_mapping.get(project.key)
-
-            if toggl_project is None:
-                return WorklogError(
-                    'invalid toggl id for jira key {}'.format(project.key)
-                )
-
-            worklogs_response.append(
-                TempoTogglPair(
-                    tempo_log=worklog,
-                    tempo_project=project,
-                    toggl_project=toggl_project,
-                )
+            self._refresh_projects = None
+
+    def _pair(self, worklog: WorkLog) -> Optional[TempoTogglPair]:
+        project_id = worklog.issue.project_id
+        project = self._tempo_table.get(project_id)
+
+        if not project or not self._toggl_mapping.get(project.key, True):
+            self._refresh()
+            project = self._tempo_table.get(project_id)
+
+        if not project:
+            self.unknown_project_ids[project_id] += 1
+            return None
+
+        if project.key not in self._toggl_mapping:
+            self.unmapped_keys[project.key] += 1
+            return None
+
+        toggl_project = self._toggl_mapping[project.key]
+
+        if toggl_project is None:
+            self.invalid_keys[project.key] += 1
+            return None
+
+        return TempoTogglPair(
+            tempo_log=worklog,
+            tempo_project=project,
+            toggl_project=toggl_project,
+        )
+
+    def __iter__(self) -> Iterator[TempoTogglPair]:
+        """Yield the pairs of the worklogs which can be synced."""
+        for worklog in self._worklogs:
+            pair = self._pair(worklog)
+
+            if pair:
+                yield pair
+
+    def error(self) -> Optional[WorklogError]:
+        """All problems found so far, None if there were none."""
+        problems = [
+            'unexpected project id "{}" ({})'.format(
+                project_id, worklog_count(count)
+            )
+            for project_id, count in sorted(self.unknown_project_ids.items())
+        ]
+        problems.extend(
+            'unknown jira key "{}" ({}), please add the key to '
+            'configuration'.format(key, worklog_count(count))
+            for key, count in sorted(self.unmapped_keys.items())
+        )
+        problems.extend(
+            'invalid toggl id for jira key {} ({})'.format(
+                key, worklog_count(count)
             )
+            for key, count in sorted(self.invalid_keys.items())
+        )
+
+        return WorklogError('\n'.join(problems)) if problems else None
+
+
+def worklog_count(count: int) -> str:
+    return '{} worklog{}'.format(count, '' if count == 1 else 's')
+
+
+def join_worklogs(
+    worklogs: Iterable[WorkLog],
+    tempo_projects: Iterable[JiraProject],
+    config_toggl_table: Mapping[str, int],
+    toggl_projects: Iterable[TogglProject],
+    refresh_projects: Optional[ProjectsRefresh] = None,
+    tables: Optional[ProjectTables] = None,
+) -> Union[WorklogError, List[TempoTogglPair]]:
+    """Pair worklogs with their Jira and Toggl projects.
+
+    All the worklogs are joined even if some of them fail, and the error
+    lists every problem. See `WorklogJoin` for the parameters.
+    """
+    join = WorklogJoin(
+        worklogs,
+        tempo_projects,
+        config_toggl_table,
+        toggl_projects,
+        refresh_projects=refresh_projects,
+        tables=tables,
+    )
+    pairs = list(join)
 
-    return worklogs_response
+    return join.error() or pairs
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def snake_case(key: str) -> str:
+    result: str = decamelize(key)
+
+    return result
+
+
+_MISSING = object()
+
+
+def normalize_keys(node: Any, rename: bool = True) -> Any:
+    """Convert keys to snake_case and rename "self" keys in a single pass.
+
+    Gives the same result as `rename_self(decamelize(node))`: keys are
+    converted everywhere, but like in `rename_self`, "self" is not renamed
+    inside lists.
+    """
+    if isinstance(node, Mapping):
+        normalized = {}
+        self_value = _MISSING
+
+        for key, value in node.items():
+            key = snake_case(key)
+            value = normalize_keys(value, rename)
+
+            if rename and key == 'self':
+                self_value = value
+            else:
+                normalized[key] = value
+
+        if self_value is _MISSING:
+            return normalized
+
+        return {'self_': self_value, **normalized}
+    elif isinstance(node, list):
+        return [normalize_keys(i, rename=False) for i in node]
+    else:
+        return node
 
 
 def reformat_json(dirty: Iterable[Dict]) -> Iterator[Dict]:
     """Rename self attribute and convert to snake_case."""
+    profiler = profiling.current()
+
     for obj in dirty:
-        yield rename_self(decamelize(obj))
+        profiler.start('parse')
+
+        try:
+            normalized = normalize_keys(obj)
+        finally:
+            profiler.stop()
+
+        yield normalized
+
+
+def fetch_jira_projects(
+    jira_url: str, transport: Transport, fast_validation: bool = False
+) -> List[JiraProject]:
+    response = transport.get('{}/rest/api/2/project'.format(jira_url))
+
+    check_jira_auth(response)
+    response.raise_for_status()
+
+    # api returns 200 for wrong password
+    if response.text == '[]':
+        logger.critical('no jira projects found, possibly wrong password')
+        sys.exit(1)
+
+    with metrics.phase('parse_json'), profiling.section('parse'):
+        projects = json.loads(response.content)
+
+    return list(
+        parse_many(JiraProject, reformat_json(projects), fast=fast_validation)
+    )
+
+
+def fetch_jira_project(
+    jira_url: str,
+    project_id: int,
+    transport: Transport,
+    fast_validation: bool = False,
+) -> List[JiraProject]:
+    """Fetch a single project, nothing if it doesn't exist."""
+    response = transport.get(
+        '{}/rest/api/2/project/{}'.format(jira_url, project_id)
+    )
+
+    if response.status_code == 404:
+        return []
+
+    check_jira_auth(response)
+    response.raise_for_status()
+    project = normalize_keys(json.loads(response.content))
+
+    return list(parse_many(JiraProject, [project], fast=fast_validation))
+
+
+def fetch_worklog_window(
+    jira_url: str,
+    date_from: date,
+    date_to: Optional[date],
+    transport: Transport,
+    updated_since: Optional[datetime] = None,
+) -> Iterator[Dict]:
+    """Stream the worklogs of a single window without reading the whole body.
+
+    The request is retried by the transport, but errors in the middle of the
+    body are not.
+    """
+    params = {'dateFrom': date_from.isoformat()}
+
+    if date_to:
+        params['dateTo'] = date_to.isoformat()
+
+    if updated_since:
+        params['updatedFrom'] = updated_since.isoformat()
+
+    response = transport.get(
+        '{}/rest/tempo-timesheets/3/worklogs'.format(jira_url),
+        params=params,
+        stream=True,
+    )
+    # the jira projects may come from the cache, so this is the first
+    # request to find out about a wrong password
+    check_jira_auth(response)
+    response.raise_for_status()
+
+    with closing(response):
+        yield from iter_json_array(response.iter_content(CHUNK_SIZE))
+
+
+def is_older(raw: Dict, updated_since: datetime) -> bool:
+    """Whether the raw worklog was last updated before `updated_since`.
+
+    Worklogs without dateUpdated were not edited, and worklogs without
+    either date are left for the validation to report.
+    """
+    updated = raw.get('date_updated') or raw.get('date_created')
+
+    if updated is None:
+        return False
+
+    return parse_datetime(updated) < updated_since
+
+
+def parse_worklogs(
+    dirty: Iterable[Dict],
+    updated_since: Optional[datetime] = None,
+    fast_validation: bool = False,
+) -> ClosingIterator[WorkLog]:
+    """Validate raw worklogs one at a time, skipping duplicates.
+
+    Closing the returned iterator closes `dirty`, e.g. stops its background
+    fetches.
+    """
+    worklogs = reformat_json(dirty)
+
+    if updated_since:
+        worklogs = (i for i in worklogs if not is_older(i, updated_since))
+
+    seen: Set[int] = set()
+
+    def unique(worklogs: Iterable[Dict]) -> Iterator[Dict]:
+        for i in worklogs:
+            if i['id'] not in seen:
+                seen.add(i['id'])
+                yield i
+
+    return ClosingIterator(
+        parse_many(WorkLog, unique(worklogs), fast=fast_validation), dirty
+    )
+
+
+def fetch_worklogs(
+    jira_url: str,
+    from_date: date,
+    transport: Transport,
+    updated_since: Optional[datetime] = None,
+    window: FetchWindow = FetchWindow.NONE,
+    concurrency: int = 1,
+    fast_validation: bool = False,
+) -> ClosingIterator[WorkLog]:
+    """Fetch worklogs started after `from_date`.
+
+    The date range is fetched in windows of `window` size, `concurrency`
+    windows at a time. Each window is retried separately. Worklogs are
+    yielded in the order of the windows, without duplicates, while the
+    responses are still being received. The fetching starts already before
+    the returned iterator is consumed. Close the iterator to stop them if
+    it isn't consumed to the end.
+
+    :param updated_since: only return worklogs created or updated after this.
+    Tempo versions which don't support "updatedFrom" parameter return all
+    worklogs, so they are filtered here before the validation.
+    :param fast_validation: validate only a sample of the worklogs.
+    """
+    windows = date_windows(from_date, date.today(), window)
+
+    stream: ParallelStream[Dict] = ParallelStream(
+        (
+            partial(
+                fetch_worklog_window,
+                jira_url,
+                start,
+                end,
+                transport,
+                updated_since,
+            )
+            for start, end in windows
+        ),
+        concurrency,
+    )
+
+    return parse_worklogs(stream, updated_since, fast_validation)
@@ -1,7 +1,17 @@
 """https://github.com/toggl/toggl_api_docs/blob/master/chapters/time_entries.md  # noqa
 """
 
-from typing import Iterator, List, Sequence, Optional, Any
+from typing import (
+    Iterator,
+    List,
+    Sequence,
+    Optional,
+    Any,
+    Dict,
+    Tuple,
+    Iterable,
+    Union,
+)
 import sys
 from datetime import datetime, timedelta
 import traceback
@@ -9,17 +19,38 @@ import json
 from json import JSONEncoder
 import logging
 from dataclasses import asdict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
 
 from pydantic.dataclasses import dataclass
 from pydantic import BaseModel
-import requests
 from requests.exceptions import RequestException, HTTPError
 from tzlocal import get_localzone
 
+from tempoggl import metrics, profiling
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.transport import Transport
+from tempoggl.validation import parse_many
+
 
 logger = logging.getLogger(__name__)
 
-local_tz = get_localzone()
+
+TOGGL_API_URL = 'https://www.toggl.com/api/v8'
+
+# https://github.com/toggl/toggl_api_docs#the-api-format
+TOGGL_REQUESTS_PER_SECOND = 1.0
+
+# GET /time_entries returns at most this many entries
+TIME_ENTRIES_LIMIT = 1000
+
+# the shortest range the time entries are split into
+MIN_TIME_ENTRY_RANGE = timedelta(minutes=1)
+
+
+class TogglAuthError(SystemExit):
+    """Toggl refused the token, exits like `sys.exit(1)` unless caught."""
 
 
 # see https://github.com/toggl/toggl_api_docs/blob/master/chapters/projects.md
@@ -32,6 +63,15 @@ class Workspace(BaseModel):
     id: int
 
 
+# an existing entry, see GET /time_entries
+class TogglTimeEntry(BaseModel):
+    id: int
+    start: datetime
+    duration: int  # seconds, negative if the entry is running
+    pid: Optional[int] = None
+    description: str = ''
+
+
 # represents single Toggl entry, which is displayed for user before pushing
 # changes to Toggl.
 @dataclass
@@ -72,43 +112,196 @@ class TogglEntry:
     time_entry: TogglEntryRequest
 
 
+@lru_cache(maxsize=None)
+def local_timezone() -> Any:
+    """Look up the timezone only when it's needed, it's slow."""
+    return get_localzone()
+
+
+def aware(value: datetime) -> datetime:
+    # Tempo api returns datetimes without timezone contrary to the api
+    # docs. We should assume the timezone is in the user's timezone.
+    if value.tzinfo is None:
+        localized: datetime = local_timezone().localize(value)
+
+        return localized
+
+    return value
+
+
 class DateTimeEncoder(JSONEncoder):
     def default(self, node: Any) -> Any:
         if isinstance(node, datetime):
-            # Tempo api returns datetimes without timezone contrary to the api
-            # docs. We should assume the timezone is in the user's timezone.
-            if node.tzinfo is None:
-                return local_tz.localize(node).isoformat()
-
-            return node.isoformat()
+            return aware(node).isoformat()
 
         return JSONEncoder.default(self, node)
 
 
-def fetch_projects(api_token: str) -> Iterator[TogglProject]:
-    auth = (api_token, 'api_token')
-    res = requests.get('https://www.toggl.com/api/v8/workspaces', auth=auth)
+def encode_entry(entry: TogglEntry) -> str:
+    with profiling.section('push'):
+        return json.dumps(asdict(entry), cls=DateTimeEncoder)
+
+
+def toggl_auth(api_token: str) -> Tuple[str, str]:
+    return (api_token, 'api_token')
+
+
+def fetch_projects(
+    transport: Transport,
+    fast_validation: bool = False,
+    api_url: str = TOGGL_API_URL,
+) -> Iterator[TogglProject]:
+    """Fetch projects of all workspaces.
+
+    The transport must be authenticated with `toggl_auth`.
+    """
+    res = transport.get('{}/workspaces'.format(api_url))
 
     if res.status_code == 403:
         logger.critical('invalid toggl token')
-        sys.exit(1)
+        raise TogglAuthError(1)
 
     res.raise_for_status()
 
     workspaces = [Workspace.parse_obj(i) for i in json.loads(res.text)]
 
     for workspace in workspaces:
-        resp = requests.get(
-            'https://www.toggl.com/api/v8/workspaces/{}/projects'.format(
-                workspace.id
-            ),
-            auth=auth,
+        resp = transport.get(
+            '{}/workspaces/{}/projects'.format(api_url, workspace.id)
         )
         resp.raise_for_status()
 
-        projects = [TogglProject.parse_obj(i) for i in json.loads(resp.text)]
+        with metrics.phase('parse_json'), profiling.section('parse'):
+            projects = json.loads(resp.text)
+
+        yield from parse_many(TogglProject, projects, fast=fast_validation)
+
+
+def fetch_project(
+    project_id: int,
+    transport: Transport,
+    fast_validation: bool = False,
+    api_url: str = TOGGL_API_URL,
+) -> List[TogglProject]:
+    """Fetch a single project, nothing if it doesn't exist."""
+    response = transport.get('{}/projects/{}'.format(api_url, project_id))
+
+    if response.status_code == 404:
+        return []
+
+    if response.status_code == 403:
+        logger.critical(
+            'toggl denied access to project {}, possibly invalid toggl '
+            'token'.format(project_id)
+        )
+        raise TogglAuthError(1)
+
+    response.raise_for_status()
+    project = json.loads(response.text)['data']
+
+    return list(parse_many(TogglProject, [project], fast=fast_validation))
+
+
+def _fetch_time_entry_page(
+    start: datetime, end: datetime, transport: Transport, api_url: str
+) -> List[TogglTimeEntry]:
+    response = transport.get(
+        '{}/time_entries'.format(api_url),
+        params={
+            'start_date': aware(start).isoformat(),
+            'end_date': aware(end).isoformat(),
+        },
+    )
+    response.raise_for_status()
+
+    return [TogglTimeEntry.parse_obj(i) for i in json.loads(response.text)]
+
+
+def fetch_time_entries(
+    start: datetime,
+    end: datetime,
+    transport: Transport,
+    api_url: str = TOGGL_API_URL,
+    limit: int = TIME_ENTRIES_LIMIT,
+) -> List[TogglTimeEntry]:
+    """Fetch the entries of the user started between `start` and `end`.
+
+    Toggl returns at most `limit` entries for a single request, and leaves
+    out the rest without telling. A range which hits the limit is split in
+    halves until each half has fewer entries.
+    """
+    found: Dict[int, TogglTimeEntry] = {}
+    ranges = [(start, end)]
+
+    while ranges:
+        range_start, range_end = ranges.pop()
+        entries = _fetch_time_entry_page(
+            range_start, range_end, transport, api_url
+        )
+
+        if len(entries) >= limit:
+            if range_end - range_start <= MIN_TIME_ENTRY_RANGE:
+                logger.critical(
+                    'more than {} toggl entries start between {} and {}, '
+                    'cannot tell which exist already'.format(
+                        limit, range_start, range_end
+                    )
+                )
+                sys.exit(1)
+
+            middle = range_start + (range_end - range_start) / 2
+            # the earlier half first, to keep the entries in order
+            ranges.extend([(middle, range_end), (range_start, middle)])
+            continue
+
+        # entries at the boundary of two ranges are returned by both
+        found.update((entry.id, entry) for entry in entries)
+
+    return list(found.values())
+
 
-        yield from projects
+EntryKey = Tuple[datetime, int, Optional[int], str]
+
+
+def entry_key(entry: Union[TogglEntryRequest, TogglTimeEntry]) -> EntryKey:
+    return (aware(entry.start), entry.duration, entry.pid, entry.description)
+
+
+def sync_window(entries: Sequence[TogglEntry]) -> Tuple[datetime, datetime]:
+    """Range of the start times of the entries."""
+    starts = [e.time_entry.start for e in entries]
+
+    # include the entries which start at the last start time
+    return (min(starts), max(starts) + timedelta(seconds=1))
+
+
+def reconcile(
+    entries: Sequence[TogglEntry], existing: Iterable[TogglTimeEntry]
+) -> Dict[int, int]:
+    """Find the entries which already exist in Toggl.
+
+    Each existing entry matches at most one of the entries, so worklogs
+    which are identical to each other are all pushed unless Toggl has as
+    many copies of them.
+
+    :returns: indices of the entries to the ids of the existing entries.
+    """
+    index: Dict[EntryKey, List[int]] = {}
+
+    for toggl_entry in existing:
+        if toggl_entry.duration >= 0:
+            key = entry_key(toggl_entry)
+            index.setdefault(key, []).append(toggl_entry.id)
+
+    matched = {}
+
+    for i, entry in enumerate(entries):
+        toggl_ids = index.get(entry_key(entry.time_entry))
+
+        if toggl_ids:
+            matched[i] = toggl_ids.pop()
+
+    return matched
 
 
 def generate_description(jira_key: str, comment: str) -> str:
@@ -119,31 +312,126 @@ def generate_description(jira_key: str, comment: str) -> str:
         return '{}: {}'.format(jira_key, comment)
 
 
+@dataclass
+class PushResult:
+    """Outcome of pushing entries, keyed by the index of the pushed entry.
+
+    Entries which are in neither dict were not pushed, because an earlier
+    error stopped the push.
+    """
+
+    created: Dict[int, int]  # entry index to created toggl entry id
+    errors: Dict[int, str]  # entry index to formatted error
+
+    def not_pushed(self, total: int) -> List[int]:
+        return [
+            i
+            for i in range(total)
+            if i not in self.created and i not in self.errors
+        ]
+
+
+def push_entry(
+    entry: TogglEntry, transport: Transport, api_url: str = TOGGL_API_URL
+) -> int:
+    """POST a single entry into Toggl.
+
+    :returns: id of the created time entry.
+    """
+    response = transport.post(
+        '{}/time_entries'.format(api_url),
+        data=encode_entry(entry),
+        headers={'Content-Type': 'application/json'},
+    )
+
+    response.raise_for_status()
+
+    return int(json.loads(response.text)['data']['id'])
+
+
+def update_entry(
+    toggl_id: int,
+    entry: TogglEntry,
+    transport: Transport,
+    api_url: str = TOGGL_API_URL,
+) -> bool:
+    """Overwrite the fields of an entry.
+
+    :returns: False if the entry doesn't exist anymore.
+    """
+    response = transport.put(
+        '{}/time_entries/{}'.format(api_url, toggl_id),
+        data=encode_entry(entry),
+        headers={'Content-Type': 'application/json'},
+    )
+
+    if response.status_code == 404:
+        return False
+
+    response.raise_for_status()
+
+    return True
+
+
+def delete_entry(
+    toggl_id: int, transport: Transport, api_url: str = TOGGL_API_URL
+) -> None:
+    """Delete an entry, which is fine if it's already deleted."""
+    response = transport.delete('{}/time_entries/{}'.format(api_url, toggl_id))
+
+    if response.status_code != 404:
+        response.raise_for_status()
+
+
 def push_worklogs(
-    entries: Sequence[TogglEntry], toggl_token: str
-) -> Optional[str]:
+    entries: Sequence[TogglEntry],
+    transport: Transport,
+    concurrency: int = 1,
+    stop_on_error: bool = True,
+    limiter: Optional[TokenBucket] = None,
+    api_url: str = TOGGL_API_URL,
+) -> PushResult:
     """POST converted tempo worklogs into Toggl.
 
-    :returns: If we get error, the formatted traceback.
+    Requests are sent from a pool of `concurrency` workers, but the overall
+    request rate is limited to what Toggl allows for a single api token.
+
+    :param stop_on_error: don't start new requests after the first error.
+    :returns: created entry ids and formatted errors.
     """
-    for index, worklog in enumerate(entries):
-        logger.info('pushing worklog {}/{}'.format(index + 1, len(entries)))
+    limiter = limiter or TokenBucket(TOGGL_REQUESTS_PER_SECOND)
+    stop = Event()
+    result = PushResult(created={}, errors={})
 
-        payload = json.dumps(asdict(worklog), cls=DateTimeEncoder)
+    def push(index: int, entry: TogglEntry) -> None:
+        if stop.is_set():
+            return
 
-        response = requests.post(
-            'https://www.toggl.com/api/v8/time_entries',
-            data=payload,
-            headers={'Content-Type': 'application/json'},
-            auth=(toggl_token, 'api_token'),
-        )
+        limiter.acquire()
+
+        if stop.is_set():
+            return
+
+        logger.info('pushing worklog {}/{}'.format(index + 1, len(entries)))
 
         try:
-            response.raise_for_status()
+            result.created[index] = push_entry(entry, transport, api_url)
         except HTTPError as err:
             assert isinstance(err.response.text, str)
-            return err.response.text
-        except RequestException:
-            return traceback.format_exc()
-
-    return None
+            result.errors[index] = err.response.text
+        except (RequestException, ValueError, KeyError):
+            result.errors[index] = traceback.format_exc()
+        else:
+            return
+
+        if stop_on_error:
+            stop.set()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [
+            executor.submit(push, index, entry)
+            for index, entry in enumerate(entries)
+        ]:
+            future.result()
+
+    return result
@@ -0,0 +1,273 @@
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+    Any,
+    Mapping,
+    Callable,
+    List,
+    Iterator,
+)
+from copy import copy
+from threading import Lock
+from time import perf_counter
+from urllib.parse import urlparse
+import logging
+
+import requests
+from requests import Session, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from tempoggl import metrics
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.retry import RetryPolicy
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip',
+    'User-Agent': 'tempoggl https://github.com/je-l/tempoggl',
+}
+
+
+def host_of(url: str) -> str:
+    """Scheme and netloc of the url, e.g. "https://jira.example.com"."""
+    parsed = urlparse(url)
+
+    return '{}://{}'.format(parsed.scheme, parsed.netloc)
+
+
+def sent_bytes(response: Response) -> int:
+    body = response.request.body if response.request else None
+
+    return len(body) if body else 0
+
+
+def received_bytes(response: Response, streamed: bool) -> Optional[int]:
+    """Length of the body, None if a streamed body must be read first."""
+    length = response.headers.get('Content-Length', '')
+
+    if length.isdigit():
+        return int(length)
+
+    return None if streamed else len(response.content)
+
+
+def count_streamed_bytes(response: Response, host: str) -> None:
+    """Record the received bytes of a streamed body once it has been read.
+
+    The bytes are counted as they arrived, before decompressing, like the
+    Content-Length of the other responses.
+    """
+    iter_content = response.iter_content
+
+    def counted(*args: Any, **kwargs: Any) -> Iterator[Any]:
+        try:
+            yield from iter_content(*args, **kwargs)
+        finally:
+            metrics.record_received(host, response.raw.tell())
+
+    response.iter_content = counted  # type: ignore
+
+
+class Transport:
+    """Pooled HTTP sessions shared by all Jira, Tempo and Toggl requests.
+
+    Each host gets its own session, so connections are kept alive between
+    requests to the same host and the auth of one host never leaks into
+    requests to another. Failed requests are retried by the `retry` policy.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keep_alive: bool = True,
+        headers: Optional[Mapping[str, str]] = None,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        """Keep up to `pool_size` connections open per host."""
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.retry = retry or RetryPolicy()
+        self._auth: Dict[str, Tuple[str, str]] = {}
+        self._sessions: Dict[str, Session] = {}
+        self._observers: Dict[str, List[Callable[[int], None]]] = {}
+        self._limiters: Dict[str, TokenBucket] = {}
+        self._owns_sessions = True
+        self._lock = Lock()
+
+    def shared(self) -> 'Transport':
+        """Transport which uses the same connection pools and rate limits.
+
+        The auth and the observers are its own, so that several users can
+        be synced through the same pools. Closing it closes nothing.
+        """
+        transport = copy(self)
+        transport._auth = {}
+        transport._observers = {}
+        transport._owns_sessions = False
+
+        return transport
+
+    def authenticate(self, url: str, auth: Tuple[str, str]) -> None:
+        """Use basic auth for all requests to the host of `url`."""
+        host = host_of(url)
+        self._auth[host] = auth
+
+        if not self._owns_sessions:
+            # sent with every request instead
+            return
+
+        with self._lock:
+            if host in self._sessions:
+                self._sessions[host].auth = auth
+
+    def limit(self, url: str, limiter: TokenBucket) -> None:
+        """Limit the rate of all requests to the host of `url`.
+
+        Transports created with `shared` are limited too.
+        """
+        self._limiters[host_of(url)] = limiter
+
+    def session(self, url: str) -> Session:
+        host = host_of(url)
+
+        with self._lock:
+            if host not in self._sessions:
+                logger.info('opening connection pool for {}'.format(host))
+                self._sessions[host] = self._create_session(host)
+
+            return self._sessions[host]
+
+    def _create_session(self, host: str) -> Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount(host, adapter)
+        session.headers.update(self.headers)
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        if self._owns_sessions and host in self._auth:
+            session.auth = self._auth[host]
+
+        return session
+
+    def observe(
+        self, url: str, callback: Callable[[int], None]
+    ) -> Callable[[], None]:
+        """Call `callback` with the status of every response from the host.
+
+        Retried responses are included, e.g. for adapting the request rate.
+
+        :returns: function which stops calling `callback`.
+        """
+        host = host_of(url)
+
+        with self._lock:
+            # copied, so that requests in flight iterate the old list
+            self._observers[host] = [*self._observers.get(host, []), callback]
+
+        def remove() -> None:
+            with self._lock:
+                self._observers[host] = [
+                    c for c in self._observers[host] if c is not callback
+                ]
+
+        return remove
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Response:
+        """Send the request, and retry it as long as the policy allows."""
+        host = host_of(url)
+        limiter = self._limiters.get(host)
+        attempt = 0
+
+        if not self._owns_sessions and host in self._auth:
+            kwargs.setdefault('auth', self._auth[host])
+
+        while True:
+            if limiter:
+                limiter.acquire()
+
+            started = perf_counter()
+
+            try:
+                response = self.send(method, url, **kwargs)
+            except RequestException as err:
+                metrics.record_request(host, 'error', perf_counter() - started)
+
+                if not self.retry.should_retry(
+                    attempt, error=err, method=method
+                ):
+                    raise
+
+                logger.warning(
+                    '{} {} failed, retrying: {}'.format(method, url, err)
+                )
+                metrics.record_retry(host)
+                self.retry.wait(attempt)
+            else:
+                if metrics.active():
+                    received = received_bytes(
+                        response, kwargs.get('stream', False)
+                    )
+                    metrics.record_request(
+                        host,
+                        str(response.status_code),
+                        perf_counter() - started,
+                        sent_bytes(response),
+                        received or 0,
+                    )
+
+                    if received is None:
+                        count_streamed_bytes(response, host)
+
+                for callback in self._observers.get(host, []):
+                    callback(response.status_code)
+
+                if not self.retry.should_retry(
+                    attempt, response=response, method=method
+                ):
+                    return response
+
+                logger.warning(
+                    '{} {} returned {}, retrying'.format(
+                        method, url, response.status_code
+                    )
+                )
+                response.close()
+                metrics.record_retry(host)
+                self.retry.wait(attempt, response)
+
+            attempt += 1
+
+    def send(self, method: str, url: str, **kwargs: Any) -> Response:
+        """Send a single request without retrying."""
+        return self.session(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> Response:
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self) -> None:
+        if not self._owns_sessions:
+            return
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions.clear()
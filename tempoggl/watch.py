@@ -0,0 +1,131 @@
+"""Keep syncing on a schedule in a single long-running process.
+
+What is slow to set up is kept between the syncs: the open connections, the
+project metadata and its lookup tables, the ledger and the watermark of the
+last sync.
+"""
+
+from typing import Callable, Optional
+from contextlib import closing
+from datetime import datetime, timedelta
+from getpass import getpass
+from threading import Event
+import logging
+import signal
+import sys
+
+from tempoggl import metrics
+from tempoggl.cache import MetadataCache, cache_dir
+from tempoggl.config import AppConfig, default_config_dir
+from tempoggl.ledger import Ledger
+from tempoggl.schedule import Schedule
+from tempoggl.sync import (
+    authenticate,
+    jira_password_prompt,
+    open_ledger,
+    open_transport,
+    record_summary,
+    sync,
+)
+from tempoggl.tempo import ProjectTables, JiraAuthError
+from tempoggl.toggl import TogglAuthError
+from tempoggl.transport import Transport
+
+
+logger = logging.getLogger(__name__)
+
+# the syncs in between fetch only the worklogs updated since the last sync,
+# which is cheap but can't notice removed worklogs
+FULL_SYNC_INTERVAL = timedelta(hours=24)
+
+
+def sync_once(
+    config: AppConfig,
+    transport: Transport,
+    ledger: Ledger,
+    cache: MetadataCache,
+    tables: ProjectTables,
+) -> bool:
+    """Sync, and keep watching even if the sync fails.
+
+    Exit if a credential is refused, the next syncs would fail the same way.
+    """
+    try:
+        record_summary(sync(config, transport, ledger, cache, tables))
+    except JiraAuthError as err:
+        logger.critical('{}, stopped watching'.format(err))
+        sys.exit(1)
+    except TogglAuthError:
+        # the reason is logged already
+        raise
+    except SystemExit as exit:
+        if exit.code:
+            logger.error('sync failed: {}'.format(exit.code))
+            return False
+    except Exception:
+        logger.exception('sync failed')
+        return False
+
+    return True
+
+
+def watch(
+    config: AppConfig,
+    jira_password: str,
+    schedule: Schedule,
+    stop: Event,
+    clock: Callable[[], datetime] = datetime.now,
+) -> None:
+    """Sync by `schedule` until `stop` is set.
+
+    A sync in progress is finished before stopping.
+    """
+    with closing(open_transport(config)) as transport, closing(
+        open_ledger(config)
+    ) as ledger:
+        authenticate(config, jira_password, transport)
+        cache = MetadataCache(cache_dir(default_config_dir()))
+        tables = ProjectTables()
+        last_full: Optional[datetime] = None
+
+        while not stop.is_set():
+            started = clock()
+            full = not last_full or started - last_full >= FULL_SYNC_INTERVAL
+            cycle_config = (
+                config if full else config.copy(update={'incremental': True})
+            )
+
+            try:
+                synced = sync_once(
+                    cycle_config, transport, ledger, cache, tables
+                )
+            except SystemExit:
+                metrics.mark_run(False)
+                metrics.flush()
+                raise
+
+            if synced and full:
+                last_full = started
+
+            # the files tell the state of the latest cycle
+            metrics.mark_run(synced)
+            metrics.flush()
+
+            next_run = schedule.next_run(clock())
+            logger.info('next sync at {}'.format(next_run))
+            stop.wait(max(0.0, (next_run - clock()).total_seconds()))
+
+
+def run_watch(config: AppConfig, schedule: Schedule) -> None:
+    if not config.yes:
+        logger.critical('--watch needs --yes, nobody answers the prompt')
+        sys.exit(1)
+
+    jira_password = getpass(jira_password_prompt(config))
+    stop = Event()
+
+    # e.g. systemd and docker stop with SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    watch(config, jira_password, schedule, stop)
+    logger.info('stopped watching')
@@ -0,0 +1,41 @@
+"""Splitting of long date ranges into shorter windows."""
+
+from typing import Iterator, Optional, Tuple
+from datetime import date, timedelta
+from enum import Enum
+
+
+class FetchWindow(str, Enum):
+    """How long date range is fetched from Tempo in a single request."""
+
+    NONE = 'none'
+    WEEK = 'week'
+    MONTH = 'month'
+
+
+def date_windows(
+    start: date, end: date, window: FetchWindow
+) -> Iterator[Tuple[date, Optional[date]]]:
+    """Split the range into windows with inclusive start and end dates.
+
+    The window which contains `end` has no end, so that the windows cover
+    the same dates as a single window, e.g. worklogs logged in advance.
+    With FetchWindow.NONE the whole range is a single window without end.
+    """
+    if window is FetchWindow.NONE:
+        yield (start, None)
+        return
+
+    while True:
+        if window is FetchWindow.WEEK:
+            next_start = start + timedelta(days=7 - start.weekday())
+        else:
+            next_month = start.replace(day=28) + timedelta(days=4)
+            next_start = next_month.replace(day=1)
+
+        if next_start > end:
+            yield (start, None)
+            return
+
+        yield (start, next_start - timedelta(days=1))
+        start = next_start
@@ -1,9 +1,14 @@
-from typing import List, TypeVar, Callable
+from typing import List, TypeVar, Callable, Any, Dict, Iterator
+from contextlib import closing
+from datetime import date, timedelta
+from dataclasses import replace
 import json
 from tempfile import NamedTemporaryFile
 from os import path
+from io import BytesIO
 
 import pytest
+from requests import Response
 
 from tempoggl.tempo import (
     reformat_json,
@@ -13,7 +18,10 @@ from tempoggl.tempo import (
     TempoTogglPair,
 )
 from tempoggl.toggl import TogglProject
-from tempoggl.config import read_config, FileConfig
+from tempoggl.config import read_config, FileConfig, AppConfig
+from tempoggl.retry import RetryPolicy, NO_RETRIES
+from tempoggl.standin import Standin, StandinData
+from tempoggl.transport import Transport
 
 
 T = TypeVar('T')
@@ -40,6 +48,65 @@ def make_config(config: str) -> FileConfig:
         return conf
 
 
+def make_app_config(**kwargs: Any) -> AppConfig:
+    defaults = {
+        'username': 'user',
+        'jira_url': 'https://jira.example.com',
+        'yes': True,
+        'from_date': date(2019, 3, 1),
+        'verbose': False,
+        'jira_to_toggl': {'PROJ': 1115},
+        'toggl_token': 'token',
+        'toggl_url': 'https://www.toggl.com/api/v8',
+        'push_concurrency': 1,
+        'keep_going': False,
+        'http_pool_size': 10,
+        'ignore_ledger': False,
+        'incremental': False,
+        'fetch_window': 'none',
+        'fetch_concurrency': 1,
+        'fast_validation': False,
+        'refresh_cache': False,
+        'targeted_metadata': False,
+        'jira_cache_hours': 0,
+        'toggl_cache_hours': 0,
+        'reconcile': False,
+        'jira_rate_limit': None,
+        'aggregate': False,
+        'preview': 'auto',
+    }
+
+    return AppConfig(**{**defaults, **kwargs})
+
+
+def make_response(status_code: int, body: str, url: str = '') -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.raw = BytesIO(body.encode())
+    response.encoding = 'utf-8'
+    response.url = url
+
+    return response
+
+
+Handler = Callable[..., Response]
+
+
+class FakeTransport(Transport):
+    def __init__(
+        self, handler: Handler, retry: RetryPolicy = NO_RETRIES
+    ) -> None:
+        """Answer requests with `handler(method, url, **kwargs)`."""
+        super().__init__(retry=retry)
+        self.handler = handler
+        self.requests: List[str] = []
+
+    def send(self, method: str, url: str, **kwargs: Any) -> Response:
+        self.requests.append('{} {}'.format(method, url))
+
+        return self.handler(method, url, **kwargs)
+
+
 def load_many(path: str, schema: Callable[..., T]) -> List[T]:
     with open(path) as fixture_file:
         reformatted = reformat_json(json.load(fixture_file))
@@ -81,3 +148,48 @@ def tempodump() -> List[TempoTogglPair]:
         assert isinstance(joined, list)
 
         return joined
+
+
+def later(
+    pair: TempoTogglPair, worklog_id: int, hours: int, comment: str
+) -> TempoTogglPair:
+    """Another worklog of the same issue, started `hours` later."""
+    offset = timedelta(hours=hours)
+    tempo_log = pair.tempo_log.copy(
+        update={
+            'id': worklog_id,
+            'comment': comment,
+            'date_started': pair.tempo_log.date_started + offset,
+            'date_updated': pair.tempo_log.date_updated + offset,
+            'time_spent_seconds': 600,
+        }
+    )
+
+    return replace(pair, tempo_log=tempo_log)
+
+
+def load_json(filename: str) -> List[Dict[str, Any]]:
+    with open(path.join('test', filename)) as f:
+        items: List[Dict[str, Any]] = json.load(f)
+
+    return items
+
+
+@pytest.fixture
+def standin() -> Iterator[Standin]:
+    data = StandinData(
+        jira_projects=load_json('tempo_projects.json'),
+        worklogs=load_json('tempo_worklogs.json'),
+        toggl_projects=load_json('toggl_projects.json'),
+    )
+
+    with closing(Standin(data)) as server:
+        yield server
+
+
+@pytest.fixture
+def config_home(tmp_path: Any, monkeypatch: Any) -> None:
+    """Keep the ledger in a temporary directory, answer yes to the prompt."""
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    (tmp_path / 'tempoggl').mkdir()
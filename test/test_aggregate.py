@@ -0,0 +1,41 @@
+from typing import List
+from datetime import timedelta
+
+from tempoggl.aggregate import aggregate_worklogs
+from tempoggl.tempo import TempoTogglPair
+from test.conftest import later
+
+
+def test_worklogs_of_issue_and_day_are_merged(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    first, second = tempodump
+    worklogs = [
+        later(first, 3, 2, 'review'),
+        first,
+        second,
+        later(first, 2, 1, 'review'),
+    ]
+
+    merged, alone = aggregate_worklogs(worklogs)
+
+    assert alone is second
+    assert merged.merged_ids == (2, 3, first.tempo_log.id)
+    assert merged.worklog_ids == merged.merged_ids
+    assert merged.tempo_log.id == 2
+    assert merged.tempo_log.time_spent_seconds == (
+        first.tempo_log.time_spent_seconds + 1200
+    )
+    assert merged.tempo_log.date_started == first.tempo_log.date_started
+    assert merged.tempo_log.date_updated == (
+        first.tempo_log.date_updated + timedelta(hours=2)
+    )
+    assert merged.tempo_log.comment == 'review; ' + first.tempo_log.comment
+
+
+def test_other_days_are_not_merged(tempodump: List[TempoTogglPair]) -> None:
+    first = tempodump[0]
+
+    worklogs = aggregate_worklogs([first, later(first, 2, 24, 'next day')])
+
+    assert [w.worklog_ids for w in worklogs] == [(first.tempo_log.id,), (2,)]
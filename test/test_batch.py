@@ -0,0 +1,109 @@
+from typing import Any
+
+import pytest
+
+from tempoggl.batch import (
+    BatchUser,
+    UserResult,
+    format_report,
+    sync_batch,
+    user_file_config,
+)
+from tempoggl.cache import MetadataCache
+from tempoggl.config import UserProfile
+from tempoggl.standin import Standin
+from tempoggl.sync import SyncSummary
+from test.conftest import make_app_config, make_config
+
+BATCH_CONFIG = """
+[general]
+jira_url: https://jira.example.com
+push_concurrency: 4
+
+[toggl_mapping]
+PROJ: 1115
+
+[user:alice]
+toggl_token_env: ALICE_TOGGL_TOKEN
+push_concurrency: 1
+aggregate: true
+
+[toggl_mapping:alice]
+TUN: 1113
+
+[user:bob]
+username: robert
+toggl_token: bobtoken
+"""
+
+
+def test_users_are_read_from_sections(monkeypatch: Any) -> None:
+    monkeypatch.setenv('ALICE_TOGGL_TOKEN', 'alicetoken')
+    config = make_config(BATCH_CONFIG)
+
+    alice = user_file_config(config, 'alice', config.users['alice'])
+    bob = user_file_config(config, 'bob', config.users['bob'])
+
+    assert sorted(config.users) == ['alice', 'bob']
+    assert (alice.general.username, alice.general.toggl_token) == (
+        'alice',
+        'alicetoken',
+    )
+    assert alice.general.push_concurrency == 1
+    assert alice.general.aggregate
+    assert alice.toggl_mapping == {'PROJ': 1115, 'TUN': 1113}
+    assert (bob.general.username, bob.general.toggl_token) == (
+        'robert',
+        'bobtoken',
+    )
+    assert bob.general.push_concurrency == 4
+    assert not bob.general.aggregate
+    assert bob.toggl_mapping == {'PROJ': 1115}
+
+
+def test_user_without_token_env_uses_general_token() -> None:
+    config = make_config('[general]\ntoggl_token: shared\n[toggl_mapping]\n')
+
+    single = user_file_config(config, 'carol', UserProfile())
+
+    assert single.general.toggl_token == 'shared'
+
+
+@pytest.mark.usefixtures('config_home')
+def test_users_share_jira_metadata(standin: Standin, tmp_path: Any) -> None:
+    def user(name: str) -> BatchUser:
+        config = make_app_config(
+            username=name,
+            jira_url=standin.jira_url,
+            toggl_url=standin.toggl_url,
+            toggl_token='{}-token'.format(name),
+            jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+            jira_cache_hours=24,
+        )
+
+        return BatchUser(name, config, 'password')
+
+    alice, bob = sync_batch(
+        [user('alice'), user('bob')],
+        concurrency=1,
+        cache=MetadataCache(str(tmp_path / 'cache')),
+    )
+
+    assert (alice.error, alice.summary.created) == (None, 2)
+    # the stand-in serves the same worklogs to everyone
+    assert (bob.error, bob.summary.skipped) == (None, 2)
+    assert standin.requests.count('GET /rest/api/2/project') == 1
+    assert standin.requests.count('GET /api/v8/workspaces') == 2
+
+
+def test_report_has_totals() -> None:
+    results = [
+        UserResult('alice', SyncSummary(fetched=3, created=2, skipped=1)),
+        UserResult('bob', SyncSummary(), 'failed'),
+    ]
+
+    report = format_report(results)
+
+    assert report[1].split() == ['alice', '3', '1', '2', '0', '0', 'ok']
+    assert report[2].split()[-1] == 'failed'
+    assert report[-1].split() == ['total', '3', '1', '2', '0', '0']
@@ -0,0 +1,103 @@
+from typing import Any, List
+from datetime import timedelta
+
+import pytest
+
+from tempoggl.cache import MetadataCache, cache_key
+from tempoggl.tempo import JiraProject
+
+PROJECTS = [JiraProject(id=1234, key='PROJ', name='Projekti project')]
+
+
+class Clock:
+    now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_cache_expires(tmp_path: Any) -> None:
+    clock = Clock()
+    cache = MetadataCache(str(tmp_path), clock=clock.time)
+    fetches: List[int] = []
+    key = cache_key('jira_projects', 'https://jira.example.com')
+
+    def fetch() -> List[JiraProject]:
+        fetches.append(1)
+        return PROJECTS
+
+    def get(**kwargs: Any) -> List[JiraProject]:
+        return cache.get_or_fetch(
+            key, timedelta(hours=1), JiraProject, fetch, **kwargs
+        )
+
+    assert get() == PROJECTS
+    assert get() == PROJECTS
+    assert len(fetches) == 1
+
+    clock.now += 3601
+    assert get() == PROJECTS
+    assert len(fetches) == 2
+
+    assert get(refresh=True) == PROJECTS
+    assert len(fetches) == 3
+
+
+def test_zero_ttl_disables_cache(tmp_path: Any) -> None:
+    cache = MetadataCache(str(tmp_path))
+
+    cache.get_or_fetch('key', timedelta(0), JiraProject, lambda: PROJECTS)
+
+    assert cache.load('key', timedelta(hours=1)) is None
+
+
+def test_fetched_models_are_shared_in_memory(tmp_path: Any) -> None:
+    cache = MetadataCache(str(tmp_path))
+    fetches: List[int] = []
+
+    def fetch() -> List[JiraProject]:
+        fetches.append(1)
+        return PROJECTS
+
+    for _ in range(2):
+        cache.get_or_fetch('key', timedelta(hours=1), JiraProject, fetch)
+
+    # not even read from disk
+    (tmp_path / 'key.json').unlink()
+
+    models = cache.get_or_fetch('key', timedelta(hours=1), JiraProject, fetch)
+
+    assert models == PROJECTS
+    assert len(fetches) == 1
+
+
+@pytest.mark.parametrize(
+    'content', ['{"items": []}', '[]', '{"fetched_at": 0, "items": 1}']
+)
+def test_cache_of_wrong_shape_is_a_miss(tmp_path: Any, content: str) -> None:
+    (tmp_path / 'key.json').write_text(content)
+    cache = MetadataCache(str(tmp_path), clock=lambda: 0.0)
+
+    assert cache.load('key', timedelta(hours=1)) is None
+    models = cache.get_or_fetch(
+        'key', timedelta(hours=1), JiraProject, lambda: PROJECTS
+    )
+
+    assert models == PROJECTS
+
+
+def test_disk_cache_is_parsed_once(tmp_path: Any) -> None:
+    MetadataCache(str(tmp_path)).get_or_fetch(
+        'key', timedelta(hours=1), JiraProject, lambda: PROJECTS
+    )
+    # e.g. the next run of a watch mode restarted in between
+    cache = MetadataCache(str(tmp_path))
+
+    def fetch() -> List[JiraProject]:
+        raise AssertionError('cached')
+
+    first = cache.get_or_fetch('key', timedelta(hours=1), JiraProject, fetch)
+    second = cache.get_or_fetch('key', timedelta(hours=1), JiraProject, fetch)
+
+    assert first == PROJECTS
+    assert first is second
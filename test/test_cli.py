@@ -0,0 +1,62 @@
+import subprocess
+import sys
+from typing import Any
+
+import pytest
+
+from tempoggl.cli import parse_args
+
+HEAVY_MODULES = [
+    'requests',
+    'pydantic',
+    'dateutil',
+    'humps',
+    'tzlocal',
+    'importlib_metadata',
+    'tempoggl.sync',
+]
+
+# the modules importing the cli may add to a bare interpreter, a fraction of
+# what e.g. pydantic or requests alone would add
+MAX_CLI_MODULES = 50
+
+
+def test_cli_import_doesnt_load_heavy_dependencies() -> None:
+    # a fresh interpreter, the test session has imported everything already
+    script = 'import sys, tempoggl.cli; print(" ".join(sys.modules))'
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+
+    loaded = set(output.split())
+
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
+
+
+def test_cli_import_stays_within_module_budget() -> None:
+    # counting modules doesn't depend on the speed of the machine
+    script = (
+        'import sys; before = set(sys.modules); import tempoggl.cli; '
+        'print(len(set(sys.modules) - before))'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+
+    assert int(output) <= MAX_CLI_MODULES
+
+
+def test_version_is_printed(capsys: Any, monkeypatch: Any) -> None:
+    monkeypatch.setattr(sys, 'argv', ['tempoggl', '--version'])
+
+    with pytest.raises(SystemExit) as exc_info:
+        parse_args()
+
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out.strip()
@@ -0,0 +1,173 @@
+from typing import List, Any
+from datetime import datetime, timedelta
+from dataclasses import replace
+import json
+
+from requests import Response
+
+from tempoggl.aggregate import aggregate_worklogs
+from tempoggl.delta import Plan, make_plan, apply_changes
+from tempoggl.ledger import SyncedWorklog
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.sync import tempo_to_toggl
+from tempoggl.tempo import TempoTogglPair
+from test.conftest import FakeTransport, later, make_response
+
+
+def synced(pair: TempoTogglPair, toggl_id: int) -> SyncedWorklog:
+    return SyncedWorklog(
+        pair.tempo_log.id, toggl_id, pair.tempo_log.date_updated
+    )
+
+
+def edited(pair: TempoTogglPair, comment: str) -> TempoTogglPair:
+    tempo_log = pair.tempo_log.copy(
+        update={
+            'comment': comment,
+            'date_updated': pair.tempo_log.date_updated + timedelta(hours=1),
+        }
+    )
+
+    return replace(pair, tempo_log=tempo_log)
+
+
+def test_plan_creates_updates_and_deletes(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    first, second = tempodump
+    removed = SyncedWorklog(1, 300, datetime(2019, 3, 1))
+
+    plan = make_plan(
+        [edited(first, 'new comment'), second],
+        {first.tempo_log.id: synced(first, 100)},
+        [synced(first, 100), removed],
+    )
+
+    assert plan.create == [second]
+    assert [(p.tempo_log.comment, i) for p, i in plan.update] == [
+        ('new comment', 100)
+    ]
+    assert plan.delete == [removed]
+
+
+def test_unchanged_worklogs_are_left_alone(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    ledger = {p.tempo_log.id: synced(p, i) for i, p in enumerate(tempodump)}
+
+    assert make_plan(tempodump, ledger, ledger.values()).is_empty()
+
+
+def test_merged_worklog_updates_the_entry_of_its_worklogs(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    first = tempodump[0]
+    added = later(first, 2, 1, 'review')
+    (merged,) = aggregate_worklogs([first, added])
+
+    plan = make_plan([merged], {first.tempo_log.id: synced(first, 100)})
+
+    assert (plan.create, plan.delete) == ([], [])
+    assert plan.update == [(merged, 100)]
+
+
+def test_removed_worklog_of_merged_entry_updates_it(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    first = tempodump[0]
+    (merged,) = aggregate_worklogs([first, later(first, 2, 1, 'review')])
+    rows = [
+        SyncedWorklog(i, 100, merged.tempo_log.date_updated)
+        for i in [*merged.worklog_ids, 3]
+    ]
+
+    plan = make_plan([merged], {i.worklog_id: i for i in rows}, rows)
+
+    assert plan.delete == []
+    assert plan.update == [(merged, 100)]
+
+
+def test_separately_pushed_worklogs_are_merged(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    first = tempodump[0]
+    added = later(first, 2, 1, 'review')
+    (merged,) = aggregate_worklogs([first, added])
+    separate = synced(added, 200)
+
+    plan = make_plan(
+        [merged], {2: separate, first.tempo_log.id: synced(first, 100)}
+    )
+
+    assert plan.update == [(merged, 200)]
+    assert plan.delete == [synced(first, 100)]
+
+
+def test_changes_are_applied(tempodump: List[TempoTogglPair]) -> None:
+    def handle(method: str, url: str, **kwargs: Any) -> Response:
+        if method == 'DELETE' and url.endswith('/300'):
+            return make_response(404, 'not found')
+
+        return make_response(200, json.dumps({'data': []}))
+
+    transport = FakeTransport(handle)
+    first, second = tempodump
+    plan = Plan(
+        create=[],
+        update=[(first, 100), (first, 101), (second, 200)],
+        delete=[SyncedWorklog(1, 300, datetime(2019, 3, 1))],
+    )
+
+    result = apply_changes(
+        plan, tempo_to_toggl, transport, limiter=TokenBucket(1e6)
+    )
+
+    assert sorted(transport.requests) == [
+        'DELETE https://www.toggl.com/api/v8/time_entries/300',
+        'PUT https://www.toggl.com/api/v8/time_entries/100',
+        'PUT https://www.toggl.com/api/v8/time_entries/101',
+        'PUT https://www.toggl.com/api/v8/time_entries/200',
+    ]
+    assert len(result.updated) == 3
+    assert result.deleted == [1]
+    assert not result.errors
+
+
+def test_changes_stop_on_error(tempodump: List[TempoTogglPair]) -> None:
+    transport = FakeTransport(lambda *_, **__: make_response(500, 'boom'))
+    plan = Plan(
+        create=[],
+        update=[(tempodump[0], 100), (tempodump[1], 200)],
+        delete=[],
+    )
+
+    result = apply_changes(
+        plan, tempo_to_toggl, transport, limiter=TokenBucket(1e6)
+    )
+
+    assert len(transport.requests) == 1
+    assert result.errors == ['failed updating entry 100: boom']
+
+
+def test_entry_deleted_in_toggl_is_created_again(
+    tempodump: List[TempoTogglPair],
+) -> None:
+    def handle(method: str, url: str, **kwargs: Any) -> Response:
+        if method == 'PUT':
+            return make_response(404, 'not found')
+
+        return make_response(200, json.dumps({'data': {'id': 500}}))
+
+    transport = FakeTransport(handle)
+    plan = Plan(create=[], update=[(tempodump[0], 100)], delete=[])
+
+    result = apply_changes(
+        plan, tempo_to_toggl, transport, limiter=TokenBucket(1e6)
+    )
+
+    assert transport.requests == [
+        'PUT https://www.toggl.com/api/v8/time_entries/100',
+        'POST https://www.toggl.com/api/v8/time_entries',
+    ]
+    assert result.updated == [(tempodump[0], 500)]
+    assert not result.errors
@@ -0,0 +1,117 @@
+from typing import List, Any
+from datetime import datetime, date
+import sqlite3
+
+from tempoggl.aggregate import aggregate_worklogs
+from tempoggl.ledger import Ledger, SyncedWorklog, ledger_path
+from tempoggl.tempo import TempoTogglPair
+from test.conftest import later
+
+
+def test_synced_worklogs_are_skipped(
+    tmp_path: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    db = ledger_path(str(tmp_path))
+    first, second = tempodump
+
+    ledger = Ledger(db, 'https://jira.example.com')
+    ledger.record([(first, 999)])
+    ledger.close()
+
+    reopened = Ledger(db, 'https://jira.example.com')
+    assert reopened.unsynced(tempodump) == [second]
+
+    other_jira = Ledger(db, 'https://other.example.com')
+    assert other_jira.unsynced(tempodump) == tempodump
+
+
+def test_many_synced_ids(
+    tmp_path: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    ledger = Ledger(ledger_path(str(tmp_path)), 'https://jira.example.com')
+    ledger.record([(tempodump[0], 1)])
+
+    assert ledger.synced_ids(range(20000)) == {tempodump[0].tempo_log.id}
+
+
+def test_watermark_per_user(tmp_path: Any) -> None:
+    ledger = Ledger(ledger_path(str(tmp_path)), 'https://jira.example.com')
+    assert ledger.watermark('user') is None
+
+    ledger.save_watermark('user', datetime(2019, 3, 20, 18, 59, 19))
+
+    assert ledger.watermark('user') == datetime(2019, 3, 20, 18, 59, 19)
+    assert ledger.watermark('other') is None
+
+
+def test_synced_worklogs_of_date_range(
+    tmp_path: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    db = ledger_path(str(tmp_path))
+    first, second = tempodump
+
+    Ledger(db, 'https://jira.example.com', 'other').record([(second, 2)])
+    ledger = Ledger(db, 'https://jira.example.com', 'user')
+    ledger.record([(first, 1)])
+
+    # started 2019-03-12, the worklog of the other user is left out
+    assert ledger.synced_between(date(2019, 3, 12), date(2019, 3, 31)) == [
+        SyncedWorklog(first.tempo_log.id, 1, first.tempo_log.date_updated)
+    ]
+    assert ledger.synced_between(date(2019, 3, 13), date(2019, 3, 31)) == []
+
+    ledger.forget([first.tempo_log.id])
+    assert ledger.synced_ids([first.tempo_log.id]) == set()
+
+
+def test_old_ledger_is_migrated(
+    tmp_path: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    db = ledger_path(str(tmp_path))
+    connection = sqlite3.connect(db)
+    connection.executescript(
+        """
+        CREATE TABLE synced_worklogs (
+            jira_url TEXT NOT NULL,
+            worklog_id INTEGER NOT NULL,
+            toggl_id INTEGER NOT NULL,
+            date_updated TEXT NOT NULL,
+            synced_at TEXT NOT NULL,
+            PRIMARY KEY (jira_url, worklog_id)
+        );
+        INSERT INTO synced_worklogs
+        VALUES ('https://jira.example.com', 1, 2, '2019-03-01T00:00:00', '');
+        """
+    )
+    connection.close()
+
+    ledger = Ledger(db, 'https://jira.example.com', 'user')
+    ledger.record([(tempodump[0], 3)])
+
+    assert ledger.synced_ids([1, tempodump[0].tempo_log.id]) == {
+        1,
+        tempodump[0].tempo_log.id,
+    }
+    # start date of the old row is unknown
+    assert (
+        len(ledger.synced_between(date(2019, 1, 1), date(2019, 12, 31))) == 1
+    )
+
+
+def test_merged_worklogs_share_the_entry(
+    tmp_path: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    ledger = Ledger(ledger_path(str(tmp_path)), 'https://jira.example.com')
+    first = tempodump[0]
+    (merged,) = aggregate_worklogs([first, later(first, 2, 1, 'review')])
+    (three,) = aggregate_worklogs(
+        [first, later(first, 2, 1, 'review'), later(first, 3, 2, 'fix')]
+    )
+
+    ledger.record([(three, 7)])
+    ledger.record([(merged, 7)])
+
+    assert {i: s.toggl_id for i, s in ledger.synced(range(20000)).items()} == {
+        2: 7,
+        first.tempo_log.id: 7,
+    }
@@ -0,0 +1,137 @@
+from typing import Any, Iterator
+import json
+
+import pytest
+from requests import Response
+
+from tempoggl import metrics
+from tempoggl.metrics import Metrics
+from tempoggl.retry import RetryPolicy
+from test.conftest import FakeTransport, make_response
+
+
+@pytest.fixture
+def active() -> Iterator[Metrics]:
+    recorded = Metrics()
+    metrics.activate(recorded)
+
+    yield recorded
+
+    metrics.activate(None)
+
+
+def test_summary() -> None:
+    recorded = Metrics()
+    recorded.add_time('join', 0.5)
+    recorded.add_time('join', 0.25)
+    recorded.record_request('https://jira.example.com', '200', 0.2, 10, 30)
+    recorded.record_request('https://jira.example.com', '429', 40.0)
+    recorded.record_retry('https://jira.example.com')
+    recorded.set_gauge('worklogs_created', 3)
+
+    summary = recorded.summary()
+    jira = summary['hosts']['https://jira.example.com']
+
+    assert summary['phases'] == {'join': {'seconds': 0.75, 'count': 2}}
+    assert jira['requests'] == {'200': 1, '429': 1}
+    assert (jira['retries'], jira['bytes_sent'], jira['bytes_received']) == (
+        1,
+        10,
+        30,
+    )
+    assert jira['latency_buckets']['0.25'] == 1
+    assert jira['latency_buckets']['+Inf'] == 1
+    assert summary['gauges'] == {'worklogs_created': 3}
+
+
+def test_prometheus_histogram_is_cumulative() -> None:
+    recorded = Metrics()
+    recorded.record_request('https://toggl.com', '200', 0.01)
+    recorded.record_request('https://toggl.com', '200', 0.3)
+
+    lines = recorded.prometheus().splitlines()
+
+    assert '# TYPE tempoggl_http_request_duration_seconds histogram' in lines
+    assert (
+        'tempoggl_http_requests_total{host="https://toggl.com",status="200"} 2'
+        in lines
+    )
+    assert (
+        'tempoggl_http_request_duration_seconds_bucket'
+        '{host="https://toggl.com",le="0.05"} 1' in lines
+    )
+    assert (
+        'tempoggl_http_request_duration_seconds_bucket'
+        '{host="https://toggl.com",le="+Inf"} 2' in lines
+    )
+    assert (
+        'tempoggl_http_request_duration_seconds_count'
+        '{host="https://toggl.com"} 2' in lines
+    )
+
+
+def test_collect_writes_files_of_failed_run(tmp_path: Any) -> None:
+    json_path = str(tmp_path / 'metrics.json')
+    textfile_path = str(tmp_path / 'tempoggl.prom')
+
+    with pytest.raises(SystemExit):
+        with metrics.collect(json_path, textfile_path):
+            with metrics.phase('join'):
+                pass
+
+            raise SystemExit(1)
+
+    with open(json_path) as f:
+        summary = json.load(f)
+
+    with open(textfile_path) as f:
+        textfile = f.read()
+
+    assert sorted(summary['phases']) == ['join', 'total']
+    assert summary['gauges']['last_run_success'] == 0
+    assert 'tempoggl_last_run_success 0.0\n' in textfile
+    assert metrics.active() is None
+
+
+def test_transport_records_requests_and_retries(active: Metrics) -> None:
+    statuses = iter([503, 200])
+
+    def handle(method: str, url: str, **kwargs: Any) -> Response:
+        response = make_response(next(statuses), 'body')
+        response.headers['Content-Length'] = '4'
+
+        return response
+
+    transport = FakeTransport(handle, RetryPolicy(sleeper=lambda s: None))
+
+    transport.get('https://www.toggl.com/api/v8/workspaces')
+
+    toggl = active.summary()['hosts']['https://www.toggl.com']
+
+    assert toggl['requests'] == {'200': 1, '503': 1}
+    assert toggl['retries'] == 1
+    assert toggl['bytes_received'] == 8
+
+
+def test_streamed_body_is_counted_once_read(active: Metrics) -> None:
+    transport = FakeTransport(
+        lambda method, url, **kwargs: make_response(200, '[1, 2, 3]')
+    )
+
+    response = transport.get('https://jira.example.com/worklogs', stream=True)
+    jira = active.summary()['hosts']['https://jira.example.com']
+    assert jira['bytes_received'] == 0
+
+    assert b''.join(response.iter_content(4)) == b'[1, 2, 3]'
+    jira = active.summary()['hosts']['https://jira.example.com']
+    assert jira['bytes_received'] == 9
+
+
+def test_phase_times_are_a_counter() -> None:
+    recorded = Metrics()
+    recorded.add_time('join', 0.5)
+
+    lines = recorded.prometheus().splitlines()
+
+    assert '# TYPE tempoggl_phase_seconds_total counter' in lines
+    assert 'tempoggl_phase_seconds_total{phase="join"} 0.5' in lines
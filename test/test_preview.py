@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from tempoggl.preview import format_duration, format_summary, summarize
+
+
+def test_totals_per_project_and_day() -> None:
+    hour = timedelta(hours=1)
+    summary = summarize(
+        [
+            ('PROJ', 'Project', date(2019, 3, 12), hour),
+            ('PROJ', 'Project', date(2019, 3, 13), 2 * hour),
+            ('TUN', 'Tunnel', date(2019, 3, 12), hour / 2),
+        ]
+    )
+
+    assert summary.jira_projects['PROJ'].entries == 2
+    assert summary.jira_projects['PROJ'].duration == 3 * hour
+    assert summary.toggl_projects['Tunnel'].duration == hour / 2
+    assert summary.days[date(2019, 3, 12)].duration == 1.5 * hour
+    assert (summary.total.entries, summary.total.duration) == (3, 3.5 * hour)
+
+    lines = format_summary(summary)
+
+    assert lines[1].split() == ['PROJ', '2', '3:00']
+    assert lines[-1].split() == ['total', '3', '3:30']
+
+
+def test_durations_over_a_day_are_in_hours() -> None:
+    assert format_duration(timedelta(days=1, hours=2, minutes=5)) == '26:05'
@@ -0,0 +1,70 @@
+from typing import Any, Set
+from threading import Thread
+import pstats
+
+from tempoggl import profiling
+from tempoggl.profiling import Profiler
+
+
+def joining() -> None:
+    pass
+
+
+def parsing() -> None:
+    pass
+
+
+def profiled_functions(profiler: Profiler) -> Set[str]:
+    stats: Any = profiler.stats()
+
+    return {function for _, _, function in stats.stats}
+
+
+def test_innermost_section_decides() -> None:
+    profiler = Profiler(['join'])
+
+    profiler.start('join')
+    joining()
+    profiler.start('parse')
+    parsing()
+    profiler.stop()
+    joining()
+    profiler.stop()
+    parsing()
+
+    functions = profiled_functions(profiler)
+
+    assert 'joining' in functions
+    assert 'parsing' not in functions
+
+
+def test_threads_are_combined() -> None:
+    profiler = Profiler(['parse'])
+
+    def parse_in_thread() -> None:
+        profiler.start('parse')
+        parsing()
+        profiler.stop()
+
+    thread = Thread(target=parse_in_thread)
+    thread.start()
+    thread.join()
+
+    assert 'parsing' in profiled_functions(profiler)
+
+
+def test_profile_writes_stats_and_report(tmp_path: Any) -> None:
+    stats_path = str(tmp_path / 'sync.prof')
+
+    with profiling.profile(stats_path, ['push'], top=20):
+        with profiling.section('push'):
+            joining()
+
+    stats: Any = pstats.Stats(stats_path)
+
+    with open(stats_path + '.txt') as f:
+        report = f.read()
+
+    assert 'joining' in report
+    assert stats.total_calls > 0
+    assert profiling.current() is profiling.NULL_PROFILER
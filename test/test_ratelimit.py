@@ -0,0 +1,54 @@
+from typing import List
+from dataclasses import dataclass, field
+
+import pytest
+
+from tempoggl.ratelimit import TokenBucket, AdaptiveLimiter
+
+
+@dataclass
+class FakeClock:
+    now: float = 0.0
+    sleeps: List[float] = field(default_factory=list)
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_bucket_waits_for_refill() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(
+        2.0, capacity=2, clock=clock.time, sleeper=clock.sleep
+    )
+
+    for _ in range(4):
+        bucket.acquire()
+
+    # burst of two, then one token every half second
+    assert clock.sleeps == [0.5, 0.5]
+    assert clock.now == 1.0
+
+
+def test_limiter_backs_off_and_recovers() -> None:
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(
+        4.0, increase_after=2, clock=clock.time, sleeper=clock.sleep
+    )
+
+    limiter.record(429)
+    limiter.record(429)
+    assert limiter.rate == 1.0
+
+    for _ in range(4):
+        limiter.record(200)
+
+    assert limiter.rate == pytest.approx(1.8)
+
+    for _ in range(100):
+        limiter.record(429)
+
+    assert limiter.rate == limiter.min_rate == 0.25
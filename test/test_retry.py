@@ -0,0 +1,69 @@
+from typing import Any
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from requests.exceptions import (
+    ConnectionError,
+    ConnectTimeout,
+    HTTPError,
+    ReadTimeout,
+)
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from tempoggl.retry import RetryPolicy, retry_after
+from test.conftest import make_response
+
+
+def test_retry_after_in_seconds_or_date() -> None:
+    response = make_response(429, 'slow down')
+    assert retry_after(response) is None
+
+    response.headers['Retry-After'] = '3'
+    assert retry_after(response) == 3.0
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    response.headers['Retry-After'] = format_datetime(later, usegmt=True)
+    assert 28 < (retry_after(response) or 0) <= 30
+
+    response.headers['Retry-After'] = 'soon'
+    assert retry_after(response) is None
+
+
+def test_retried_statuses_and_errors() -> None:
+    policy = RetryPolicy(retries=2)
+
+    assert policy.should_retry(0, make_response(503, ''))
+    assert policy.should_retry(1, make_response(429, ''))
+    assert not policy.should_retry(2, make_response(503, ''))
+    assert not policy.should_retry(0, make_response(400, ''))
+    assert policy.should_retry(0, error=ConnectionError())
+    assert not policy.should_retry(0, error=HTTPError())
+
+
+def test_post_is_retried_only_if_it_created_nothing() -> None:
+    policy = RetryPolicy()
+    pool: Any = None
+    refused = ConnectionError(
+        MaxRetryError(pool, '/', NewConnectionError(pool, 'refused'))
+    )
+
+    assert policy.should_retry(0, make_response(429, ''), method='POST')
+    assert not policy.should_retry(0, make_response(503, ''), method='POST')
+    assert not policy.should_retry(0, error=ReadTimeout(), method='POST')
+    assert not policy.should_retry(0, error=ConnectionError(), method='POST')
+    assert policy.should_retry(0, error=ConnectTimeout(), method='POST')
+    assert policy.should_retry(0, error=refused, method='POST')
+    assert policy.should_retry(0, make_response(503, ''), method='PUT')
+
+
+def test_backoff_is_capped_and_honors_retry_after() -> None:
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=lambda: 1.0)
+
+    assert [policy.delay(i) for i in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    response = make_response(429, '')
+    response.headers['Retry-After'] = '10'
+    assert policy.delay(0, response) == 11.0
+
+    response.headers['Retry-After'] = '100000'
+    assert policy.delay(0, response) == 121.0
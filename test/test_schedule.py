@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+from tempoggl.schedule import Cron, Interval, parse_schedule
+
+# a wednesday
+NOW = datetime(2020, 1, 15, 10, 7, 30)
+
+
+def test_intervals() -> None:
+    for text, seconds in [('900', 900), ('15m', 900), ('2h', 7200)]:
+        schedule = parse_schedule(text)
+        assert isinstance(schedule, Interval)
+        assert schedule.seconds == seconds
+
+
+@pytest.mark.parametrize(
+    'expression,expected',
+    [
+        ('*/15 * * * *', datetime(2020, 1, 15, 10, 15)),
+        ('0 * * * *', datetime(2020, 1, 15, 11, 0)),
+        ('30 9 * * *', datetime(2020, 1, 16, 9, 30)),
+        ('0 9-17/4 * * 1-5', datetime(2020, 1, 15, 13, 0)),
+        ('0 0 * * 0', datetime(2020, 1, 19, 0, 0)),
+        ('0 0 * * 7', datetime(2020, 1, 19, 0, 0)),
+        ('0 0 1 * *', datetime(2020, 2, 1, 0, 0)),
+        ('0 0 29 2 *', datetime(2020, 2, 29, 0, 0)),
+        ('0 0 1 1 *', datetime(2021, 1, 1, 0, 0)),
+        # either day field matches when both are restricted
+        ('0 0 20 * 5', datetime(2020, 1, 17, 0, 0)),
+    ],
+)
+def test_cron_next_run(expression: str, expected: datetime) -> None:
+    assert parse_schedule(expression).next_run(NOW) == expected
+
+
+@pytest.mark.parametrize(
+    'expression',
+    ['* * * *', '60 * * * *', '*/0 * * * *', 'a * * * *', '0 0 31 2 *'],
+)
+def test_invalid_cron(expression: str) -> None:
+    with pytest.raises(ValueError):
+        Cron(expression)
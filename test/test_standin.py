@@ -0,0 +1,176 @@
+from typing import Iterator
+from contextlib import closing
+from datetime import datetime
+
+import pytest
+
+from tempoggl.standin import Standin, Faults
+from tempoggl.sync import start_syncing
+from tempoggl.toggl import toggl_auth, aware
+from tempoggl.retry import NO_RETRIES
+from tempoggl.transport import Transport
+from test.conftest import make_app_config
+
+
+@pytest.fixture
+def transport(standin: Standin) -> Iterator[Transport]:
+    with closing(Transport(retry=NO_RETRIES)) as transport:
+        transport.authenticate(standin.url, ('user', 'password'))
+        yield transport
+
+
+def test_worklogs_are_filtered_by_date(
+    standin: Standin, transport: Transport
+) -> None:
+    response = transport.get(
+        '{}/rest/tempo-timesheets/3/worklogs'.format(standin.jira_url),
+        params={'dateFrom': '2019-03-13'},
+    )
+
+    assert [w['id'] for w in response.json()] == [12346]
+
+
+def test_toggl_projects_are_listed_by_workspace(
+    standin: Standin, transport: Transport
+) -> None:
+    workspaces = transport.get('{}/workspaces'.format(standin.toggl_url))
+    projects = transport.get(
+        '{}/workspaces/1123/projects'.format(standin.toggl_url)
+    )
+
+    assert workspaces.json() == [{'id': 1112}, {'id': 1123}]
+    assert [p['id'] for p in projects.json()] == [1115]
+
+
+def test_unauthenticated_request_is_rejected(standin: Standin) -> None:
+    with closing(Transport()) as transport:
+        response = transport.get('{}/workspaces'.format(standin.toggl_url))
+
+    assert response.status_code == 401
+
+
+def test_faults_are_injected(standin: Standin, transport: Transport) -> None:
+    url = '{}/rest/api/2/project'.format(standin.jira_url)
+
+    standin.faults = Faults(error_rate=1.0)
+    assert transport.get(url).status_code == 503
+
+    standin.faults = Faults(rate_limit=1)
+    statuses = [transport.get(url).status_code for _ in range(3)]
+    assert statuses[1:] == [429, 429]
+
+
+@pytest.mark.usefixtures('config_home')
+def test_worklogs_are_synced_end_to_end(standin: Standin) -> None:
+    config = make_app_config(
+        jira_url=standin.jira_url,
+        toggl_url=standin.toggl_url,
+        jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+    )
+
+    start_syncing(config, 'password')
+    entries = standin.data.time_entries
+
+    assert sorted(e['pid'] for e in entries) == [1113, 1115]
+    assert 'POST /api/v8/time_entries' in standin.requests
+
+    # the ledger knows that the worklogs are already synced
+    start_syncing(config, 'password')
+    assert len(standin.data.time_entries) == 2
+
+
+@pytest.mark.usefixtures('config_home')
+def test_edits_and_removals_are_synced(standin: Standin) -> None:
+    config = make_app_config(
+        jira_url=standin.jira_url,
+        toggl_url=standin.toggl_url,
+        jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+    )
+    start_syncing(config, 'password')
+
+    edited, removed = standin.data.worklogs
+    edited['comment'] = 'Edited PROJ-711'
+    edited['dateUpdated'] = '2019-03-21T10:00:00.000'
+    standin.data.worklogs = [edited]
+
+    start_syncing(config, 'password')
+
+    assert [e['description'] for e in standin.data.time_entries] == [
+        'Edited PROJ-711'
+    ]
+    assert standin.requests[-2:] == [
+        'PUT /api/v8/time_entries/1',
+        'DELETE /api/v8/time_entries/2',
+    ]
+
+
+@pytest.mark.usefixtures('config_home')
+def test_existing_entries_are_not_pushed_again(standin: Standin) -> None:
+    # created earlier from the first worklog
+    standin.data.time_entries.append(
+        {
+            'id': 99,
+            'pid': 1115,
+            'start': aware(datetime(2019, 3, 12)).isoformat(),
+            'duration': 12345,
+            'description': 'Working on issue PROJ-711',
+        }
+    )
+
+    config = make_app_config(
+        jira_url=standin.jira_url,
+        toggl_url=standin.toggl_url,
+        jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+        reconcile=True,
+    )
+
+    start_syncing(config, 'password')
+
+    assert [e['pid'] for e in standin.data.time_entries] == [1115, 1113]
+    assert standin.requests.count('POST /api/v8/time_entries') == 1
+
+
+def test_toggl_auth_is_accepted(
+    standin: Standin, transport: Transport
+) -> None:
+    transport.authenticate(standin.toggl_url, toggl_auth('token'))
+    response = transport.get('{}/projects/1113'.format(standin.toggl_url))
+
+    assert response.json()['data']['name'] == 'Another project nice'
+
+
+@pytest.mark.usefixtures('config_home')
+def test_aggregated_worklogs_are_pushed_once(standin: Standin) -> None:
+    config = make_app_config(
+        jira_url=standin.jira_url,
+        toggl_url=standin.toggl_url,
+        jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+        aggregate=True,
+    )
+    first, second = standin.data.worklogs
+    standin.data.worklogs.append(
+        {
+            **first,
+            'id': 12347,
+            'comment': 'review',
+            'dateStarted': '2019-03-12T10:00:00.000',
+            'timeSpentSeconds': 600,
+        }
+    )
+
+    start_syncing(config, 'password')
+
+    assert sorted(e['duration'] for e in standin.data.time_entries) == [
+        12345,
+        12945,
+    ]
+
+    standin.data.worklogs = [first, second]
+    start_syncing(config, 'password')
+
+    assert sorted(e['duration'] for e in standin.data.time_entries) == [
+        12345,
+        12345,
+    ]
+    assert standin.requests.count('POST /api/v8/time_entries') == 2
+    assert standin.requests[-1] == 'PUT /api/v8/time_entries/1'
@@ -0,0 +1,77 @@
+from typing import Iterator, List, Callable
+import json
+
+import pytest
+
+from tempoggl.streaming import iter_json_array, ParallelStream
+
+
+def byte_chunks(content: str, size: int) -> Iterator[bytes]:
+    encoded = content.encode()
+
+    for start in range(0, len(encoded), size):
+        end = start + size
+        yield encoded[start:end]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_array_elements_in_any_chunks(
+    tempodump_content: str, chunk_size: int
+) -> None:
+    chunks = byte_chunks(tempodump_content, chunk_size)
+
+    assert list(iter_json_array(chunks)) == json.loads(tempodump_content)
+
+
+def test_split_numbers_and_characters() -> None:
+    content = '[12345, "äö€", 1.5e3 ]'
+
+    assert list(iter_json_array(byte_chunks(content, 1))) == [
+        12345,
+        'äö€',
+        1500,
+    ]
+
+
+def test_truncated_array() -> None:
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array([b'[{"a": 1}, {"b"']))
+
+
+@pytest.mark.parametrize('content', ['[,1]', '[1 2]', '[1,,2]', '[1,]'])
+@pytest.mark.parametrize('chunk_size', [1, 64])
+def test_malformed_array(content: str, chunk_size: int) -> None:
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(byte_chunks(content, chunk_size)))
+
+
+@pytest.mark.parametrize('content', ['[]', '[ ]', '[ 1 , 2 ]'])
+def test_array_spacing(content: str) -> None:
+    assert list(iter_json_array(byte_chunks(content, 1))) == json.loads(
+        content
+    )
+
+
+def source(items: List[int]) -> Callable[[], Iterator[int]]:
+    return lambda: iter(items)
+
+
+def test_parallel_stream_keeps_order() -> None:
+    stream = ParallelStream(
+        [source([1, 2]), source([]), source([3]), source([4, 5, 6])],
+        concurrency=2,
+        buffer_size=1,
+    )
+
+    assert list(stream) == [1, 2, 3, 4, 5, 6]
+
+
+def test_parallel_stream_raises_source_error() -> None:
+    def failing() -> Iterator[int]:
+        yield 2
+        raise ValueError('broken window')
+
+    stream = ParallelStream([source([1]), failing], concurrency=2)
+
+    with pytest.raises(ValueError, match='broken window'):
+        list(stream)
@@ -0,0 +1,157 @@
+from typing import Any, Callable, List, TypeVar
+from os import path
+from datetime import datetime
+import json
+from time import sleep, monotonic
+from itertools import repeat
+import threading
+
+import pytest
+from requests import Response
+
+from tempoggl.delta import Plan
+from tempoggl.ledger import SyncedWorklog
+from tempoggl.preview import Preview
+from tempoggl.sync import (
+    fetch_sources,
+    fetch_referenced_metadata,
+    prompt_for_pushing,
+)
+from tempoggl.tempo import TempoTogglPair, WorkLog, JiraAuthError
+from tempoggl.transport import Transport
+from tempoggl.cache import MetadataCache
+from test.conftest import (
+    make_app_config,
+    load_many,
+    FakeTransport,
+    make_response,
+)
+
+T = TypeVar('T')
+
+
+def slow(value: T) -> Callable[..., T]:
+    def fetch(*args: Any) -> T:
+        sleep(0.2)
+        return value
+
+    return fetch
+
+
+def test_sources_are_fetched_concurrently(
+    monkeypatch: Any, tmp_path: Any
+) -> None:
+    monkeypatch.setattr('tempoggl.sync.fetch_jira_projects', slow(['jira']))
+    monkeypatch.setattr(
+        'tempoggl.sync.fetch_worklogs', lambda *args: iter(['tempo'])
+    )
+    monkeypatch.setattr('tempoggl.sync.fetch_projects', slow(iter([])))
+
+    started = monotonic()
+    jira, tempo, toggl = fetch_sources(
+        make_app_config(), Transport(), MetadataCache(str(tmp_path))
+    )
+
+    assert (jira, list(tempo), toggl) == (['jira'], ['tempo'], [])
+    assert monotonic() - started < 0.5
+
+
+def test_worklog_fetch_stops_if_metadata_fails(
+    monkeypatch: Any, tmp_path: Any
+) -> None:
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise JiraAuthError()
+
+    # endless windows block their threads until the stream is closed
+    monkeypatch.setattr(
+        'tempoggl.tempo.fetch_worklog_window', lambda *args: repeat({})
+    )
+    monkeypatch.setattr('tempoggl.sync.fetch_metadata', fail)
+    threads = threading.active_count()
+
+    with pytest.raises(JiraAuthError):
+        fetch_sources(
+            make_app_config(), Transport(), MetadataCache(str(tmp_path))
+        )
+
+    deadline = monotonic() + 2
+
+    while threading.active_count() > threads and monotonic() < deadline:
+        sleep(0.05)
+
+    assert threading.active_count() == threads
+
+
+def test_only_referenced_projects_are_fetched(tmp_path: Any) -> None:
+    worklogs = load_many(path.join('test', 'tempo_worklogs.json'), WorkLog)
+
+    def get(method: str, url: str, **kwargs: Any) -> Response:
+        project_id = int(url.split('/')[-1])
+
+        if '/rest/api/2/project/' in url:
+            body = {'id': str(project_id), 'key': 'K{}'.format(project_id)}
+            return make_response(200, json.dumps({**body, 'name': 'jira'}))
+        elif project_id == 404:
+            return make_response(404, 'not found')
+
+        return make_response(
+            200, json.dumps({'data': {'id': project_id, 'name': 'toggl'}})
+        )
+
+    transport = FakeTransport(get)
+    config = make_app_config(
+        jira_to_toggl={'PROJ': 1115, 'TUN': 404},
+        jira_cache_hours=1,
+        toggl_cache_hours=1,
+    )
+
+    for _ in range(2):
+        # the projects of the first sync are cached for the second
+        jira, toggl = fetch_referenced_metadata(
+            config, transport, MetadataCache(str(tmp_path)), worklogs
+        )
+
+        assert sorted(p.id for p in jira) == [808, 1234]
+        assert [p.id for p in toggl] == [1115]
+
+    assert len(transport.requests) == 4
+
+
+def test_denied_toggl_project_is_not_a_missing_one(tmp_path: Any) -> None:
+    transport = FakeTransport(
+        lambda method, url, **kwargs: make_response(403, 'forbidden')
+    )
+    config = make_app_config(jira_to_toggl={'PROJ': 1115})
+
+    with pytest.raises(SystemExit):
+        fetch_referenced_metadata(
+            config, transport, MetadataCache(str(tmp_path)), []
+        )
+
+
+def test_summary_preview_is_written_at_once(
+    monkeypatch: Any, capsys: Any, tempodump: List[TempoTogglPair]
+) -> None:
+    answers = iter(['d', 'n'])
+    paged: List[str] = []
+    monkeypatch.setattr('builtins.input', lambda question: next(answers))
+    monkeypatch.setattr('pydoc.pager', paged.append)
+
+    plan = Plan(
+        create=tempodump,
+        update=[],
+        delete=[SyncedWorklog(1, 300, datetime(2019, 3, 1))],
+    )
+
+    assert not prompt_for_pushing(
+        tempodump, verbose=False, plan=plan, preview=Preview.SUMMARY
+    )
+
+    preview = capsys.readouterr().err
+
+    assert 'jira project' in preview
+    assert preview.splitlines()[-3].split()[0] == 'total'
+    assert preview.splitlines()[-1] == 'deleting 1 entries of removed worklogs'
+    assert len(paged) == 1
+    assert 'PROJ-711' in paged[0]
+    assert paged[0].endswith('deleted entries:\n300')
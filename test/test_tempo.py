@@ -1,7 +1,11 @@
 from os import path
-from typing import Dict
+from typing import Dict, Iterator, List, Tuple, Optional, Any, Set
+from datetime import date, datetime, timedelta
+import json
 
 import pytest
+from humps import decamelize
+from requests import Response
 
 from tempoggl.tempo import (
     WorklogError,
@@ -9,9 +13,16 @@ from tempoggl.tempo import (
     JiraProject,
     WorkLog,
     join_worklogs,
+    fetch_worklogs,
+    normalize_keys,
+    ProjectTables,
+    WorklogJoin,
+    JiraAuthError,
 )
+from tempoggl.windows import date_windows, FetchWindow
+from tempoggl.retry import RetryPolicy
 from tempoggl.toggl import TogglProject
-from test.conftest import load_many
+from test.conftest import load_many, FakeTransport, make_response
 
 
 @pytest.mark.parametrize(
@@ -72,3 +83,230 @@ def test_rename_self_no_side_effects() -> None:
     rename_self(before)
 
     assert expected == before
+
+
+def test_fetch_worklogs_updated_since(tempodump_content: str) -> None:
+    transport = FakeTransport(
+        lambda method, url, **kwargs: make_response(200, tempodump_content)
+    )
+
+    worklogs = list(
+        fetch_worklogs(
+            'https://jira.example.com',
+            date(2019, 3, 1),
+            transport,
+            updated_since=datetime(2019, 3, 20, 19, 0),
+        )
+    )
+
+    assert [w.id for w in worklogs] == [12346]
+
+
+def test_worklogs_without_date_updated_were_not_edited(
+    tempodump_content: str,
+) -> None:
+    raw = json.loads(tempodump_content)
+
+    for worklog in raw:
+        del worklog['dateUpdated']
+
+    transport = FakeTransport(
+        lambda method, url, **kwargs: make_response(200, json.dumps(raw))
+    )
+
+    worklogs = list(
+        fetch_worklogs(
+            'https://jira.example.com',
+            date(2019, 3, 1),
+            transport,
+            updated_since=datetime(2019, 3, 20, 19, 0),
+        )
+    )
+
+    assert [w.id for w in worklogs] == [12346]
+    assert worklogs[0].date_updated == worklogs[0].date_created
+
+
+def test_worklog_fetch_detects_wrong_password() -> None:
+    def get(method: str, url: str, **kwargs: Any) -> Response:
+        # jira answers as if the request was anonymous
+        response = make_response(200, '[]', url)
+        response.headers['X-Seraph-LoginReason'] = 'AUTHENTICATED_FAILED'
+
+        return response
+
+    worklogs = fetch_worklogs(
+        'https://jira.example.com', date(2019, 3, 1), FakeTransport(get)
+    )
+
+    with pytest.raises(JiraAuthError):
+        list(worklogs)
+
+
+@pytest.mark.parametrize(
+    'window,expected',
+    [
+        (FetchWindow.NONE, [(date(2019, 1, 30), None)]),
+        (
+            FetchWindow.WEEK,
+            [
+                (date(2019, 1, 30), date(2019, 2, 3)),
+                (date(2019, 2, 4), date(2019, 2, 10)),
+                (date(2019, 2, 11), None),
+            ],
+        ),
+        (
+            FetchWindow.MONTH,
+            [
+                (date(2019, 1, 30), date(2019, 1, 31)),
+                (date(2019, 2, 1), None),
+            ],
+        ),
+    ],
+)
+def test_date_windows(
+    window: FetchWindow, expected: List[Tuple[date, Optional[date]]]
+) -> None:
+    windows = date_windows(date(2019, 1, 30), date(2019, 2, 12), window)
+
+    assert list(windows) == expected
+
+
+def test_fetch_windows_retried_and_deduplicated(
+    tempodump_content: str,
+) -> None:
+    failed: Set[str] = set()
+
+    def get(method: str, url: str, params: Dict, **kwargs: Any) -> Response:
+        if params['dateFrom'] not in failed:
+            failed.add(params['dateFrom'])
+            return make_response(502, 'bad gateway', url)
+
+        # every window returns the same worklogs
+        return make_response(200, tempodump_content)
+
+    transport = FakeTransport(get, RetryPolicy(sleeper=lambda seconds: None))
+
+    worklogs = list(
+        fetch_worklogs(
+            'https://jira.example.com',
+            date.today() - timedelta(days=15),
+            transport,
+            window=FetchWindow.WEEK,
+            concurrency=2,
+        )
+    )
+
+    assert [w.id for w in worklogs] == [12345, 12346]
+    assert len(transport.requests) == 2 * len(failed)
+
+
+@pytest.mark.parametrize(
+    'fixture',
+    ['tempo_worklogs.json', 'tempo_projects.json', 'toggl_projects.json'],
+)
+def test_normalize_keys_same_as_decamelize(fixture: str) -> None:
+    with open(path.join('test', fixture)) as f:
+        for obj in json.load(f):
+            expected = rename_self(decamelize(obj))
+
+            # compare the key order too
+            assert json.dumps(normalize_keys(obj)) == json.dumps(expected)
+
+
+def test_normalize_keys_inside_lists() -> None:
+    dirty = {
+        'self': {'selfLink': 1, 'self': 2},
+        'itemList': [{'self': 3, 'innerList': [{'fooBar': 4}]}],
+    }
+
+    assert normalize_keys(dirty) == rename_self(decamelize(dirty))
+
+
+def test_worklog_joining_refreshes_unknown_projects() -> None:
+    worklogs = load_many(path.join('test', 'tempo_worklogs.json'), WorkLog)
+    toggl_projects = load_many(
+        path.join('test', 'toggl_projects.json'), TogglProject
+    )
+    tempo_projects = load_many(
+        path.join('test', 'tempo_projects.json'), JiraProject
+    )
+    refreshes: List[int] = []
+
+    def refresh() -> Tuple[List[JiraProject], List[TogglProject]]:
+        refreshes.append(1)
+        return (tempo_projects, toggl_projects)
+
+    result = join_worklogs(
+        worklogs,
+        tempo_projects[:1],
+        {'PROJ': 1115, 'TUN': 1113},
+        toggl_projects,
+        refresh_projects=refresh,
+    )
+
+    assert isinstance(result, list)
+    assert len(result) == 2
+    assert len(refreshes) == 1
+
+
+def test_worklog_joining_reports_all_errors() -> None:
+    worklogs = load_many(path.join('test', 'tempo_worklogs.json'), WorkLog)
+    toggl_projects = load_many(
+        path.join('test', 'toggl_projects.json'), TogglProject
+    )
+    tempo_projects = load_many(
+        path.join('test', 'tempo_projects.json'), JiraProject
+    )
+    # PROJ is unknown, and TUN once mapped and once missing from jira
+    worklogs += [worklogs[1], worklogs[1].copy(deep=True)]
+    worklogs[-1].issue.project_id = 999
+
+    result = join_worklogs(
+        worklogs, tempo_projects, {'TUN': 1113}, toggl_projects
+    )
+
+    assert isinstance(result, WorklogError)
+    assert result.message.splitlines() == [
+        'unexpected project id "999" (1 worklog)',
+        'unknown jira key "PROJ" (1 worklog), please add the key to '
+        'configuration',
+    ]
+
+
+def test_worklog_join_is_lazy() -> None:
+    worklogs = load_many(path.join('test', 'tempo_worklogs.json'), WorkLog)
+    toggl_projects = load_many(
+        path.join('test', 'toggl_projects.json'), TogglProject
+    )
+    tempo_projects = load_many(
+        path.join('test', 'tempo_projects.json'), JiraProject
+    )
+    consumed: List[WorkLog] = []
+
+    def arriving() -> Iterator[WorkLog]:
+        for worklog in worklogs:
+            consumed.append(worklog)
+            yield worklog
+
+    join = WorklogJoin(
+        arriving(), tempo_projects, {'PROJ': 1115, 'TUN': 1113}, toggl_projects
+    )
+    pairs = iter(join)
+
+    assert next(pairs).tempo_log is worklogs[0]
+    assert consumed == worklogs[:1]
+    assert len(list(pairs)) == 1
+    assert join.error() is None
+
+
+def test_project_tables_are_rebuilt_only_for_new_lists() -> None:
+    jira = load_many(path.join('test', 'tempo_projects.json'), JiraProject)
+    toggl = load_many(path.join('test', 'toggl_projects.json'), TogglProject)
+    tables = ProjectTables()
+
+    first = tables.get(jira, toggl, {'PROJ': 1115})
+
+    assert tables.get(jira, toggl, {'PROJ': 1115}) is first
+    assert tables.get(list(jira), toggl, {'PROJ': 1115}) is not first
+    assert tables.get(jira, toggl, {'PROJ': 999})[1]['PROJ'] is None
@@ -1,7 +1,24 @@
-from typing import Iterable
+from typing import Iterable, Set, Any, List
+from datetime import datetime, timedelta, timezone
+import json
 
-from tempoggl.cli import tempo_to_toggl
+from requests import Response
+
+from tempoggl.sync import tempo_to_toggl
 from tempoggl.tempo import TempoTogglPair
+from tempoggl.toggl import (
+    push_worklogs,
+    fetch_projects,
+    TogglEntry,
+    TogglEntryRequest,
+    TogglTimeEntry,
+    aware,
+    fetch_time_entries,
+    reconcile,
+    sync_window,
+)
+from tempoggl.ratelimit import TokenBucket
+from test.conftest import FakeTransport, make_response
 
 
 def test_entry_has_jira_key(tempodump: Iterable[TempoTogglPair]) -> None:
@@ -9,3 +26,157 @@ def test_entry_has_jira_key(tempodump: Iterable[TempoTogglPair]) -> None:
         toggl = tempo_to_toggl(pair)
 
         assert pair.tempo_log.issue.key in toggl.time_entry.description
+
+
+def fake_post(failing: Set[str]) -> FakeTransport:
+    def post(method: str, url: str, data: str, **kwargs: Any) -> Response:
+        entry = json.loads(data)['time_entry']
+
+        if entry['description'] in failing:
+            return make_response(400, 'bad entry', url)
+
+        return make_response(200, json.dumps({'data': {'id': entry['pid']}}))
+
+    return FakeTransport(post)
+
+
+def make_entries(count: int) -> List[TogglEntry]:
+    return [
+        TogglEntry(
+            time_entry=TogglEntryRequest(
+                description='PROJ-{}'.format(i),
+                start=datetime(2019, 3, 12),
+                duration=60,
+                pid=i,
+            )
+        )
+        for i in range(count)
+    ]
+
+
+def test_push_reports_created_entries() -> None:
+    transport = fake_post(set())
+
+    result = push_worklogs(
+        make_entries(10), transport, concurrency=4, limiter=TokenBucket(1e6)
+    )
+
+    assert result.created == {i: i for i in range(10)}
+    assert not result.errors
+
+
+def test_push_stops_on_first_error() -> None:
+    entries = make_entries(5)
+    result = push_worklogs(
+        entries, fake_post({'PROJ-2'}), limiter=TokenBucket(1e6)
+    )
+
+    assert list(result.created) == [0, 1]
+    assert list(result.errors) == [2]
+    assert result.not_pushed(len(entries)) == [3, 4]
+
+
+def test_push_keeps_going_after_error() -> None:
+    result = push_worklogs(
+        make_entries(5),
+        fake_post({'PROJ-2'}),
+        concurrency=2,
+        stop_on_error=False,
+        limiter=TokenBucket(1e6),
+    )
+
+    assert sorted(result.created) == [0, 1, 3, 4]
+    assert result.errors == {2: 'bad entry'}
+
+
+def test_fetch_projects_of_all_workspaces() -> None:
+    def get(method: str, url: str, **kwargs: Any) -> Response:
+        if url.endswith('/workspaces'):
+            return make_response(200, '[{"id": 1}, {"id": 2}]')
+
+        workspace_id = url.split('/')[-2]
+
+        return make_response(
+            200, json.dumps([{'id': workspace_id, 'name': 'project'}])
+        )
+
+    transport = FakeTransport(get)
+
+    assert [p.id for p in fetch_projects(transport)] == [1, 2]
+
+
+def existing_entry(toggl_id: int, entry: TogglEntry) -> TogglTimeEntry:
+    request = entry.time_entry
+
+    return TogglTimeEntry(
+        id=toggl_id,
+        # toggl returns the times in utc
+        start=aware(request.start).astimezone(timezone.utc),
+        duration=request.duration,
+        pid=request.pid,
+        description=request.description,
+    )
+
+
+def test_existing_entries_are_matched() -> None:
+    entries = make_entries(3)
+    existing = [
+        existing_entry(100, entries[0]),
+        existing_entry(102, entries[2]),
+    ]
+
+    assert reconcile(entries, existing) == {0: 100, 2: 102}
+
+
+def test_each_existing_entry_matches_once() -> None:
+    entries = make_entries(1) * 3
+    existing = [
+        existing_entry(100, entries[0]),
+        existing_entry(101, entries[0]),
+    ]
+
+    assert sorted(reconcile(entries, existing).values()) == [100, 101]
+
+
+def test_running_and_different_entries_are_not_matched() -> None:
+    entries = make_entries(2)
+    running = existing_entry(100, entries[0]).copy(update={'duration': -1})
+    other = existing_entry(101, entries[1]).copy(update={'pid': 7})
+
+    assert reconcile(entries, [running, other]) == {}
+
+
+def test_time_entries_over_the_limit_are_fetched_in_parts() -> None:
+    start = datetime(2019, 3, 12, tzinfo=timezone.utc)
+    starts = [start + timedelta(hours=h) for h in [0, 1, 2, 2, 6, 7, 8]]
+
+    def get(method: str, url: str, **kwargs: Any) -> Response:
+        params = kwargs['params']
+        since = datetime.fromisoformat(params['start_date'])
+        until = datetime.fromisoformat(params['end_date'])
+        entries = [
+            {'id': i, 'start': s.isoformat(), 'duration': 60, 'pid': 1}
+            for i, s in enumerate(starts)
+            if since <= s <= until
+        ]
+
+        # like toggl, leave out the entries over the limit
+        return make_response(200, json.dumps(entries[:3]))
+
+    transport = FakeTransport(get)
+    end = start + timedelta(hours=8, seconds=1)
+
+    entries = fetch_time_entries(start, end, transport, limit=3)
+
+    assert [e.id for e in entries] == list(range(len(starts)))
+    assert len(transport.requests) > 1
+
+
+def test_sync_window_covers_all_starts() -> None:
+    entries = make_entries(2)
+    entries[1].time_entry.start = datetime(2019, 3, 14, 12)
+
+    start, end = sync_window(entries)
+
+    assert start == datetime(2019, 3, 12)
+    assert end > datetime(2019, 3, 14, 12)
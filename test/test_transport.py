@@ -0,0 +1,82 @@
+from typing import Any, List
+
+from requests import Response
+
+from tempoggl.ratelimit import TokenBucket
+from tempoggl.retry import RetryPolicy
+from tempoggl.transport import Transport
+from test.conftest import FakeTransport, make_response
+
+
+def test_session_per_host() -> None:
+    transport = Transport(pool_size=3, keep_alive=False)
+    transport.authenticate('https://jira.example.com/jira', ('user', 'pw'))
+
+    jira = transport.session('https://jira.example.com/rest/api/2/project')
+    toggl = transport.session('https://www.toggl.com/api/v8/workspaces')
+
+    assert jira is transport.session('https://jira.example.com/other')
+    assert jira is not toggl
+    assert jira.auth == ('user', 'pw')
+    assert toggl.auth is None
+    assert toggl.headers['Connection'] == 'close'
+
+    transport.close()
+
+
+def test_failed_requests_are_retried() -> None:
+    statuses = iter([503, 429, 200])
+    waits: List[float] = []
+    observed: List[int] = []
+
+    def handle(method: str, url: str, **kwargs: Any) -> Response:
+        return make_response(next(statuses), '')
+
+    transport = FakeTransport(
+        handle, RetryPolicy(jitter=lambda: 1.0, sleeper=waits.append)
+    )
+    transport.observe('https://www.toggl.com/api/v8', observed.append)
+
+    response = transport.get('https://www.toggl.com/api/v8/workspaces')
+
+    assert response.status_code == 200
+    assert len(transport.requests) == 3
+    assert waits == [0.5, 1.0]
+    assert observed == [503, 429, 200]
+
+
+def test_removed_observer_is_not_called() -> None:
+    observed: List[int] = []
+    transport = FakeTransport(lambda method, url: make_response(200, ''))
+    remove = transport.observe('https://www.toggl.com', observed.append)
+
+    transport.get('https://www.toggl.com/api/v8/me')
+    remove()
+    transport.get('https://www.toggl.com/api/v8/me')
+
+    assert observed == [200]
+
+
+def test_shared_transport_sends_own_auth() -> None:
+    sent: List[Any] = []
+
+    def handle(method: str, url: str, **kwargs: Any) -> Response:
+        sent.append(kwargs.get('auth'))
+        return make_response(200, '')
+
+    transport = FakeTransport(handle)
+    transport.limit('https://jira.example.com', TokenBucket(1e6))
+    alice = transport.shared()
+    bob = transport.shared()
+    alice.authenticate('https://jira.example.com', ('alice', 'pw'))
+    bob.authenticate('https://jira.example.com', ('bob', 'pw'))
+
+    alice.get('https://jira.example.com/rest/api/2/project')
+    bob.get('https://jira.example.com/rest/api/2/project')
+    bob.close()
+
+    assert sent == [('alice', 'pw'), ('bob', 'pw')]
+    assert transport.session('https://jira.example.com').auth is None
+    assert alice.session('https://jira.example.com') is transport.session(
+        'https://jira.example.com'
+    )
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+from os import path
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from tempoggl.tempo import WorkLog, JiraProject, reformat_json
+from tempoggl.validation import fast_construct, parse, parse_many
+
+
+def load_dirty(fixture: str) -> List[Dict]:
+    with open(path.join('test', fixture)) as f:
+        return list(reformat_json(json.load(f)))
+
+
+@pytest.mark.parametrize(
+    'fixture,model',
+    [('tempo_worklogs.json', WorkLog), ('tempo_projects.json', JiraProject)],
+)
+def test_fast_construct_equals_validation(fixture: str, model: Any) -> None:
+    for obj in load_dirty(fixture):
+        assert fast_construct(model, obj) == model.parse_obj(obj)
+
+
+def test_invalid_object_falls_back_to_validation() -> None:
+    worklog = load_dirty('tempo_worklogs.json')[0]
+    del worklog['issue']['project_id']
+
+    with pytest.raises(ValidationError, match='project_id'):
+        parse(WorkLog, worklog)
+
+
+def test_schema_drift_caught_by_sample(monkeypatch: Any) -> None:
+    monkeypatch.setattr('tempoggl.validation.STRICT_HEAD', 1)
+    monkeypatch.setattr('tempoggl.validation.STRICT_SAMPLE_EVERY', 2)
+
+    worklog = load_dirty('tempo_worklogs.json')[0]
+
+    # an extra field is ignored by validation, but a changed type is not
+    drifted = {**worklog, 'time_spent_seconds': 'about an hour'}
+
+    with pytest.raises(ValidationError, match='time_spent_seconds'):
+        list(parse_many(WorkLog, [worklog, worklog, drifted], fast=True))
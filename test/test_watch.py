@@ -0,0 +1,87 @@
+from typing import Any, List
+from datetime import datetime
+from threading import Event
+import logging
+
+import pytest
+
+from tempoggl.schedule import Interval
+from tempoggl.standin import Standin
+from tempoggl.tempo import JiraAuthError
+from tempoggl.toggl import TogglAuthError
+from tempoggl.watch import watch
+from test.conftest import make_app_config
+
+
+class StopAfter(Interval):
+    def __init__(self, cycles: int, stop: Event) -> None:
+        """Run right away, and stop after `cycles` syncs."""
+        super().__init__(0)
+        self.cycles = cycles
+        self.stop = stop
+
+    def next_run(self, after: datetime) -> datetime:
+        self.cycles -= 1
+
+        if not self.cycles:
+            self.stop.set()
+
+        return after
+
+
+@pytest.mark.usefixtures('config_home')
+def test_state_is_kept_between_syncs(standin: Standin) -> None:
+    config = make_app_config(
+        jira_url=standin.jira_url,
+        toggl_url=standin.toggl_url,
+        jira_to_toggl={'PROJ': 1115, 'TUN': 1113},
+        jira_cache_hours=24,
+        toggl_cache_hours=24,
+    )
+    stop = Event()
+
+    watch(config, 'password', StopAfter(3, stop), stop)
+
+    assert len(standin.data.time_entries) == 2
+    assert standin.requests.count('GET /rest/tempo-timesheets/3/worklogs') == 3
+    assert standin.requests.count('GET /rest/api/2/project') == 1
+    assert standin.requests.count('GET /api/v8/workspaces') == 1
+
+
+@pytest.mark.usefixtures('config_home')
+def test_failed_sync_keeps_watching(standin: Standin) -> None:
+    # the TUN worklog is not mapped
+    config = make_app_config(
+        jira_url=standin.jira_url, toggl_url=standin.toggl_url
+    )
+    stop = Event()
+
+    watch(config, 'password', StopAfter(2, stop), stop)
+
+    assert standin.requests.count('GET /rest/tempo-timesheets/3/worklogs') == 2
+
+
+@pytest.mark.usefixtures('config_home')
+@pytest.mark.parametrize(
+    'error', [JiraAuthError('refused'), TogglAuthError(1)]
+)
+def test_refused_credentials_stop_watching(
+    monkeypatch: Any, caplog: Any, standin: Standin, error: BaseException
+) -> None:
+    syncs: List[None] = []
+
+    def sync(*args: Any) -> None:
+        syncs.append(None)
+        raise error
+
+    monkeypatch.setattr('tempoggl.watch.sync', sync)
+    config = make_app_config(
+        jira_url=standin.jira_url, toggl_url=standin.toggl_url
+    )
+    stop = Event()
+
+    with pytest.raises(SystemExit):
+        watch(config, 'password', StopAfter(3, stop), stop)
+
+    assert len(syncs) == 1
+    assert all(r.levelno != logging.ERROR for r in caplog.records)